@@ -1,30 +1,61 @@
 import os
 import uuid
 import socket
-import json
-import re
 import sys
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-from flask import Flask, request, jsonify, send_file, abort, send_from_directory, Response
+from flask import Flask, Request, request, jsonify, abort, send_from_directory, Response
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
-from sqlalchemy import desc, asc
+from sqlalchemy import select, desc, asc, tuple_
 from PIL import Image
 import qrcode
 from io import BytesIO
 import base64
+import hashlib
 import mimetypes
 
 from config import Config
 from models import init_db, FileRecord, Message
-import bcrypt
+from blobstore import BlobStore, checksum_file, is_sha256, verify_samples, choose_samples, sample_key
+from ranges import serve_file, serve_content, make_etag
+from uploads import UploadSessionManager, UploadError, IngestFile, save_upload, cleanup_incoming
+from zipstream import ZipArchive, ZipEntry, unique_names, archive_name
+from thumbnails import ThumbnailCache, snap_width, FORMATS as THUMBNAIL_FORMATS
+from presence import ChannelRegistry, normalize_channel
+from events import EventDispatcher, EventLog
+from cluster import create_message_queue, SharedEventLog, EVENT_METHOD, PRESENCE_METHOD
+from settings import SettingsStore
+from auth import AuthError, TokenSigner, PasswordHasher, AttemptLimiter, load_secret
+from channels import ChannelStore, ChannelError
+from reaper import ExpiryReaper
+from dbwriter import WriteQueue, WriteTimeout
+from listing import FILE_COLUMNS, MESSAGE_COLUMNS, fetch_rows, file_item, message_item, remaining_time, json_response
+from search import SearchIndex
+from listcache import ListCache
+
+class LanShareRequest(Request):
+    """表单中的文件直接写入上传目录，避免Werkzeug先写临时文件再复制"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        ingest_file = IngestFile(Config.UPLOAD_FOLDER)
+        if not hasattr(self, '_ingest_files'):
+            self._ingest_files = []
+        self._ingest_files.append(ingest_file)
+        return ingest_file
 
 # 配置Flask应用，设置静态文件目录
 static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 app = Flask(__name__, static_folder=static_folder, static_url_path='')
+app.request_class = LanShareRequest
 app.config.from_object(Config)
 CORS(app, origins="*")
+# 多个工作进程/主机部署时，Socket.IO广播经过消息队列（见 cluster.py）
+message_queue = create_message_queue(
+    app.config['MESSAGE_QUEUE'],
+    channel=app.config['MESSAGE_QUEUE_CHANNEL'],
+    local_port=app.config['LOCAL_BROKER_PORT']
+)
 # 配置SocketIO，修复生产环境错误
 socketio = SocketIO(
     app, 
@@ -36,9 +67,38 @@ socketio = SocketIO(
     ping_interval=25,  # 增加ping间隔时间
     max_http_buffer_size=10 * 1024 * 1024,  # 10MB缓冲区
     always_connect=False,  # 避免不必要的连接
-    transports=['websocket', 'polling']  # 明确指定传输方式
+    client_manager=message_queue,
+    # 多进程时轮询请求可能落到其他进程上（没有会话粘滞），只使用WebSocket
+    transports=['websocket'] if message_queue else ['websocket', 'polling']  # 明确指定传输方式
+)
+
+# 设置保存在内存中，settings.json 被其他工作进程修改后自动重新加载（见 settings.py）
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'settings.json')
+settings_store = SettingsStore(SETTINGS_FILE, check_interval=app.config['SETTINGS_CHECK_INTERVAL'])
+
+# 密码保护：签名令牌、bcrypt线程池与尝试次数限制（见 auth.py）
+token_signer = TokenSigner(
+    app.config['AUTH_SECRET'] or load_secret(os.path.join(os.path.dirname(SETTINGS_FILE), 'secret.key')),
+    ttl=app.config['AUTH_TOKEN_TTL']
+)
+# 秒传抽样校验的令牌，绑定文件哈希、大小和服务端选择的抽样位置
+precheck_signer = TokenSigner(token_signer.secret, ttl=app.config['PRECHECK_CHALLENGE_TTL'])
+password_hasher = PasswordHasher(
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_QUEUE']
+)
+login_limiter = AttemptLimiter(
+    max_attempts=app.config['LOGIN_MAX_ATTEMPTS'],
+    window=app.config['LOGIN_ATTEMPT_WINDOW']
 )
 
+def auth_error_response(error):
+    """把 AuthError 转换为响应，附带 Retry-After"""
+    response = jsonify({'error': error.message})
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
 # 密码验证函数
 def check_password_auth():
     """检查密码验证 - 跳过特定端点"""
@@ -77,37 +137,29 @@ def check_password_auth():
     # 跳过文件预览端点
     if '/api/files/' in path and '/preview' in path:
         return None
+    # 跳过缩略图端点（<img>标签无法携带验证头）
+    if path.startswith(('/api/files/', '/api/messages/')) and path.endswith('/thumbnail'):
+        return None
     
     # 检查密码设置
     try:
-        # 使用绝对路径确保找到文件
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        settings_file = os.path.join(current_dir, 'data', 'settings.json')
-        
-        if not os.path.exists(settings_file):
-            # 如果设置文件不存在，创建默认设置（密码禁用）
-            os.makedirs(os.path.dirname(settings_file), exist_ok=True)
-            default_settings = {"passwordEnabled": False}
-            with open(settings_file, 'w', encoding='utf-8') as f:
-                json.dump(default_settings, f)
-            return None
-            
-        with open(settings_file, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
-            
-        password_enabled = settings.get('passwordEnabled', False)
+        # 设置文件不存在时视为未启用密码
+        settings = settings_store.snapshot()
         
         # 如果未启用密码，直接放行
-        if not password_enabled:
+        if not settings.get('passwordEnabled', False):
             return None
             
-        # 检查是否已验证
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        # 检查是否已验证：<video>、<img> 和下载链接无法携带请求头，令牌放在 token 查询参数中
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            token = auth_header[len('Bearer '):]
+        else:
+            token = request.args.get('token')
+        if not token:
             return jsonify({'error': '需要密码验证'}), 401
             
-        token = auth_header.split(' ')[1]
-        if token != 'authenticated':
+        if not token_signer.verify(token, settings.get('password')):
             return jsonify({'error': '密码验证失败'}), 401
             
     except Exception as e:
@@ -122,8 +174,171 @@ def check_auth():
     if result is not None:
         return result
 
+@app.teardown_request
+def discard_ingest_files(exc):
+    """删除请求中未被保存的上传临时文件"""
+    for ingest_file in getattr(request, '_ingest_files', []):
+        ingest_file.discard()
+
 # 初始化数据库
-engine, Session = init_db(app.config['DATABASE_PATH'])
+db_pragmas = {
+    'synchronous': app.config['DB_SYNCHRONOUS'],
+    'busy_timeout': app.config['DB_BUSY_TIMEOUT'],
+    'cache_size': -app.config['DB_CACHE_SIZE_KB'],
+    'mmap_size': app.config['DB_MMAP_SIZE']
+}
+engine, Session = init_db(
+    app.config['DATABASE_PATH'],
+    pragmas=db_pragmas,
+    pool_size=app.config['DB_POOL_SIZE'],
+    max_overflow=app.config['DB_POOL_OVERFLOW']
+)
+
+# 发送/删除消息由单独的写线程执行，并发写入合并为一次提交（其他写操作仍各自提交）
+write_queue = WriteQueue(engine, pragmas=db_pragmas, max_batch=app.config['DB_WRITE_BATCH'])
+write_queue.start()
+
+# 内容寻址存储（相同内容的文件只保存一份）
+blob_store = BlobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs'), Session)
+
+# 频道列表与各频道的记录数（旧版本保存在settings.json中的频道在首次启动时导入）
+channel_store = ChannelStore(Session)
+channel_store.migrate(settings_store.get('channels', []))
+
+def push_channel_stats_task():
+    """定期把统计有变化的频道合并推送给所有客户端（侧边栏等不必重新加载列表）"""
+    while True:
+        socketio.sleep(app.config['CHANNEL_STATS_INTERVAL'])
+        changed = channel_store.pop_changed()
+        if not changed:
+            continue
+        try:
+            stats = channel_store.stats(app.config['EXPIRING_SOON_HOURS'] * 3600, channels=changed)
+            # 已删除或重命名的频道不在统计中
+            removed = sorted(changed - {item['channel'] for item in stats})
+            socketio.emit('channel_stats', {'channels': stats, 'removed': removed})
+        except Exception as e:
+            print(f"推送频道统计失败: {e}")
+
+socketio.start_background_task(push_channel_stats_task)
+
+# 断点续传会话（未完成的分片保存在上传目录的 .partial 子目录中）
+upload_sessions = UploadSessionManager(
+    os.path.join(app.config['UPLOAD_FOLDER'], '.partial'),
+    ttl_seconds=app.config['UPLOAD_SESSION_TTL'],
+    chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+    max_size=app.config['MAX_CONTENT_LENGTH']
+)
+
+def cleanup_upload_sessions_task():
+    """定期清理过期的断点续传会话"""
+    while True:
+        socketio.sleep(app.config['UPLOAD_SESSION_CLEAN_INTERVAL'])
+        try:
+            removed = upload_sessions.cleanup_expired()
+            removed += cleanup_incoming(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_SESSION_TTL'])
+            if removed:
+                print(f"已清理 {removed} 个过期上传会话")
+        except Exception as e:
+            print(f"清理上传会话失败: {e}")
+
+socketio.start_background_task(cleanup_upload_sessions_task)
+
+# WebSocket频道订阅关系（消息只推送给订阅了对应频道的连接）
+channel_registry = ChannelRegistry()
+
+# 最近的变更事件（带频道内序号），客户端重连后据此增量同步；多进程时保存在数据库中共用
+if message_queue is not None:
+    event_log = SharedEventLog(engine, size=app.config['EVENT_LOG_SIZE'])
+else:
+    event_log = EventLog(size=app.config['EVENT_LOG_SIZE'])
+
+# WebSocket事件按频道合并后由后台任务批量推送，请求线程不直接发送
+event_dispatcher = EventDispatcher(
+    socketio,
+    event_log,
+    tick_seconds=app.config['EVENT_TICK_MS'] / 1000,
+    channel_limit=app.config['EVENT_CHANNEL_LIMIT'],
+    client_queue_limit=app.config['EVENT_CLIENT_QUEUE_LIMIT'],
+    queue=message_queue
+)
+event_dispatcher.start()
+
+# 文件名和聊天消息搜索（全文索引由数据库迁移创建）
+search_index = SearchIndex(Session, engine)
+
+# 文件列表和消息历史的响应缓存（本进程），按频道的事件序号失效
+list_cache = ListCache(app.config['LIST_CACHE_SIZE'])
+
+def publish_expired_files(channel, file_ids):
+    """通知频道内的客户端过期文件已删除（由事件推送任务合并为一次 files_changed）"""
+    for file_id in file_ids:
+        event_dispatcher.publish(channel, 'file_deleted', {'file_id': file_id})
+
+# 过期文件清理：文件过期后再保留 AUTO_CLEAN_DAYS 天（列表中显示为已过期）后删除
+expiry_reaper = ExpiryReaper(
+    Session,
+    blob_store,
+    channel_store,
+    on_deleted=publish_expired_files,
+    grace=app.config['AUTO_CLEAN_DAYS'] * 24 * 3600,
+    batch_size=app.config['EXPIRY_REAPER_BATCH'],
+    horizon=app.config['EXPIRY_REAPER_HORIZON']
+)
+socketio.start_background_task(expiry_reaper.run)
+
+def handle_queued_event(message):
+    """消息队列中的变更事件（包括本进程发布的）放入本进程的推送缓冲区"""
+    event_dispatcher.deliver(message['channel'], message['event'], message['data'], message['seq'])
+
+def report_presence(request=False):
+    """上报本进程全部频道的在线人数"""
+    try:
+        message_queue.publish_presence(channel_registry.local_counts(), full=True, request=request)
+    except Exception as e:
+        print(f"上报在线人数失败: {e}")
+
+def handle_queued_presence(message):
+    """汇总其他进程上报的在线人数"""
+    if message['host_id'] == message_queue.host_id:
+        return
+    if message['request']:
+        # 监听线程不能直接发布：代理向本进程写消息时可能正在等待这个线程读取
+        socketio.start_background_task(report_presence)
+    for channel in channel_registry.update_remote(message['host_id'], message['counts'], replace=message['full']):
+        publish_presence(channel)
+
+def handle_queue_subscribed(reconnected):
+    """订阅成功后请求其他进程上报在线人数；断线期间可能错过了事件，让本进程的客户端重新同步"""
+    socketio.start_background_task(report_presence, True)
+    if reconnected:
+        for channel in channel_registry.local_counts():
+            event_dispatcher.request_resync(channel)
+
+def presence_heartbeat_task():
+    """定期上报本进程的在线人数，移除已退出进程的人数"""
+    interval = app.config['PRESENCE_HEARTBEAT']
+    while True:
+        socketio.sleep(interval)
+        report_presence()
+        for channel in channel_registry.expire_remote(interval * 3):
+            publish_presence(channel)
+
+if message_queue is not None:
+    message_queue.handlers[EVENT_METHOD] = handle_queued_event
+    message_queue.handlers[PRESENCE_METHOD] = handle_queued_presence
+    message_queue.on_subscribed = handle_queue_subscribed
+    # Socket.IO 默认在第一个连接建立时才开始订阅，没有WebSocket连接的进程也需要汇总在线人数
+    socketio.server.manager_initialized = True
+    message_queue.initialize()
+    socketio.start_background_task(presence_heartbeat_task)
+
+# 缩略图缓存（在独立进程中生成，按大小LRU淘汰）
+thumbnail_cache = ThumbnailCache(
+    os.path.join(app.config['UPLOAD_FOLDER'], '.thumbs'),
+    max_bytes=app.config['THUMBNAIL_CACHE_SIZE'],
+    workers=app.config['THUMBNAIL_WORKERS']
+)
 
 # 前端静态文件服务
 @app.route('/')
@@ -871,71 +1086,254 @@ def debug_config():
         'upload_folder_writable': os.access(app.config['UPLOAD_FOLDER'], os.W_OK) if os.path.exists(app.config['UPLOAD_FOLDER']) else False
     })
 
-@app.route('/api/files', methods=['GET'])
-def get_files():
-    """获取文件列表"""
-    channel = request.args.get('channel', 'default')
+def store_blob(file_path, file_size=None, file_hash=None, file_crc=None):
+    """把上传目录中的文件放入内容寻址存储，返回 (blob路径, 文件大小, SHA-256)"""
+    try:
+        if file_size is None:
+            file_size = os.path.getsize(file_path)
+        if file_hash is None:
+            file_hash, file_crc = checksum_file(file_path)
+        return blob_store.store(file_path, file_hash, file_size, file_crc), file_size, file_hash
+    except Exception:
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except:
+            pass
+        raise
+
+def save_file_record(file_path, original_filename, channel, uploader_name, file_size, file_hash):
+    """为已放入存储的blob创建传输文件记录并通知频道内客户端"""
+    filename = secure_filename(original_filename)
+    
+    # 保存到数据库
     session = Session()
     
     try:
-        files = session.query(FileRecord).filter(
-            FileRecord.channel == channel,
-            FileRecord.is_deleted == False
-        ).order_by(desc(FileRecord.upload_time)).all()
+        file_record = FileRecord(
+            filename=os.path.relpath(file_path, app.config['UPLOAD_FOLDER']),
+            original_filename=original_filename,  # 保存真正的原始文件名
+            file_size=file_size,
+            file_path=file_path,
+            file_hash=file_hash,
+            uploader_ip=request.remote_addr,
+            uploader_name=uploader_name,
+            channel=channel,
+            file_type=get_file_type(original_filename)
+        )
+        
+        session.add(file_record)
+        channel_store.counts(session, channel, files=1, size=file_size)
+        session.commit()
+        expiry_reaper.schedule(file_record.id, file_record.expire_time)
         
-        file_list = []
-        current_time = datetime.now()
+        if file_record.file_type == 'image':
+            thumbnail_cache.schedule(file_path, make_etag(file_path, file_hash))
         
-        for file in files:
-            # 计算剩余时间
-            time_remaining = file.expire_time - current_time
-            total_seconds = int(time_remaining.total_seconds())
+        # 通知频道内的客户端（由事件推送任务合并后发送）
+        event_dispatcher.publish(channel, 'file_uploaded', {
+            'id': file_record.id,
+            'filename': filename,
+            'file_size': file_size,
+            'upload_time': int(file_record.upload_time.timestamp() * 1000),  # 返回毫秒时间戳
+            'expire_time': int(file_record.expire_time.timestamp() * 1000),  # 过期时间毫秒时间戳
+            'uploader_name': uploader_name,
+            'file_type': file_record.file_type,
+            'download_url': f'/api/files/{file_record.id}/download',
+            **remaining_time(file_record.expire_time, datetime.now())
+        })
+        
+        return {
+            'message': '文件上传成功',
+            'file_id': file_record.id,
+            'filename': filename,
+            'file_size': file_size
+        }
+        
+    except Exception:
+        # 数据库错误时释放blob引用
+        session.rollback()
+        blob_store.release(file_hash)
+        raise
+        
+    finally:
+        session.close()
+
+def save_file_message(file_path, original_filename, content, channel, sender_name, file_size, file_hash):
+    """为已放入存储的blob创建聊天文件消息并通知频道内客户端"""
+    
+    # 保存到数据库（只创建消息记录，不创建文件记录）
+    session = Session()
+    
+    try:
+        # 创建聊天文件消息记录（独立于传输文件系统）
+        message = Message(
+            content=content or f'发送了文件: {original_filename}',
+            sender_ip=request.remote_addr,
+            sender_name=sender_name,
+            channel=channel,
+            message_type='file',
+            file_id=None,  # 聊天文件不关联传输文件ID
+            file_path=file_path,  # 直接保存文件路径
+            file_name=original_filename,  # 保存原始文件名用于显示
+            file_size=file_size,
+            file_type=get_file_type(original_filename),
+            file_hash=file_hash
+        )
+        
+        session.add(message)
+        channel_store.counts(session, channel, messages=1, size=file_size)
+        session.commit()
+        
+        if message.file_type == 'image':
+            thumbnail_cache.schedule(file_path, make_etag(file_path, file_hash))
+        
+        # 通知频道内的客户端（由事件推送任务合并后发送）
+        event_dispatcher.publish(channel, 'new_message', {
+            'id': message.id,
+            'content': message.content,
+            'sender_name': sender_name,
+            'send_time': int(message.send_time.timestamp() * 1000),
+            'message_type': 'file',
+            'file_id': message.id,  # 使用消息ID作为文件标识
+            'file_name': original_filename,  # 使用原始文件名
+            'file_size': file_size,
+            'file_type': get_file_type(original_filename)
+        })
+        
+        return {
+            'message': '文件消息发送成功',
+            'message_id': message.id
+        }
+        
+    except Exception:
+        # 数据库错误时释放blob引用
+        session.rollback()
+        blob_store.release(file_hash)
+        raise
+        
+    finally:
+        session.close()
+
+# 文件列表单页最多返回的条数
+FILE_PAGE_MAX_LIMIT = 500
+
+def encode_cursor(sort_time, record_id):
+    """把排序键编码为不透明的分页游标"""
+    raw = f'{sort_time.isoformat()}|{record_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(value):
+    """解析分页游标，无效时返回None"""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+        sort_time, record_id = raw.split('|')
+        return datetime.fromisoformat(sort_time), int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def cached_list(key, version, build, ttl=None):
+    """从列表缓存返回JSON响应，客户端的 If-None-Match 与内容一致时返回304
+    
+    version 为频道的事件序号和频道列表版本：文件和消息的写入都会发布事件，
+    重命名频道会改变频道列表版本，任何一个变化后缓存的列表都不再使用。
+    """
+    body, etag = list_cache.get(key, version, build, ttl)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # 浏览器可以保存响应，但每次使用前都要带 If-None-Match 重新验证
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/files', methods=['GET'])
+def get_files():
+    """获取文件列表
+    
+    传入 limit 时按 (upload_time, id) 游标分页，返回 next_cursor；
+    不传 limit 时返回全部文件（兼容旧客户端）。
+    可选过滤：file_type、uploader、status（active/expired），排序：order（desc/asc）。
+    """
+    channel = request.args.get('channel', 'default')
+    order = request.args.get('order', 'desc')
+    status = request.args.get('status')
+    if order not in ('desc', 'asc'):
+        return jsonify({'error': '无效的排序方式'}), 400
+    if status not in (None, '', 'active', 'expired'):
+        return jsonify({'error': '无效的状态过滤'}), 400
+    
+    limit = None
+    if request.args.get('limit'):
+        try:
+            limit = min(max(int(request.args['limit']), 1), FILE_PAGE_MAX_LIMIT)
+        except ValueError:
+            return jsonify({'error': '无效的分页大小'}), 400
+    
+    cursor = None
+    if request.args.get('cursor'):
+        cursor = decode_cursor(request.args['cursor'])
+        if cursor is None:
+            return jsonify({'error': '无效的分页游标'}), 400
+    
+    file_type = request.args.get('file_type') or None
+    uploader = request.args.get('uploader') or None
+    
+    # 在查询前读取序号，之后的变更都能通过增量同步拿到
+    sync_seq = event_log.current(channel)
+    
+    def build():
+        session = Session()
+        try:
+            current_time = datetime.now()
+            # 只查询列表需要的列，不构造ORM对象
+            query = select(*FILE_COLUMNS).where(
+                FileRecord.channel == channel,
+                FileRecord.is_deleted == False
+            )
             
-            # 判断文件是否已过期
-            is_expired = total_seconds <= 0
+            if file_type:
+                query = query.where(FileRecord.file_type == file_type)
+            if uploader:
+                query = query.where(FileRecord.uploader_name == uploader)
+            if status == 'active':
+                query = query.where(FileRecord.expire_time > current_time)
+            elif status == 'expired':
+                query = query.where(FileRecord.expire_time <= current_time)
             
-            # 计算剩余时间的显示
-            if is_expired:
-                remaining_text = "已过期"
-                remaining_days = 0
-                remaining_hours = 0
-                remaining_minutes = 0
-            else:
-                remaining_days = total_seconds // (24 * 3600)
-                remaining_hours = (total_seconds % (24 * 3600)) // 3600
-                remaining_minutes = (total_seconds % 3600) // 60
-                
-                if remaining_days > 0:
-                    remaining_text = f"{remaining_days}天"
-                elif remaining_hours > 0:
-                    remaining_text = f"{remaining_hours}小时{remaining_minutes}分钟"
-                else:
-                    remaining_text = f"{remaining_minutes}分钟"
+            sort_key = tuple_(FileRecord.upload_time, FileRecord.id)
+            if cursor is not None:
+                query = query.where(sort_key < cursor if order == 'desc' else sort_key > cursor)
             
-            file_list.append({
-                'id': file.id,
-                'filename': file.original_filename,
-                'file_size': file.file_size,
-                'upload_time': int(file.upload_time.timestamp() * 1000),  # 返回毫秒时间戳
-                'expire_time': int(file.expire_time.timestamp() * 1000),  # 过期时间毫秒时间戳
-                'uploader_name': file.uploader_name,
-                'file_type': file.file_type,
-                'download_url': f'/api/files/{file.id}/download',
-                'is_expired': is_expired,
-                'remaining_text': remaining_text,
-                'remaining_days': remaining_days,
-                'remaining_hours': remaining_hours,
-                'remaining_minutes': remaining_minutes,
-                'total_remaining_seconds': max(0, total_seconds)
-            })
+            direction = desc if order == 'desc' else asc
+            query = query.order_by(direction(FileRecord.upload_time), direction(FileRecord.id))
+            
+            if limit is None:
+                rows = fetch_rows(session, query)
+                has_more = False
+            else:
+                # 多取一条用于判断是否还有下一页
+                rows = fetch_rows(session, query.limit(limit + 1))
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+        finally:
+            session.close()
         
-        return jsonify({'files': file_list})
+        result = {
+            'files': [file_item(row, current_time) for row in rows],
+            'epoch': event_log.epoch,
+            'seq': sync_seq
+        }
+        if limit is not None:
+            result['has_more'] = has_more
+            result['next_cursor'] = encode_cursor(rows[-1].upload_time, rows[-1].id) if has_more else None
+        return result
     
+    try:
+        # 剩余时间随时间变化，文件列表最多缓存 LIST_CACHE_TTL 秒
+        key = ('files', channel, order, status, file_type, uploader, limit, request.args.get('cursor'))
+        return cached_list(key, (sync_seq, channel_store.version()), build, ttl=app.config['LIST_CACHE_TTL'])
     except Exception as e:
         print(f"获取文件列表错误: {str(e)}")
         return jsonify({'error': f'获取文件列表失败: {str(e)}'}), 500
-    finally:
-        session.close()
 
 @app.route('/api/files/upload', methods=['POST'])
 def upload_file():
@@ -967,84 +1365,16 @@ def upload_file():
             os.makedirs(upload_folder, exist_ok=True)
             file_path = os.path.join(upload_folder, unique_filename)
             
-            # 保存文件
-            file.save(file_path)
-            
-            # 验证文件确实已保存
-            if not os.path.exists(file_path):
-                return jsonify({'error': '文件保存失败'}), 500
+            # 保存文件（直写流只需重命名），再放入内容寻址存储
+            file_size, file_hash, file_crc = save_upload(file, file_path)
+            file_path, file_size, file_hash = store_blob(file_path, file_size, file_hash, file_crc)
                 
-            file_size = os.path.getsize(file_path)
-            
-            # 保存到数据库
-            session = Session()
-            
             try:
-                file_record = FileRecord(
-                    filename=unique_filename,
-                    original_filename=original_filename,  # 保存真正的原始文件名
-                    file_size=file_size,
-                    file_path=file_path,
-                    uploader_ip=request.remote_addr,
-                    uploader_name=uploader_name,
-                    channel=channel,
-                    file_type=get_file_type(original_filename)
-                )
-                
-                session.add(file_record)
-                session.commit()
-                
-                # 通过WebSocket通知所有客户端
-                current_time = datetime.now()
-                time_remaining = file_record.expire_time - current_time
-                total_seconds = int(time_remaining.total_seconds())
-                
-                remaining_days = total_seconds // (24 * 3600)
-                remaining_hours = (total_seconds % (24 * 3600)) // 3600
-                remaining_minutes = (total_seconds % 3600) // 60
-                
-                if remaining_days > 0:
-                    remaining_text = f"{remaining_days}天"
-                elif remaining_hours > 0:
-                    remaining_text = f"{remaining_hours}小时{remaining_minutes}分钟"
-                else:
-                    remaining_text = f"{remaining_minutes}分钟"
-                
-                socketio.emit('file_uploaded', {
-                    'id': file_record.id,
-                    'filename': filename,
-                    'file_size': file_size,
-                    'upload_time': int(file_record.upload_time.timestamp() * 1000),  # 返回毫秒时间戳
-                    'expire_time': int(file_record.expire_time.timestamp() * 1000),  # 过期时间毫秒时间戳
-                    'uploader_name': uploader_name,
-                    'file_type': file_record.file_type,
-                    'download_url': f'/api/files/{file_record.id}/download',
-                    'is_expired': False,
-                    'remaining_text': remaining_text,
-                    'remaining_days': remaining_days,
-                    'remaining_hours': remaining_hours,
-                    'remaining_minutes': remaining_minutes,
-                    'total_remaining_seconds': total_seconds
-                }, room=channel)
-                
-                return jsonify({
-                    'message': '文件上传成功',
-                    'file_id': file_record.id,
-                    'filename': filename,
-                    'file_size': file_size
-                })
-                
+                result = save_file_record(file_path, original_filename, channel, uploader_name, file_size, file_hash)
+                result['sha256'] = file_hash
+                return jsonify(result)
             except Exception as db_error:
-                # 数据库错误时删除已保存的文件
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                except:
-                    pass
                 return jsonify({'error': f'数据库保存失败: {str(db_error)}'}), 500
-                
-            finally:
-                session.close()
         
         # 文件上传失败，非空文件但上传失败
         return jsonify({'error': '文件上传失败'}), 400
@@ -1055,7 +1385,7 @@ def upload_file():
 
 @app.route('/api/files/<int:file_id>/download')
 def download_file(file_id):
-    """下载文件"""
+    """下载文件（支持断点续传和分段并行下载）"""
     session = Session()
     
     try:
@@ -1070,11 +1400,101 @@ def download_file(file_id):
         if not os.path.exists(file_record.file_path):
             abort(404)
         
-        return send_file(
+        return serve_file(
             file_record.file_path,
-            as_attachment=True,
+            mimetype=mimetypes.guess_type(file_record.original_filename)[0],
             download_name=file_record.original_filename,
-            mimetype=mimetypes.guess_type(file_record.original_filename)[0]
+            as_attachment=True,
+            etag=make_etag(file_record.file_path, file_record.file_hash),
+            max_age=None
+        )
+    
+    finally:
+        session.close()
+
+# 打包下载最多包含的文件数
+ARCHIVE_MAX_FILES = 10000
+
+# 未迁入blob存储的旧文件的CRC-32缓存，键为 (路径, 大小, 修改时间)
+legacy_crc_cache = {}
+
+def get_file_crc32(file_record, file_path, stat):
+    """获取文件的CRC-32，blob中已保存时无需读取文件"""
+    if file_record.file_hash:
+        crc = blob_store.get_crc32(file_record.file_hash)
+        if crc is not None:
+            return crc
+
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+    crc = legacy_crc_cache.get(key)
+    if crc is None:
+        _, crc = checksum_file(file_path)
+        if len(legacy_crc_cache) >= ARCHIVE_MAX_FILES:
+            legacy_crc_cache.clear()
+        legacy_crc_cache[key] = crc
+    return crc
+
+@app.route('/api/files/archive')
+def download_archive():
+    """打包下载多个文件或整个频道（流式ZIP，支持断点续传）"""
+    ids = request.args.get('ids', '')
+    channel = request.args.get('channel')
+    session = Session()
+    
+    try:
+        query = session.query(FileRecord).filter(FileRecord.is_deleted == False)
+        if ids:
+            try:
+                file_ids = [int(i) for i in ids.split(',') if i.strip()]
+            except ValueError:
+                return jsonify({'error': '无效的文件ID'}), 400
+            query = query.filter(FileRecord.id.in_(file_ids))
+        elif channel:
+            query = query.filter(FileRecord.channel == channel)
+        else:
+            return jsonify({'error': '请指定文件ID或频道'}), 400
+        
+        file_records = query.order_by(asc(FileRecord.upload_time), asc(FileRecord.id)).limit(ARCHIVE_MAX_FILES + 1).all()
+        if len(file_records) > ARCHIVE_MAX_FILES:
+            return jsonify({'error': f'一次最多打包 {ARCHIVE_MAX_FILES} 个文件'}), 400
+        
+        files = []
+        for file_record in file_records:
+            try:
+                stat = os.stat(file_record.file_path)
+            except OSError:
+                continue
+            files.append((file_record, stat))
+        
+        if not files:
+            abort(404)
+        
+        names = unique_names([file_record.original_filename for file_record, _ in files])
+        entries = []
+        digest = hashlib.sha256()
+        for name, (file_record, stat) in zip(names, files):
+            entry = ZipEntry(
+                name,
+                file_record.file_path,
+                stat.st_size,
+                get_file_crc32(file_record, file_record.file_path, stat),
+                file_record.upload_time or datetime.fromtimestamp(stat.st_mtime)
+            )
+            entries.append(entry)
+            digest.update(f'{entry.name}\0{make_etag(entry.path, file_record.file_hash)}\0{entry.size}\0{entry.crc32}\n'.encode('utf-8'))
+        
+        archive = ZipArchive(entries)
+        download_name = archive_name(request.args.get('name'), channel if not ids and channel else 'lanshare')
+        
+        return serve_content(
+            archive.size,
+            archive.iter_range,
+            etag=digest.hexdigest(),
+            last_modified=max(stat.st_mtime for _, stat in files),
+            mimetype='application/zip',
+            download_name=f'{download_name}.zip',
+            as_attachment=True,
+            max_age=None
         )
     
     finally:
@@ -1103,68 +1523,13 @@ def preview_chat_file(message_id):
         # 获取文件类型
         mime_type = mimetypes.guess_type(message.file_name)[0] or 'application/octet-stream'
         
-        # 支持Range请求（用于视频/音频流式传输）
-        range_header = request.headers.get('Range')
-        file_size = os.path.getsize(file_path)
-        
-        if range_header:
-            # 解析Range头
-            byte_start = 0
-            byte_end = file_size - 1
-            
-            range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if range_match:
-                byte_start = int(range_match.group(1))
-                if range_match.group(2):
-                    byte_end = int(range_match.group(2))
-            
-            # 确保范围有效
-            byte_start = max(0, min(byte_start, file_size - 1))
-            byte_end = max(byte_start, min(byte_end, file_size - 1))
-            content_length = byte_end - byte_start + 1
-            
-            # 读取指定范围的文件内容
-            def generate():
-                with open(file_path, 'rb') as f:
-                    f.seek(byte_start)
-                    remaining = content_length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-            
-            response = Response(
-                generate(),
-                206,  # Partial Content
-                headers={
-                    'Content-Type': mime_type,
-                    'Accept-Ranges': 'bytes',
-                    'Content-Range': f'bytes {byte_start}-{byte_end}/{file_size}',
-                    'Content-Length': str(content_length),
-                    'Cache-Control': 'public, max-age=3600',
-                }
-            )
-            return response
-        else:
-            # 普通请求，返回完整文件
-            response = send_file(
-                file_path,
-                as_attachment=False,
-                download_name=message.file_name,
-                mimetype=mime_type,
-                conditional=True,
-                etag=True,
-                max_age=3600
-            )
-            
-            # 设置额外的响应头
-            response.headers['Accept-Ranges'] = 'bytes'
-            response.headers['Cache-Control'] = 'public, max-age=3600'
-            
-            return response
+        # 支持Range请求（用于视频/音频流式传输）和条件请求
+        return serve_file(
+            file_path,
+            mimetype=mime_type,
+            download_name=message.file_name,
+            etag=make_etag(file_path, message.file_hash)
+        )
             
     except Exception as e:
         print(f"聊天文件预览错误: {str(e)}")
@@ -1174,7 +1539,7 @@ def preview_chat_file(message_id):
 
 @app.route('/api/messages/<int:message_id>/file/download')
 def download_chat_file(message_id):
-    """下载聊天文件（基于消息ID）"""
+    """下载聊天文件（基于消息ID，支持断点续传）"""
     session = Session()
     
     try:
@@ -1192,10 +1557,13 @@ def download_chat_file(message_id):
         if not file_path or not os.path.exists(file_path):
             abort(404)
             
-        return send_file(
+        return serve_file(
             file_path,
+            mimetype=mimetypes.guess_type(message.file_name)[0],
+            download_name=message.file_name,
             as_attachment=True,
-            download_name=message.file_name
+            etag=make_etag(file_path, message.file_hash),
+            max_age=None
         )
         
     except Exception as e:
@@ -1267,67 +1635,20 @@ def preview_file(file_id):
         
         # 获取文件大小用于优化传输
         file_size = os.path.getsize(file_path)
-
-        # 对视频/音频支持 Range 请求，确保可拖动播放
-        if file_record.file_type in ['video', 'audio']:
-            range_header = request.headers.get('Range')
-            if range_header:
-                # 解析 Range: bytes=start-end
-                try:
-                    units, rng = range_header.split('=')
-                    if units.strip() == 'bytes':
-                        start_str, end_str = rng.split('-')
-                        range_start = int(start_str) if start_str else 0
-                        range_end = int(end_str) if end_str else file_size - 1
-                        range_start = max(0, range_start)
-                        range_end = min(file_size - 1, range_end)
-                        if range_start > range_end:
-                            range_start = 0
-                            range_end = file_size - 1
-
-                        length = range_end - range_start + 1
-
-                        def generate():
-                            with open(file_path, 'rb') as f:
-                                f.seek(range_start)
-                                remaining = length
-                                chunk_size = 8192
-                                while remaining > 0:
-                                    read_size = min(chunk_size, remaining)
-                                    data = f.read(read_size)
-                                    if not data:
-                                        break
-                                    remaining -= len(data)
-                                    yield data
-
-                        response = Response(generate(), status=206, mimetype=mime_type or 'application/octet-stream')
-                        response.headers.add('Content-Range', f'bytes {range_start}-{range_end}/{file_size}')
-                        response.headers.add('Accept-Ranges', 'bytes')
-                        response.headers.add('Content-Length', str(length))
-                        response.headers['Cache-Control'] = 'public, max-age=3600'
-                        response.headers['X-Content-Type-Options'] = 'nosniff'
-                        return response
-                except Exception as e:
-                    # 如果 Range 解析失败，回退到整文件
-                    print(f"Range 解析失败，回退整文件: {e}")
-
-        # 非 Range 或图片等类型：整文件返回，并开启条件请求
-        response = send_file(
+        
+        headers = {'X-Content-Type-Options': 'nosniff'}
+        if file_size > 1024 * 1024:
+            headers['X-Accel-Buffering'] = 'no'
+        
+        # 统一处理Range（视频/音频拖动播放）与条件请求
+        return serve_file(
             file_path,
-            as_attachment=False,
-            download_name=file_record.original_filename,
             mimetype=mime_type,
-            conditional=True,
-            etag=True,
-            max_age=3600
+            download_name=file_record.original_filename,
+            etag=make_etag(file_path, file_record.file_hash),
+            file_size=file_size,
+            headers=headers
         )
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['Accept-Ranges'] = 'bytes'
-        if file_size > 1024 * 1024:
-            response.headers['X-Accel-Buffering'] = 'no'
-            print(f"大文件预览优化: {file_record.original_filename} ({file_size} bytes)")
-        return response
         
     except Exception as e:
         print(f"预览文件错误: {str(e)}")
@@ -1335,45 +1656,133 @@ def preview_file(file_id):
     finally:
         session.close()
 
+def serve_thumbnail(file_path, file_hash, original_filename):
+    """返回图片缩略图，宽度由查询参数 w 指定"""
+    try:
+        width = snap_width(int(request.args.get('w', 256)))
+    except ValueError:
+        return jsonify({'error': '无效的宽度'}), 400
+    
+    # 浏览器支持时使用WebP，否则使用JPEG
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    key = make_etag(file_path, file_hash)
+    
+    try:
+        thumbnail_path = thumbnail_cache.get(file_path, key, width, fmt, timeout=60)
+    except Exception as e:
+        print(f"生成缩略图失败: {str(e)}")
+        return jsonify({'error': '无法生成缩略图'}), 415
+    
+    # 存储名不可变，缩略图可以永久缓存
+    return serve_file(
+        thumbnail_path,
+        mimetype=THUMBNAIL_FORMATS[fmt][1],
+        download_name=f'{os.path.splitext(original_filename)[0]}.{fmt}',
+        etag=f'{key}-{width}.{fmt}',
+        headers={
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept'
+        }
+    )
+
+@app.route('/api/files/<int:file_id>/thumbnail')
+def file_thumbnail(file_id):
+    """传输文件的图片缩略图"""
+    session = Session()
+    
+    try:
+        file_record = session.query(FileRecord).filter(
+            FileRecord.id == file_id,
+            FileRecord.is_deleted == False
+        ).first()
+        
+        if not file_record or not os.path.exists(file_record.file_path):
+            abort(404)
+        
+        if file_record.file_type != 'image':
+            return jsonify({'error': '该文件类型不支持缩略图'}), 415
+        
+        return serve_thumbnail(file_record.file_path, file_record.file_hash, file_record.original_filename)
+    
+    finally:
+        session.close()
+
+@app.route('/api/messages/<int:message_id>/file/thumbnail')
+def chat_file_thumbnail(message_id):
+    """聊天文件的图片缩略图"""
+    session = Session()
+    
+    try:
+        message = session.query(Message).filter(
+            Message.id == message_id,
+            Message.message_type == 'file',
+            Message.is_deleted == False
+        ).first()
+        
+        if not message or not message.file_path or not os.path.exists(message.file_path):
+            abort(404)
+        
+        if message.file_type != 'image':
+            return jsonify({'error': '该文件类型不支持缩略图'}), 415
+        
+        return serve_thumbnail(message.file_path, message.file_hash, message.file_name)
+    
+    finally:
+        session.close()
+
 @app.route('/api/files/<int:file_id>', methods=['DELETE'])
 def delete_file(file_id):
     """删除文件"""
+    files = FileRecord.__table__
     session = Session()
     
     try:
-        file_record = session.query(FileRecord).filter(
-            FileRecord.id == file_id
+        # 标记删除用条件UPDATE：并发删除或与过期清理同时进行时只有一个请求生效并释放文件
+        file_record = session.execute(
+            files.update()
+            .where(files.c.id == file_id, files.c.is_deleted == False)
+            .values(is_deleted=True)
+            .returning(files.c.channel, files.c.file_size, files.c.file_hash, files.c.file_path)
         ).first()
         
-        if not file_record:
-            return jsonify({'error': '文件不存在'}), 404
-        
-        # 标记为已删除
-        file_record.is_deleted = True
+        if file_record is None:
+            # 不存在，或已被删除（重复删除时不再释放文件）
+            channel = session.execute(select(files.c.channel).where(files.c.id == file_id)).scalar()
+            if channel is None:
+                return jsonify({'error': '文件不存在'}), 404
+        else:
+            channel = file_record.channel
+            channel_store.counts(session, channel, files=-1, size=-file_record.file_size)
         session.commit()
         
         # 删除物理文件，正确处理相对路径和绝对路径
         try:
-            # 使用绝对路径，兼容相对路径和绝对路径
-            if os.path.isabs(file_record.file_path):
-                file_path = file_record.file_path
+            if file_record is None:
+                pass
+            elif file_record.file_hash:
+                # 内容寻址存储：最后一个引用释放时才删除blob
+                blob_store.release(file_record.file_hash)
             else:
-                # 如果是相对路径，则基于应用根目录解析
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_record.file_path)
-            
-            # 确保路径是绝对路径
-            file_path = os.path.abspath(file_path)
-            
-            if os.path.exists(file_path):
-                os.remove(file_path)
+                # 使用绝对路径，兼容相对路径和绝对路径
+                if os.path.isabs(file_record.file_path):
+                    file_path = file_record.file_path
+                else:
+                    # 如果是相对路径，则基于应用根目录解析
+                    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_record.file_path)
+                
+                # 确保路径是绝对路径
+                file_path = os.path.abspath(file_path)
+                
+                if os.path.exists(file_path):
+                    os.remove(file_path)
         except Exception as e:
             print(f"删除文件时出错: {str(e)}")
             pass
         
-        # 通知所有客户端
-        socketio.emit('file_deleted', {
+        # 通知频道内的客户端
+        event_dispatcher.publish(channel, 'file_deleted', {
             'file_id': file_id
-        }, room=file_record.channel)
+        })
         
         return jsonify({'message': '文件删除成功'})
     
@@ -1404,73 +1813,158 @@ def extend_file_expiry(file_id):
         # 延长过期时间
         file_record.expire_time = file_record.expire_time + timedelta(days=days)
         session.commit()
+        expiry_reaper.schedule(file_record.id, file_record.expire_time)
+        # 即将过期的文件数可能变化
+        channel_store.touch(file_record.channel)
         
-        # 计算新的剩余时间
-        current_time = datetime.now()
-        time_remaining = file_record.expire_time - current_time
-        total_seconds = int(time_remaining.total_seconds())
-        
-        remaining_days = total_seconds // (24 * 3600)
-        remaining_hours = (total_seconds % (24 * 3600)) // 3600
-        remaining_minutes = (total_seconds % 3600) // 60
+        remaining = remaining_time(file_record.expire_time, datetime.now())
         
-        if remaining_days > 0:
-            remaining_text = f"{remaining_days}天"
-        elif remaining_hours > 0:
-            remaining_text = f"{remaining_hours}小时{remaining_minutes}分钟"
-        else:
-            remaining_text = f"{remaining_minutes}分钟"
-        
-        # 通知所有客户端文件过期时间已更新
-        socketio.emit('file_expiry_extended', {
+        # 通知频道内的客户端文件过期时间已更新
+        event_dispatcher.publish(file_record.channel, 'file_expiry_extended', {
             'file_id': file_id,
             'expire_time': int(file_record.expire_time.timestamp() * 1000),
-            'remaining_text': remaining_text,
-            'remaining_days': remaining_days,
-            'remaining_hours': remaining_hours,
-            'remaining_minutes': remaining_minutes,
-            'total_remaining_seconds': total_seconds
-        }, room=file_record.channel)
+            'remaining_text': remaining['remaining_text'],
+            'remaining_days': remaining['remaining_days'],
+            'remaining_hours': remaining['remaining_hours'],
+            'remaining_minutes': remaining['remaining_minutes'],
+            'total_remaining_seconds': remaining['total_remaining_seconds']
+        })
         
         return jsonify({
             'message': f'文件过期时间已延长{days}天',
             'expire_time': int(file_record.expire_time.timestamp() * 1000),
-            'remaining_text': remaining_text
+            'remaining_text': remaining['remaining_text']
         })
     
     finally:
         session.close()
 
+# 消息列表单页最多返回的条数
+MESSAGE_PAGE_MAX_LIMIT = 200
+
 @app.route('/api/messages', methods=['GET'])
 def get_messages():
-    """获取消息列表"""
+    """获取消息列表（按时间升序返回）
+    
+    传入 limit 时分页：默认返回最新的一页，before_id 向前翻页，
+    after_id 获取某条消息之后的新消息（用于断线重连补齐）。
+    不传 limit 且没有游标时返回全部消息（兼容旧客户端）。
+    """
     channel = request.args.get('channel', 'default')
-    session = Session()
     
     try:
-        messages = session.query(Message).filter(
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+    except ValueError:
+        return jsonify({'error': '无效的分页参数'}), 400
+    if limit is not None:
+        limit = min(max(limit, 1), MESSAGE_PAGE_MAX_LIMIT)
+    if before_id is not None and after_id is not None:
+        return jsonify({'error': 'before_id 和 after_id 不能同时使用'}), 400
+    
+    # 在查询前读取序号，之后的变更都能通过增量同步拿到
+    sync_seq = event_log.current(channel)
+    
+    anchor = None
+    cursor_id = before_id if before_id is not None else after_id
+    if cursor_id is not None:
+        # 游标消息被删除后仍保留记录，可以继续作为分页位置
+        session = Session()
+        try:
+            anchor = session.query(Message.send_time, Message.id).filter(
+                Message.id == cursor_id,
+                Message.channel == channel
+            ).first()
+        finally:
+            session.close()
+        if not anchor:
+            return jsonify({'error': '无效的消息游标'}), 400
+    
+    def build():
+        # 只查询列表需要的列，不构造ORM对象
+        query = select(*MESSAGE_COLUMNS).where(
             Message.channel == channel,
             Message.is_deleted == False
-        ).order_by(asc(Message.send_time)).all()
-        
-        message_list = []
-        for msg in messages:
-            message_list.append({
-                'id': msg.id,
-                'content': msg.content,
-                'sender_name': msg.sender_name,
-                'send_time': int(msg.send_time.timestamp() * 1000),  # 返回毫秒时间戳
-                'message_type': msg.message_type,
-                'file_id': msg.file_id,
-                'file_name': msg.file_name,
-                'file_size': msg.file_size,
-                'file_type': msg.file_type
-            })
+        )
+        sort_key = tuple_(Message.send_time, Message.id)
+        if anchor is not None:
+            query = query.where(sort_key < tuple(anchor) if before_id is not None else sort_key > tuple(anchor))
+        
+        if after_id is not None:
+            query = query.order_by(asc(Message.send_time), asc(Message.id))
+        elif limit is not None:
+            # 从最新的消息开始往前取，返回前再转为升序
+            query = query.order_by(desc(Message.send_time), desc(Message.id))
+        else:
+            query = query.order_by(asc(Message.send_time), asc(Message.id))
         
-        return jsonify({'messages': message_list})
+        has_more = False
+        session = Session()
+        try:
+            if limit is None:
+                rows = fetch_rows(session, query)
+            else:
+                # 多取一条用于判断是否还有更多
+                rows = fetch_rows(session, query.limit(limit + 1))
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                if after_id is None:
+                    rows.reverse()
+        finally:
+            session.close()
+        
+        result = {'messages': [message_item(row) for row in rows], 'epoch': event_log.epoch, 'seq': sync_seq}
+        if limit is not None:
+            result['has_more'] = has_more
+        return result
     
-    finally:
-        session.close()
+    key = ('messages', channel, limit, before_id, after_id)
+    return cached_list(key, (sync_seq, channel_store.version()), build)
+
+# 搜索结果单页最多返回的条数
+SEARCH_PAGE_MAX_LIMIT = 100
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """在频道内搜索文件（文件名、上传者）或聊天消息
+    
+    参数：q 搜索词（多个词用空格分隔，全部出现才匹配），type（files/messages，默认files），
+    limit，cursor（上一页返回的 next_cursor）。结果按从新到旧排列。
+    """
+    query = request.args.get('q', '').strip()
+    channel = request.args.get('channel', 'default')
+    search_type = request.args.get('type', 'files')
+    if not query:
+        return jsonify({'error': '搜索词不能为空'}), 400
+    if len(query) > 100:
+        return jsonify({'error': '搜索词不能超过100个字符'}), 400
+    if search_type not in ('files', 'messages'):
+        return jsonify({'error': '无效的搜索类型'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), SEARCH_PAGE_MAX_LIMIT)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': '无效的分页参数'}), 400
+    
+    try:
+        if search_type == 'files':
+            rows, has_more = search_index.files(channel, query, limit, cursor)
+            current_time = datetime.now()
+            items = [file_item(row, current_time) for row in rows]
+        else:
+            rows, has_more = search_index.messages(channel, query, limit, cursor)
+            items = [message_item(row) for row in rows]
+    except Exception as e:
+        print(f"搜索错误: {str(e)}")
+        return jsonify({'error': '搜索失败'}), 500
+    
+    return json_response({
+        search_type: items,
+        'has_more': has_more,
+        'next_cursor': rows[-1].id if has_more else None
+    })
 
 @app.route('/api/messages', methods=['POST'])
 def send_message():
@@ -1488,12 +1982,12 @@ def send_message():
     if not content:
         return jsonify({'error': '消息内容不能为空'}), 400
     
-    session = Session()
+    sender_ip = request.remote_addr
     
-    try:
+    def insert_message(session):
         message = Message(
             content=content,
-            sender_ip=request.remote_addr,
+            sender_ip=sender_ip,
             sender_name=sender_name,
             channel=channel,
             message_type=message_type,
@@ -1504,25 +1998,33 @@ def send_message():
         )
         
         session.add(message)
-        session.commit()
-        
+        channel_store.counts(session, channel, messages=1)
+        session.flush()  # 分配ID和发送时间
+        return message.id, message.send_time
+    
+    def publish_message(result):
+        message_id, send_time = result
         # 通过WebSocket广播消息
-        socketio.emit('new_message', {
-            'id': message.id,
+        event_dispatcher.publish(channel, 'new_message', {
+            'id': message_id,
             'content': content,
             'sender_name': sender_name,
-            'send_time': int(message.send_time.timestamp() * 1000),  # 返回毫秒时间戳
+            'send_time': int(send_time.timestamp() * 1000),  # 返回毫秒时间戳
             'message_type': message_type,
             'file_id': file_id,
             'file_name': file_name,
             'file_size': file_size,
             'file_type': file_type
-        }, room=channel)
-        
-        return jsonify({'message': '消息发送成功'})
+        })
     
-    finally:
-        session.close()
+    # 由写线程与其他请求的写入合并提交；等待超时时消息仍会保存，由写线程在提交后广播
+    try:
+        result = write_queue.submit(insert_message, on_commit=publish_message)
+    except WriteTimeout:
+        return jsonify({'error': '服务器繁忙，消息将稍后保存'}), 503
+    publish_message(result)
+    
+    return jsonify({'message': '消息发送成功'})
 
 @app.route('/api/messages/file', methods=['POST'])
 def send_file_message():
@@ -1557,66 +2059,17 @@ def send_file_message():
         os.makedirs(upload_folder, exist_ok=True)
         file_path = os.path.join(upload_folder, unique_filename)
         
-        # 保存文件
-        file.save(file_path)
-        
-        # 验证文件确实已保存
-        if not os.path.exists(file_path):
-            return jsonify({'error': '文件保存失败'}), 500
+        # 保存文件（直写流只需重命名），再放入内容寻址存储
+        file_size, file_hash, file_crc = save_upload(file, file_path)
+        file_path, file_size, file_hash = store_blob(file_path, file_size, file_hash, file_crc)
             
-        file_size = os.path.getsize(file_path)
-        
-        # 保存到数据库（只创建消息记录，不创建文件记录）
-        session = Session()
-        
         try:
-            # 创建聊天文件消息记录（独立于传输文件系统）
-            message = Message(
-                content=content or f'发送了文件: {original_filename}',
-                sender_ip=request.remote_addr,
-                sender_name=sender_name,
-                channel=channel,
-                message_type='file',
-                file_id=None,  # 聊天文件不关联传输文件ID
-                file_path=file_path,  # 直接保存文件路径
-                file_name=original_filename,  # 保存原始文件名用于显示
-                file_size=file_size,
-                file_type=get_file_type(original_filename)
-            )
-            
-            session.add(message)
-            session.commit()
-            
-            # 通过WebSocket通知所有客户端
-            socketio.emit('new_message', {
-                'id': message.id,
-                'content': message.content,
-                'sender_name': sender_name,
-                'send_time': int(message.send_time.timestamp() * 1000),
-                'message_type': 'file',
-                'file_id': message.id,  # 使用消息ID作为文件标识
-                'file_name': original_filename,  # 使用原始文件名
-                'file_size': file_size,
-                'file_type': get_file_type(original_filename)
-            }, room=channel)
-            
-            return jsonify({
-                'message': '文件消息发送成功',
-                'message_id': message.id
-            })
-            
+            result = save_file_message(file_path, original_filename, content, channel, sender_name, file_size, file_hash)
+            result['sha256'] = file_hash
+            return jsonify(result)
         except Exception as db_error:
-            # 数据库错误时删除已保存的文件
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except:
-                pass
             return jsonify({'error': f'数据库保存失败: {str(db_error)}'}), 500
             
-        finally:
-            session.close()
-            
     except Exception as e:
         print(f"文件消息发送错误: {str(e)}")
         return jsonify({'error': f'文件消息发送失败: {str(e)}'}), 500
@@ -1624,70 +2077,288 @@ def send_file_message():
 @app.route('/api/messages/<int:message_id>', methods=['DELETE'])
 def delete_message(message_id):
     """删除消息"""
-    session = Session()
-    
-    try:
-        message_record = session.query(Message).filter(
-            Message.id == message_id
+    def mark_deleted(session):
+        messages = Message.__table__
+        # 条件UPDATE：多个工作进程同时删除同一条消息时只有一个生效并释放聊天文件
+        message_record = session.execute(
+            messages.update()
+            .where(messages.c.id == message_id, messages.c.is_deleted == False)
+            .values(is_deleted=True)
+            .returning(messages.c.channel, messages.c.file_size, messages.c.file_path, messages.c.file_hash)
         ).first()
         
-        if not message_record:
-            return jsonify({'error': '消息不存在'}), 404
+        if message_record is None:
+            # 不存在，或已被删除
+            channel = session.execute(select(messages.c.channel).where(messages.c.id == message_id)).scalar()
+            return None if channel is None else (channel, None, True)
         
-        # 标记为已删除
-        message_record.is_deleted = True
-        session.commit()
+        # 只有聊天文件计入频道的文件大小
+        size = (message_record.file_size or 0) if message_record.file_path else 0
+        channel_store.counts(session, message_record.channel, messages=-1, size=-size)
+        return message_record.channel, message_record.file_hash, False
+    
+    def finish_delete(deleted):
+        if deleted is None:
+            return
+        channel, file_hash, already_deleted = deleted
         
-        # 通知所有客户端
-        socketio.emit('message_deleted', {
-            'message_id': message_id
-        }, room=message_record.channel)
+        # 释放聊天文件的blob引用
+        if file_hash and not already_deleted:
+            try:
+                blob_store.release(file_hash)
+            except Exception as e:
+                print(f"删除聊天文件时出错: {str(e)}")
         
-        return jsonify({'message': '消息删除成功'})
+        # 通知频道内的客户端
+        event_dispatcher.publish(channel, 'message_deleted', {
+            'message_id': message_id
+        })
     
-    finally:
-        session.close()
+    # 由写线程与其他请求的写入合并提交；等待超时时删除仍会执行，由写线程在提交后通知
+    try:
+        deleted = write_queue.submit(mark_deleted, on_commit=finish_delete)
+    except WriteTimeout:
+        return jsonify({'error': '服务器繁忙，消息将稍后删除'}), 503
+    if deleted is None:
+        return jsonify({'error': '消息不存在'}), 404
+    finish_delete(deleted)
+    
+    return jsonify({'message': '消息删除成功'})
 
-# 全局频道管理API
-@app.route('/api/channels', methods=['GET'])
-def get_channels():
-    """获取全局频道列表"""
-    session = Session()
+# 断点续传上传API
+@app.route('/api/uploads', methods=['POST'])
+def create_upload_session():
+    """创建断点续传上传会话"""
+    data = request.get_json() or {}
+    original_filename = (data.get('filename') or '').strip()
+    target = data.get('target', 'file')  # file: 传输文件列表, message: 聊天文件
+    
+    if not original_filename:
+        return jsonify({'error': '没有选择文件'}), 400
+    if not secure_filename(original_filename):
+        return jsonify({'error': '文件名无效'}), 400
+    if target not in ['file', 'message']:
+        return jsonify({'error': '上传目标无效'}), 400
     
     try:
-        # 从settings.json中读取频道列表
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        channels = ['default']
-        
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-                saved_channels = settings.get('channels', [])
-                if isinstance(saved_channels, list):
-                    channels = list(set(['default'] + saved_channels))
-        
-        # 同时获取已使用过的频道，确保向后兼容
-        file_channels = session.query(FileRecord.channel).distinct().all()
-        message_channels = session.query(Message.channel).distinct().all()
-        
-        used_channels = set()
-        for (channel,) in file_channels + message_channels:
-            if channel and channel.strip() and channel.strip() != 'default':
-                used_channels.add(channel.strip())
-        
-        # 合并保存的频道和已使用的频道
-        all_channels = list(set(channels + list(used_channels)))
+        total_size = int(data.get('size'))
+        chunk_size = int(data.get('chunk_size') or app.config['UPLOAD_CHUNK_SIZE'])
+    except (TypeError, ValueError):
+        return jsonify({'error': '文件大小无效'}), 400
+    if chunk_size <= 0:
+        return jsonify({'error': '分片大小无效'}), 400
+    
+    try:
+        meta = upload_sessions.create(
+            original_filename,
+            total_size,
+            target=target,
+            chunk_size=chunk_size,
+            extra={
+                'channel': data.get('channel', 'default'),
+                'uploader_name': data.get('uploader_name') or data.get('sender_name') or '匿名用户',
+                'content': (data.get('message_content') or data.get('content') or '').strip()
+            }
+        )
+        return jsonify(upload_sessions.get(meta['upload_id'])), 201
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """查询上传会话已接收的字节区间"""
+    try:
+        return jsonify(upload_sessions.get(upload_id))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """按分片序号上传数据（偏移量 = 序号 × 分片大小）"""
+    try:
+        meta = upload_sessions.get(upload_id)
+        return jsonify(upload_sessions.write_chunk(
+            upload_id,
+            index * meta['chunk_size'],
+            request.stream,
+            request.content_length,
+            sha256=request.headers.get('X-Chunk-SHA256')
+        ))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def patch_upload_chunk(upload_id):
+    """按字节偏移量上传数据（Upload-Offset 请求头或 offset 参数）"""
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+    except ValueError:
+        return jsonify({'error': '缺少上传偏移量'}), 400
+    
+    try:
+        return jsonify(upload_sessions.write_chunk(
+            upload_id,
+            offset,
+            request.stream,
+            request.content_length,
+            sha256=request.headers.get('X-Chunk-SHA256')
+        ))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    """完成上传，生成传输文件记录或聊天文件消息"""
+    try:
+        meta = upload_sessions.get(upload_id)
+        original_filename = meta['filename']
+        unique_filename = f"{uuid.uuid4()}_{secure_filename(original_filename)}"
         
-        # 按字母排序，但默认频道排在最前
-        sorted_channels = sorted(all_channels)
-        if 'default' in sorted_channels:
-            sorted_channels.remove('default')
-            sorted_channels.insert(0, 'default')
+        upload_folder = app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        file_path = os.path.join(upload_folder, unique_filename)
         
-        return jsonify({'channels': sorted_channels})
+        meta = upload_sessions.finalize(upload_id, file_path)
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
     
-    finally:
-        session.close()
+    extra = meta.get('extra', {})
+    channel = extra.get('channel', 'default')
+    try:
+        file_path, file_size, file_hash = store_blob(file_path)
+    except Exception as e:
+        print(f"保存上传文件失败: {str(e)}")
+        return jsonify({'error': f'文件保存失败: {str(e)}'}), 500
+    
+    try:
+        if meta['target'] == 'message':
+            result = save_file_message(file_path, original_filename, extra.get('content'), channel, extra.get('uploader_name', '匿名用户'), file_size, file_hash)
+        else:
+            result = save_file_record(file_path, original_filename, channel, extra.get('uploader_name', '匿名用户'), file_size, file_hash)
+        return jsonify(result)
+    except Exception as db_error:
+        return jsonify({'error': f'数据库保存失败: {str(db_error)}'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload_session(upload_id):
+    """取消上传会话并删除已接收的分片"""
+    try:
+        upload_sessions.discard(upload_id)
+        return jsonify({'message': '上传已取消'})
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+# 秒传API
+@app.route('/api/files/precheck', methods=['POST'])
+def precheck_upload():
+    """秒传预检查：服务器已有相同内容时直接创建记录，无需再上传文件内容
+
+    仅凭哈希值不能获取文件：服务器已有该内容时，第一次请求返回 challenge
+    （令牌和服务端随机选择的抽样位置），客户端带上 challenge.token 和这些位置的
+    抽样块哈希再次请求，校验通过后才创建记录。未完成校验时返回 exists: false，
+    客户端按普通上传处理。
+    """
+    data = request.get_json() or {}
+    original_filename = (data.get('filename') or '').strip()
+    target = data.get('target', 'file')  # file: 传输文件列表, message: 聊天文件
+    file_hash = (data.get('sha256') or '').strip().lower()
+    token = data.get('challenge')  # 第一次请求返回的 challenge.token
+    samples = data.get('samples') or []  # challenge 中各抽样位置的哈希 [{offset, length, sha256}]
+    
+    if not original_filename:
+        return jsonify({'error': '没有选择文件'}), 400
+    if not secure_filename(original_filename):
+        return jsonify({'error': '文件名无效'}), 400
+    if target not in ['file', 'message']:
+        return jsonify({'error': '上传目标无效'}), 400
+    if not is_sha256(file_hash):
+        return jsonify({'error': '文件哈希无效'}), 400
+    try:
+        file_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '文件大小无效'}), 400
+    if not isinstance(samples, list) or len(samples) > 32:
+        return jsonify({'error': '抽样数据无效'}), 400
+    
+    blob_path = blob_store.lookup(file_hash, file_size)
+    if not blob_path:
+        return jsonify({'exists': False})
+    
+    # 抽样位置必须是服务端签发的，客户端自选的抽样不被接受
+    if file_size > 0:
+        try:
+            issued = bool(token and samples) and precheck_signer.verify(
+                str(token), sample_key(file_hash, file_size, samples)
+            )
+            if issued and not verify_samples(blob_path, samples):
+                return jsonify({'error': '抽样校验失败'}), 409
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': '抽样数据无效'}), 400
+        if not issued:
+            chosen = choose_samples(file_size)
+            return jsonify({'exists': False, 'challenge': {
+                'token': precheck_signer.issue(sample_key(file_hash, file_size, chosen)),
+                'samples': chosen
+            }})
+    
+    blob_path = blob_store.acquire(file_hash, file_size)
+    if not blob_path:
+        return jsonify({'exists': False})
+    
+    channel = data.get('channel', 'default')
+    sender_name = data.get('uploader_name') or data.get('sender_name') or '匿名用户'
+    try:
+        if target == 'message':
+            content = (data.get('message_content') or data.get('content') or '').strip()
+            result = save_file_message(blob_path, original_filename, content, channel, sender_name, file_size, file_hash)
+        else:
+            result = save_file_record(blob_path, original_filename, channel, sender_name, file_size, file_hash)
+    except Exception as db_error:
+        return jsonify({'error': f'数据库保存失败: {str(db_error)}'}), 500
+    
+    result['exists'] = True
+    return jsonify(result)
+
+# 增量同步API
+def channel_sync_result(channel, since, epoch):
+    """返回频道在 since 之后的变更事件，无法增量同步时要求客户端重新加载"""
+    events = event_log.since(channel, since, epoch)
+    if events is None:
+        return {'channel': channel, 'epoch': event_log.epoch, 'seq': event_log.current(channel), 'reset': True}
+    return {
+        'channel': channel,
+        'epoch': event_log.epoch,
+        'seq': events[-1]['seq'] if events else since,
+        'reset': False,
+        'events': events
+    }
+
+@app.route('/api/events', methods=['GET'])
+def get_channel_events():
+    """获取频道在指定序号之后的变更事件"""
+    channel = request.args.get('channel', 'default')
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'error': '无效的序号'}), 400
+    return jsonify(channel_sync_result(channel, since, request.args.get('epoch')))
+
+# 全局频道管理API
+@app.route('/api/channels', methods=['GET'])
+def get_channels():
+    """获取全局频道列表"""
+    # 频道列表缓存在内存中（default排在最前，其余按名称排序），不再扫描文件和消息表
+    return jsonify({'channels': channel_store.names(), 'online': channel_registry.counts()})
+
+@app.route('/api/channels/stats', methods=['GET'])
+def get_channel_stats():
+    """获取各频道的统计：文件数、文件总大小、消息数、最近活动时间和即将过期的文件数"""
+    expiring_window = app.config['EXPIRING_SOON_HOURS'] * 3600
+    return jsonify({
+        'channels': channel_store.stats(expiring_window),
+        'expiring_window': expiring_window,
+        'online': channel_registry.counts()
+    })
 
 @app.route('/api/channels', methods=['POST'])
 def create_channel():
@@ -1711,30 +2382,11 @@ def create_channel():
         if not re.match(r'^[\w\u4e00-\u9fff\-]+$', channel_name):
             return jsonify({'error': '频道名称包含非法字符'}), 400
         
-        # 读取当前设置
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        settings = {}
-        
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-        
-        # 获取或创建频道列表
-        if 'channels' not in settings:
-            settings['channels'] = []
-        
-        # 检查频道是否已存在
-        if channel_name in settings['channels']:
-            return jsonify({'error': '频道已存在'}), 400
-        
-        # 添加新频道
-        settings['channels'].append(channel_name)
-        
-        # 保存设置
-        with open(settings_file, 'w') as f:
-            json.dump(settings, f, indent=2)
+        channel_store.create(channel_name)
         
         return jsonify({'message': '频道创建成功', 'channel': channel_name})
+    except ChannelError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         print(f'创建频道失败: {e}')
         return jsonify({'error': '创建频道失败'}), 500
@@ -1750,30 +2402,12 @@ def delete_channel(channel_name):
         if not channel_name or channel_name == 'default':
             return jsonify({'error': '不能删除默认频道'}), 400
         
-        # 读取当前设置
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        settings = {}
-        
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-        
-        # 获取频道列表
-        if 'channels' not in settings:
-            settings['channels'] = []
-        
-        # 检查频道是否存在
-        if channel_name not in settings['channels']:
-            return jsonify({'error': f'频道 "{channel_name}" 不存在'}), 404
-        
-        # 删除频道
-        settings['channels'] = [ch for ch in settings['channels'] if ch != channel_name]
-        
-        # 保存设置
-        with open(settings_file, 'w') as f:
-            json.dump(settings, f, indent=2)
+        # 只从频道列表中删除，频道中的文件和消息保持不变
+        channel_store.delete(channel_name)
         
         return jsonify({'message': '频道删除成功', 'channel': channel_name})
+    except ChannelError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         print(f'删除频道失败: {e}')
         return jsonify({'error': '删除频道失败'}), 500
@@ -1803,34 +2437,13 @@ def rename_channel(old_name):
         if len(new_name) > 50:
             return jsonify({'error': '频道名称不能超过50个字符'}), 400
         
-        # 读取当前设置
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        settings = {}
-        
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-        
-        # 获取频道列表
-        if 'channels' not in settings:
-            settings['channels'] = []
-        
-        # 检查原频道是否存在
-        if old_name not in settings['channels']:
-            return jsonify({'error': '原频道不存在'}), 404
-        
-        # 检查新频道名称是否已存在
-        if new_name in settings['channels']:
-            return jsonify({'error': '新频道名称已存在'}), 400
-        
-        # 重命名频道
-        settings['channels'] = [new_name if ch == old_name else ch for ch in settings['channels']]
-        
-        # 保存设置
-        with open(settings_file, 'w') as f:
-            json.dump(settings, f, indent=2)
+        # 原频道的文件和消息分批移动到新频道
+        moved = channel_store.rename(old_name, new_name)
+        print(f"频道 {old_name} 已重命名为 {new_name}，移动了 {moved} 条记录")
         
         return jsonify({'message': '频道重命名成功', 'old_name': old_name, 'new_name': new_name})
+    except ChannelError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         print(f'重命名频道失败: {e}')
         return jsonify({'error': '重命名频道失败'}), 500
@@ -1840,12 +2453,7 @@ def rename_channel(old_name):
 def get_setup_status():
     """检查是否需要首次设置"""
     try:
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-                return jsonify({'needsSetup': not settings.get('setupCompleted', False)})
-        return jsonify({'needsSetup': True})
+        return jsonify({'needsSetup': not settings_store.get('setupCompleted', False)})
     except Exception as e:
         print(f'检查设置状态失败: {e}')
         return jsonify({'needsSetup': True})
@@ -1862,32 +2470,32 @@ def first_setup():
         if use_password and (not password or len(password) < 4):
             return jsonify({'error': '密码长度至少为4位'}), 400
 
-        settings = {
+        new_settings = {
             'passwordEnabled': use_password,
             'password': None,
-            'setupCompleted': True,
-            'channels': ['工作区', '生活区']  # 添加默认频道
+            'setupCompleted': True
         }
         
         if use_password and password:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            settings['password'] = hashed_password.decode('utf-8')
+            new_settings['password'] = password_hasher.hash(password)
 
-        # 确保数据目录存在
-        data_dir = os.path.join(os.path.dirname(__file__), 'data')
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
+        # 首次设置覆盖全部设置
+        with settings_store.edit() as settings:
+            settings.clear()
+            settings.update(new_settings)
 
-        settings_file = os.path.join(data_dir, 'settings.json')
-        with open(settings_file, 'w') as f:
-            json.dump(settings, f, indent=2)
+        # 添加默认频道
+        for channel_name in ('工作区', '生活区'):
+            channel_store.create(channel_name, exist_ok=True)
 
         # 如果启用了密码，返回认证token
         response_data = {'success': True}
         if use_password:
-            response_data['token'] = 'authenticated'
+            response_data['token'] = token_signer.issue(new_settings['password'])
             
         return jsonify(response_data)
+    except AuthError as e:
+        return auth_error_response(e)
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -1899,16 +2507,12 @@ def first_setup():
 def get_settings():
     """获取当前设置"""
     try:
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-                return jsonify({
-                    'passwordEnabled': settings.get('passwordEnabled', False),
-                    'setupCompleted': settings.get('setupCompleted', False),
-                    'refreshLockEnabled': settings.get('refreshLockEnabled', False)
-                })
-        return jsonify({'passwordEnabled': False, 'setupCompleted': False, 'refreshLockEnabled': False})
+        settings = settings_store.snapshot()
+        return jsonify({
+            'passwordEnabled': settings.get('passwordEnabled', False),
+            'setupCompleted': settings.get('setupCompleted', False),
+            'refreshLockEnabled': settings.get('refreshLockEnabled', False)
+        })
     except Exception as e:
         print(f'获取设置失败: {e}')
         return jsonify({'error': '获取设置失败'}), 500
@@ -1920,21 +2524,22 @@ def verify_password():
         data = request.json
         password = data.get('password')
         
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        if not os.path.exists(settings_file):
-            return jsonify({'valid': True})
-
-        with open(settings_file, 'r') as f:
-            settings = json.load(f)
+        settings = settings_store.snapshot()
 
         if not settings.get('passwordEnabled', False):
             return jsonify({'valid': True})
 
         if not settings.get('password'):
-            return jsonify({'valid': True})
-
-        is_valid = bcrypt.checkpw(password.encode('utf-8'), settings['password'].encode('utf-8'))
-        return jsonify({'valid': is_valid})
+            return jsonify({'valid': True, 'token': token_signer.issue(None)})
+
+        client = request.remote_addr
+        login_limiter.attempt(client)
+        if not password_hasher.check(password, settings['password']):
+            return jsonify({'valid': False})
+        login_limiter.reset(client)
+        return jsonify({'valid': True, 'token': token_signer.issue(settings['password'])})
+    except AuthError as e:
+        return auth_error_response(e)
     except Exception as e:
         print(f'验证密码失败: {e}')
         return jsonify({'error': '验证失败'}), 500
@@ -1949,45 +2554,47 @@ def update_password():
         current_password = data.get('currentPassword')
         refresh_lock_enabled = data.get('refreshLockEnabled', False)
         
-        settings_file = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-        
-        # 读取当前设置
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings = json.load(f)
-        else:
-            settings = {'passwordEnabled': False, 'password': None}
-
-        # 如果当前启用了密码保护，需要验证当前密码
-        if settings.get('passwordEnabled', False) and settings.get('password'):
-            if not current_password:
-                return jsonify({'error': '当前密码不能为空'}), 400
-            
-            # 验证当前密码
-            try:
-                is_valid = bcrypt.checkpw(current_password.encode('utf-8'), settings['password'].encode('utf-8'))
+        # 读取最新设置，验证通过后修改并保存
+        with settings_store.edit() as settings:
+            # 如果当前启用了密码保护，需要验证当前密码
+            if settings.get('passwordEnabled', False) and settings.get('password'):
+                if not current_password:
+                    return jsonify({'error': '当前密码不能为空'}), 400
+                
+                # 验证当前密码
+                client = request.remote_addr
+                login_limiter.attempt(client)
+                try:
+                    is_valid = password_hasher.check(current_password, settings['password'])
+                except AuthError:
+                    raise
+                except Exception as e:
+                    print(f'密码验证失败: {e}')
+                    return jsonify({'error': '密码验证失败'}), 400
                 if not is_valid:
                     return jsonify({'error': '当前密码错误'}), 400
-            except Exception as e:
-                print(f'密码验证失败: {e}')
-                return jsonify({'error': '密码验证失败'}), 400
+                login_limiter.reset(client)
 
-        # 更新设置
-        settings['passwordEnabled'] = password_enabled
-        settings['refreshLockEnabled'] = refresh_lock_enabled
-        
-        if password_enabled and password:
-            if len(password) < 4:
+            if password_enabled and password and len(password) < 4:
                 return jsonify({'error': '密码长度至少为4位'}), 400
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            settings['password'] = hashed_password.decode('utf-8')
-        else:
-            settings['password'] = None
 
-        with open(settings_file, 'w') as f:
-            json.dump(settings, f, indent=2)
+            # 更新设置
+            settings['passwordEnabled'] = password_enabled
+            settings['refreshLockEnabled'] = refresh_lock_enabled
+            
+            if password_enabled and password:
+                settings['password'] = password_hasher.hash(password)
+            else:
+                settings['password'] = None
+            password_hash = settings['password']
 
-        return jsonify({'success': True})
+        # 令牌的签名密钥随密码变化，之前签发的令牌失效，返回新的令牌
+        response_data = {'success': True}
+        if password_enabled:
+            response_data['token'] = token_signer.issue(password_hash)
+        return jsonify(response_data)
+    except AuthError as e:
+        return auth_error_response(e)
     except Exception as e:
         print(f'更新密码设置失败: {e}')
         return jsonify({'error': '更新失败'}), 500
@@ -2001,6 +2608,15 @@ def health_check():
         'service': 'lanshare'
     }), 200
 
+@app.route('/api/system/metrics')
+def system_metrics():
+    """运行统计（本进程）：过期文件清理、写线程和列表缓存"""
+    return jsonify({
+        'expiry_reaper': expiry_reaper.metrics(),
+        'db_writer': write_queue.metrics(),
+        'list_cache': list_cache.metrics()
+    })
+
 @app.route('/api/system/version')
 def get_version():
     """获取系统版本信息"""
@@ -2281,10 +2897,87 @@ def check_version_from_source(source_type, repo, current_version, current_data):
     
     return None
 
+# WebSocket频道订阅
+def publish_presence(channel):
+    """通知本进程中频道内的客户端当前在线人数"""
+    event_dispatcher.publish(channel, 'presence', {
+        'channel': channel,
+        'online': channel_registry.count(channel)
+    })
+
+def broadcast_presence(channel):
+    """频道在线人数变化：通知本进程的客户端，多进程时同时上报给其他进程"""
+    publish_presence(channel)
+    if message_queue is not None:
+        try:
+            message_queue.publish_presence(channel_registry.local_counts([channel]))
+        except Exception as e:
+            print(f"上报在线人数失败: {e}")
+
+@socketio.on('join_channel')
+def handle_join_channel(data):
+    """客户端订阅频道"""
+    channel = normalize_channel(data)
+    if channel is None:
+        emit('error', {'error': '无效的频道名称'})
+        return
+    
+    join_room(channel)
+    if channel_registry.join(request.sid, channel):
+        broadcast_presence(channel)
+    else:
+        emit('presence', {'channel': channel, 'online': channel_registry.count(channel)})
+
+@socketio.on('leave_channel')
+def handle_leave_channel(data):
+    """客户端退出频道"""
+    channel = normalize_channel(data)
+    if channel is None:
+        return
+    
+    leave_room(channel)
+    if channel_registry.leave(request.sid, channel):
+        broadcast_presence(channel)
+
+@socketio.on('sync_channel')
+def handle_sync_channel(data):
+    """客户端重连后按序号增量同步（通过ack返回结果）"""
+    channel = normalize_channel(data)
+    if channel is None:
+        return {'error': '无效的频道名称'}
+    try:
+        since = int(data.get('since', -1))
+    except (TypeError, ValueError):
+        since = -1
+    return channel_sync_result(channel, since, data.get('epoch'))
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """连接断开时更新所在频道的在线人数（房间由Socket.IO自动清理）"""
+    for channel in channel_registry.disconnect(request.sid):
+        broadcast_presence(channel)
+
 if __name__ == '__main__':
     # 启动Flask应用
     port = int(os.environ.get('PORT', 7070))
     debug = os.environ.get('FLASK_ENV') == 'development'
+    server_mode = app.config['SERVER_MODE']
+    
+    if server_mode == 'gunicorn' and not debug:
+        try:
+            import gunicorn  # noqa: F401  Windows 上不可用
+        except ImportError:
+            print("未安装gunicorn或当前系统不支持，使用开发服务器")
+        else:
+            # 此时 app.py 已经初始化过一次，exec 后全部作废；Docker 镜像改用 serve.py 启动，不经过这里
+            from serve import run_gunicorn
+            print(f"Starting gunicorn on port {port}")
+            run_gunicorn()
+    
+    if app.config['MESSAGE_QUEUE'] == 'local':
+        # 开发服务器是唯一的进程，由它自己运行本机代理
+        from broker import LocalBroker
+        LocalBroker(port=app.config['LOCAL_BROKER_PORT']).start()
     
-    print(f"Starting server on port {port}")
+    print(f"Starting development server on port {port}")
     socketio.run(app, host='0.0.0.0', port=port, debug=debug, allow_unsafe_werkzeug=True)
\ No newline at end of file
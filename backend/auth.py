@@ -0,0 +1,154 @@
+"""
+密码保护：会话令牌、bcrypt 校验与尝试次数限制
+
+令牌格式为 <过期时间>.<随机数>.<签名>，签名是 HMAC-SHA256，密钥由服务端密钥和
+当前密码的哈希派生，所以：
+  - 校验只需要一次 HMAC 计算，不读文件也不查数据库
+  - 修改或关闭密码后，之前签发的令牌全部失效
+  - 令牌只包含 URL 安全的字符，可以直接作为 ?token= 参数放在预览/下载地址中
+
+bcrypt 校验在有界的线程池中执行，排队的校验数有上限，同一IP在时间窗口内的
+尝试次数也有上限，暴力尝试不会占满处理请求的线程。
+多进程部署时尝试次数按进程分别统计。
+"""
+
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from interprocess import file_lock
+
+
+class AuthError(Exception):
+    """密码校验被拒绝，status 为对应的HTTP状态码，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, status=429, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+def load_secret(path):
+    """读取服务端密钥，不存在时随机生成并保存（所有工作进程共用）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with file_lock(f'{path}.lock'):
+        if not os.path.exists(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+        with open(path, 'r') as f:
+            return f.read().strip()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class TokenSigner:
+    """签发和校验会话令牌"""
+
+    def __init__(self, secret, ttl):
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self._keys = {}  # 密码哈希 -> 派生的签名密钥
+
+    def _key(self, password_hash):
+        key = self._keys.get(password_hash)
+        if key is None:
+            key = hmac.new(self.secret, (password_hash or '').encode('utf-8'), hashlib.sha256).digest()
+            if len(self._keys) > 16:
+                self._keys.clear()
+            self._keys[password_hash] = key
+        return key
+
+    def _sign(self, key, payload):
+        return _b64(hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, password_hash):
+        """签发一个令牌"""
+        payload = f'{int(time.time()) + self.ttl}.{secrets.token_hex(8)}'
+        return f'{payload}.{self._sign(self._key(password_hash), payload)}'
+
+    def verify(self, token, password_hash):
+        """令牌签名正确且未过期时返回True"""
+        if not token:
+            return False
+        payload, _, signature = token.rpartition('.')
+        expires = payload.partition('.')[0]
+        if not (expires.isascii() and expires.isdigit()) or int(expires) < time.time():
+            return False
+        try:
+            expected = self._sign(self._key(password_hash), payload)
+        except UnicodeEncodeError:
+            return False
+        return hmac.compare_digest(expected, signature)
+
+
+class PasswordHasher:
+    """在有界线程池中执行bcrypt计算，排队已满时拒绝新的请求"""
+
+    def __init__(self, workers=2, max_pending=16, timeout=30):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lanshare-bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise AuthError('验证请求过多，请稍后再试', status=503, retry_after=1)
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(self.timeout)
+
+    def check(self, password, password_hash):
+        """校验密码；password 不是字符串时视为错误"""
+        if not isinstance(password, str) or not password_hash:
+            return False
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def hash(self, password):
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+class AttemptLimiter:
+    """限制每个客户端在 window 秒内的密码尝试次数，验证成功后清零"""
+
+    def __init__(self, max_attempts=10, window=300):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._lock = threading.Lock()
+        self._attempts = {}  # 客户端 -> 尝试时间队列
+
+    def attempt(self, client):
+        """记录一次尝试，超出限制时抛出 AuthError"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._attempts) > 10000:
+                self._prune(now)
+            attempts = self._attempts.setdefault(client, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.max_attempts:
+                retry_after = int(attempts[0] + self.window - now) + 1
+                raise AuthError('尝试次数过多，请稍后再试', status=429, retry_after=retry_after)
+            attempts.append(now)
+
+    def reset(self, client):
+        with self._lock:
+            self._attempts.pop(client, None)
+
+    def _prune(self, now):
+        for client in [c for c, attempts in self._attempts.items() if attempts[-1] <= now - self.window]:
+            del self._attempts[client]
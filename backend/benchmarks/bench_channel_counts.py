@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+频道统计的写入开销：上传/发消息时更新频道计数的耗时不应随频道中的记录数增长
+
+用法: python benchmarks/bench_channel_counts.py [大频道的文件数和消息数]
+分别在空频道和已有大量文件、消息的频道中发送消息（插入消息 + ChannelStore.counts），
+输出每次写入的平均耗时，并检查统计是否正确。大频道明显更慢（超过3倍）时返回非零退出码。
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Message, init_db
+from channels import ChannelStore
+
+ROUNDS = 200
+
+
+def send_message(Session, channel_store, channel):
+    session = Session()
+    try:
+        session.add(Message(content='bench', sender_ip='127.0.0.1', channel=channel))
+        channel_store.counts(session, channel, messages=1)
+        session.commit()
+    finally:
+        session.close()
+
+
+def per_write_ms(Session, channel_store, channel):
+    send_message(Session, channel_store, channel)  # 首次写入时登记频道
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        send_message(Session, channel_store, channel)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'counts.db')
+        engine, Session = init_db(path)
+        channel_store = ChannelStore(Session)
+        channel_store.migrate([])
+
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany(
+                "INSERT INTO files (filename, original_filename, file_size, file_path, channel, upload_time, "
+                "expire_time, is_deleted) VALUES ('f', 'f', 1, '/tmp/f', 'big', datetime('now'), datetime('now'), 0)",
+                [()] * count
+            )
+            conn.executemany(
+                "INSERT INTO messages (content, sender_ip, channel, send_time, is_deleted, message_type) "
+                "VALUES ('m', '127.0.0.1', 'big', datetime('now'), 0, 'text')",
+                [()] * count
+            )
+
+        empty = per_write_ms(Session, channel_store, 'empty')
+        big = per_write_ms(Session, channel_store, 'big')
+        file_count, message_count = conn.execute(
+            "SELECT file_count, message_count FROM channels WHERE name = 'big'"
+        ).fetchone()
+        conn.close()
+
+        print(f"空频道          {empty:>6.2f}ms/次")
+        print(f"{count} 条记录的频道 {big:>6.2f}ms/次")
+        ok = file_count == count and message_count == count + ROUNDS + 1
+        print(f"统计 文件 {file_count} 消息 {message_count}：{'正确' if ok else '错误'}")
+        sys.exit(0 if ok and big < empty * 3 else 1)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+数据库混合读写性能测试：对比默认的 SQLite 引擎和调优后的引擎 + 写线程合并提交
+
+用法: python benchmarks/bench_db.py [读线程数] [写线程数] [每轮秒数]
+读线程模拟 get_files 的分页查询，写线程模拟发送消息（插入消息并更新频道计数）。
+输出每种方式的读/写吞吐量、写入延迟和 database is locked 错误数。
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, FileRecord, Message, Channel, init_db
+from dbwriter import WriteQueue
+
+CHANNELS = ['default', 'work', 'life', 'misc']
+
+
+def seed(Session, files=5000):
+    session = Session()
+    for i in range(files):
+        session.add(FileRecord(
+            filename=f'f{i}', original_filename=f'f{i}.txt', file_size=1024, file_path=f'/tmp/f{i}',
+            channel=CHANNELS[i % len(CHANNELS)], file_type='file'
+        ))
+    for channel in CHANNELS:
+        session.add(Channel(name=channel, file_count=0, message_count=0, total_bytes=0))
+    session.commit()
+    session.close()
+
+
+def read_page(Session, channel):
+    """与 get_files 相同的索引分页查询"""
+    session = Session()
+    try:
+        session.execute(
+            select(FileRecord)
+            .where(FileRecord.channel == channel, FileRecord.is_deleted == False)
+            .order_by(FileRecord.upload_time.desc(), FileRecord.id.desc())
+            .limit(50)
+        ).scalars().all()
+    finally:
+        session.close()
+
+
+def insert_message(session, channel, i):
+    session.add(Message(content=f'm{i}', sender_ip='127.0.0.1', sender_name='bench', channel=channel))
+    session.execute(
+        update(Channel).where(Channel.name == channel).values(message_count=Channel.message_count + 1)
+    )
+
+
+def direct_writer(Session):
+    """每个请求线程各自提交写事务"""
+    def write(channel, i):
+        session = Session()
+        try:
+            insert_message(session, channel, i)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    return write
+
+
+def run(label, Session, write, readers, writers, seconds):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def reader(n):
+        done = 0
+        while not stop.is_set():
+            read_page(Session, CHANNELS[n % len(CHANNELS)])
+            done += 1
+        with lock:
+            counts['reads'] += done
+
+    def writer(n):
+        done = locked = 0
+        mine = []
+        i = 0
+        while not stop.is_set():
+            i += 1
+            start = time.perf_counter()
+            try:
+                write(CHANNELS[n % len(CHANNELS)], i)
+                done += 1
+                mine.append(time.perf_counter() - start)
+            except OperationalError:
+                locked += 1
+        with lock:
+            counts['writes'] += done
+            counts['locked'] += locked
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f"{label:<22} 读 {counts['reads'] / seconds:>8.0f}/s  写 {counts['writes'] / seconds:>7.0f}/s  "
+          f"写延迟 p50 {p50:>6.1f}ms p99 {p99:>7.1f}ms  locked {counts['locked']}")
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    tmp = tempfile.mkdtemp()
+    try:
+        # 改造前：默认引擎（回滚日志、默认同步模式、5秒锁等待），每个请求线程单独提交
+        path = os.path.join(tmp, 'default.db')
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+        seed(Session)
+
+        run('默认引擎', Session, direct_writer(Session), readers, writers, seconds)
+        engine.dispose()
+
+        # 改造后：WAL + PRAGMA + 连接池，先测试各线程直接写入，再测试写线程合并提交
+        engine, Session = init_db(os.path.join(tmp, 'tuned.db'), pool_size=readers + writers)
+        seed(Session)
+        run('调优引擎', Session, direct_writer(Session), readers, writers, seconds)
+        write_queue = WriteQueue(engine)
+        write_queue.start()
+        run('调优引擎 + 写线程', Session, lambda channel, i: write_queue.submit(
+            lambda session: insert_message(session, channel, i)
+        ), readers, writers, seconds)
+        print(f"写线程: {write_queue.metrics()}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
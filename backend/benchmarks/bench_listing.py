@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+列表接口序列化性能测试：对比ORM对象 + jsonify 与列投影 + 快速JSON编码
+
+用法: python benchmarks/bench_listing.py [行数] [轮数]
+分别用改造前（session.query 构造ORM对象、逐行复制为字典、jsonify）和
+改造后（listing 模块：select 只取需要的列、file_item/message_item、json_response）
+的方式生成一次文件列表和消息列表响应，输出每种方式每次的CPU时间和提速倍数。
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from sqlalchemy import select, desc
+
+import listing
+from models import FileRecord, Message, init_db
+from listing import FILE_COLUMNS, MESSAGE_COLUMNS, fetch_rows, file_item, message_item, json_response
+
+
+def seed(Session, count):
+    now = datetime.now()
+    session = Session()
+    for i in range(count):
+        session.add(FileRecord(
+            filename=f'f{i}', original_filename=f'报告_{i}.pdf', file_size=1024 * i, file_path=f'/tmp/f{i}',
+            uploader_name='测试用户', channel='work', file_type='document',
+            upload_time=now - timedelta(minutes=i), expire_time=now + timedelta(hours=i % 500 - 20)
+        ))
+        session.add(Message(
+            content=f'第{i}条消息，内容长度和平常的聊天消息差不多', sender_ip='127.0.0.1',
+            sender_name='测试用户', channel='work', send_time=now - timedelta(minutes=i)
+        ))
+    session.commit()
+    session.close()
+
+
+def old_files(session):
+    """改造前的 get_files"""
+    current_time = datetime.now()
+    files = session.query(FileRecord).filter(
+        FileRecord.channel == 'work', FileRecord.is_deleted == False
+    ).order_by(desc(FileRecord.upload_time), desc(FileRecord.id)).all()
+    file_list = []
+    for file in files:
+        total_seconds = int((file.expire_time - current_time).total_seconds())
+        is_expired = total_seconds <= 0
+        if is_expired:
+            remaining_text = "已过期"
+            remaining_days = remaining_hours = remaining_minutes = 0
+        else:
+            remaining_days = total_seconds // (24 * 3600)
+            remaining_hours = (total_seconds % (24 * 3600)) // 3600
+            remaining_minutes = (total_seconds % 3600) // 60
+            if remaining_days > 0:
+                remaining_text = f"{remaining_days}天"
+            elif remaining_hours > 0:
+                remaining_text = f"{remaining_hours}小时{remaining_minutes}分钟"
+            else:
+                remaining_text = f"{remaining_minutes}分钟"
+        file_list.append({
+            'id': file.id,
+            'filename': file.original_filename,
+            'file_size': file.file_size,
+            'upload_time': int(file.upload_time.timestamp() * 1000),
+            'expire_time': int(file.expire_time.timestamp() * 1000),
+            'uploader_name': file.uploader_name,
+            'file_type': file.file_type,
+            'download_url': f'/api/files/{file.id}/download',
+            'is_expired': is_expired,
+            'remaining_text': remaining_text,
+            'remaining_days': remaining_days,
+            'remaining_hours': remaining_hours,
+            'remaining_minutes': remaining_minutes,
+            'total_remaining_seconds': max(0, total_seconds)
+        })
+    return jsonify({'files': file_list, 'epoch': 'bench', 'seq': 0}).get_data()
+
+
+def new_files(session):
+    """改造后的 get_files"""
+    current_time = datetime.now()
+    rows = fetch_rows(session, select(*FILE_COLUMNS).where(
+        FileRecord.channel == 'work', FileRecord.is_deleted == False
+    ).order_by(desc(FileRecord.upload_time), desc(FileRecord.id)))
+    result = {'files': [file_item(row, current_time) for row in rows], 'epoch': 'bench', 'seq': 0}
+    return json_response(result).get_data()
+
+
+def old_messages(session):
+    """改造前的 get_messages"""
+    messages = session.query(Message).filter(
+        Message.channel == 'work', Message.is_deleted == False
+    ).order_by(desc(Message.send_time), desc(Message.id)).all()
+    message_list = []
+    for msg in messages:
+        message_list.append({
+            'id': msg.id,
+            'content': msg.content,
+            'sender_name': msg.sender_name,
+            'send_time': int(msg.send_time.timestamp() * 1000),
+            'message_type': msg.message_type,
+            'file_id': msg.file_id,
+            'file_name': msg.file_name,
+            'file_size': msg.file_size,
+            'file_type': msg.file_type
+        })
+    return jsonify({'messages': message_list, 'epoch': 'bench', 'seq': 0}).get_data()
+
+
+def new_messages(session):
+    """改造后的 get_messages"""
+    rows = fetch_rows(session, select(*MESSAGE_COLUMNS).where(
+        Message.channel == 'work', Message.is_deleted == False
+    ).order_by(desc(Message.send_time), desc(Message.id)))
+    result = {'messages': [message_item(row) for row in rows], 'epoch': 'bench', 'seq': 0}
+    return json_response(result).get_data()
+
+
+def measure(Session, build, rounds):
+    """每次响应的CPU时间（秒），取最小值"""
+    best = None
+    for _ in range(rounds):
+        session = Session()
+        try:
+            start = time.process_time()
+            build(session)
+            elapsed = time.process_time() - start
+        finally:
+            session.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"JSON编码: {'orjson' if listing.orjson is not None else '标准库 json'}，{count} 行，取 {rounds} 轮最小值")
+
+    tmp = tempfile.mkdtemp()
+    app = Flask(__name__)
+    try:
+        engine, Session = init_db(os.path.join(tmp, 'listing.db'))
+        seed(Session, count)
+        with app.app_context():
+            session = Session()
+            try:
+                # 两种方式的响应内容应当相同
+                import json
+                old, new = json.loads(old_files(session)), json.loads(new_files(session))
+                for item in old['files'] + new['files']:
+                    item.pop('total_remaining_seconds')  # 两次调用之间时间可能相差一秒
+                assert old == new, '文件列表响应不一致'
+                assert json.loads(old_messages(session)) == json.loads(new_messages(session)), '消息列表响应不一致'
+            finally:
+                session.close()
+
+            for label, old_build, new_build in (
+                ('文件列表', old_files, new_files),
+                ('消息列表', old_messages, new_messages)
+            ):
+                before = measure(Session, old_build, rounds)
+                after = measure(Session, new_build, rounds)
+                print(f"{label}  改造前 {before * 1000:>8.1f}ms  改造后 {after * 1000:>8.1f}ms  {before / after:>5.1f}x")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
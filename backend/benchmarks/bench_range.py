@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+区间传输性能测试：对比旧的 8KB 生成器、对齐大块读取和 os.sendfile
+
+用法: python benchmarks/bench_range.py [文件大小MB] [轮数]
+输出每种方式的吞吐量(MB/s)和每GB消耗的CPU时间(秒)。
+"""
+
+import os
+import sys
+import time
+import socket
+import tempfile
+import threading
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranges import iter_file_range, READ_BUFFER_SIZE
+
+def legacy_generate(path, start, length):
+    """改造前 preview_file / preview_chat_file 使用的读取方式"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(8192, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+def drain(sock):
+    """在另一个线程中丢弃接收到的数据，模拟客户端"""
+    while sock.recv(4 * 1024 * 1024):
+        pass
+
+def send_iter(path, start, length, factory):
+    """把生成器输出写入socket，与WSGI服务器的写法一致"""
+    sender, receiver = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(receiver,))
+    reader.start()
+    try:
+        for chunk in factory(path, start, length):
+            sender.sendall(chunk)
+    finally:
+        sender.close()
+        reader.join()
+        receiver.close()
+
+def send_sendfile(path, start, length):
+    """与 gunicorn 处理 wsgi.file_wrapper 的方式一致"""
+    sender, receiver = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(receiver,))
+    reader.start()
+    try:
+        with open(path, 'rb') as f:
+            sent = 0
+            while sent < length:
+                sent += os.sendfile(sender.fileno(), f.fileno(), start + sent, min(length - sent, READ_BUFFER_SIZE))
+    finally:
+        sender.close()
+        reader.join()
+        receiver.close()
+
+def measure(name, func, path, start, length, rounds):
+    func(path, start, length)  # 预热页缓存
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(rounds):
+        func(path, start, length)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    total_mb = length * rounds / (1024 * 1024)
+    print(f"{name:<16} {total_mb / wall:>10.1f} MB/s {cpu / (total_mb / 1024):>10.3f} CPU秒/GB")
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    fd, path = tempfile.mkstemp(prefix='lanshare-bench-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(block)
+
+        # 模拟视频拖动：从非对齐位置开始读取到文件末尾
+        start = 12345
+        length = size_mb * 1024 * 1024 - start
+
+        print(f"测试文件 {size_mb}MB，{rounds} 轮，Range: bytes={start}-")
+        measure('8KB生成器(旧)', lambda p, s, l: send_iter(p, s, l, legacy_generate), path, start, length, rounds)
+        measure('对齐大块读取', lambda p, s, l: send_iter(p, s, l, iter_file_range), path, start, length, rounds)
+        measure('os.sendfile', send_sendfile, path, start, length, rounds)
+        print("注: CPU时间包含接收端线程；sendfile 路径需要 gunicorn 等提供 wsgi.file_wrapper 的服务器")
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+搜索性能测试：在百万级文件和消息中按频道搜索
+
+用法: python benchmarks/bench_search.py [文件数] [消息数]
+在临时数据库中（经过全部迁移，全文索引由触发器在写入时更新）生成中英文混合的
+文件名和聊天消息，然后用 search.SearchIndex 执行几类搜索（常见词、罕见词、
+多个词、短词、翻页），输出每类搜索的延迟；罕见词同时与直接 LIKE 全表匹配对比。
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import init_db
+from search import SearchIndex
+
+CHANNELS = ['default', '工作区', '生活区', 'misc']
+WORDS = [
+    '年度报告', '季度总结', '会议纪要', '项目计划', '合同', '发票', '照片', '截图', '简历', '设计稿',
+    '需求文档', '测试用例', '周报', '预算', '旅行', '课件', '论文', 'Report', 'Invoice', 'Design',
+    'meeting', 'backup', 'final', 'draft', 'photo', 'scan', 'notes', 'slides'
+]
+EXTENSIONS = ['.pdf', '.docx', '.xlsx', '.jpg', '.png', '.zip', '.txt', '.pptx']
+UPLOADERS = ['张三', '李四', '王五', '赵六', 'alice', 'bob', 'carol']
+PHRASES = [
+    '明天开会讨论一下', '文件已经上传了', '请看最新的', '收到，谢谢', '晚上一起吃饭吗',
+    '这个版本有问题', 'please check the', 'uploaded the new', '下班前发给我', '已经改好了'
+]
+BATCH = 10000
+
+
+def file_rows(count, rng, now):
+    for i in range(count):
+        name = '_'.join(rng.sample(WORDS, 2)) + f'_{i}' + rng.choice(EXTENSIONS)
+        when = now - timedelta(seconds=count - i)
+        yield (
+            f'blob{i}', name, rng.randint(1, 10 ** 8), f'/tmp/blob{i}', rng.choice(UPLOADERS), '127.0.0.1',
+            CHANNELS[i % len(CHANNELS)], when, when + timedelta(days=15), int(i % 50 == 0), 'file'
+        )
+
+
+def message_rows(count, rng, now):
+    for i in range(count):
+        content = f'{rng.choice(PHRASES)}{rng.choice(WORDS)} #{i}'
+        yield (
+            content, '127.0.0.1', rng.choice(UPLOADERS), CHANNELS[i % len(CHANNELS)],
+            now - timedelta(seconds=count - i), int(i % 50 == 0), 'text'
+        )
+
+
+def insert_batches(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def seed(path, files, messages):
+    """直接用 sqlite3 批量写入（触发器同时更新全文索引）"""
+    rng = random.Random(42)
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    with conn:
+        insert_batches(conn, (
+            'INSERT INTO files (filename, original_filename, file_size, file_path, uploader_name, uploader_ip, '
+            'channel, upload_time, expire_time, is_deleted, file_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        ), file_rows(files, rng, now))
+        insert_batches(conn, (
+            'INSERT INTO messages (content, sender_ip, sender_name, channel, send_time, is_deleted, message_type) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)'
+        ), message_rows(messages, rng, now))
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def timed(func, repeat=20):
+    """返回 (p50毫秒, 最大毫秒, 最后一次的结果)"""
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed.append((time.perf_counter() - start) * 1000)
+    elapsed.sort()
+    return elapsed[len(elapsed) // 2], elapsed[-1], result
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'search.db')
+        engine, Session = init_db(path)
+        start = time.perf_counter()
+        seed(path, files, messages)
+        print(f"写入 {files} 个文件、{messages} 条消息（含全文索引）: {time.perf_counter() - start:.1f}s，"
+              f"数据库 {os.path.getsize(path) / 1024 / 1024:.0f} MB\n")
+
+        index = SearchIndex(Session, engine)
+        assert index.fts, '当前 SQLite 不支持 FTS5 trigram'
+        rare = f'_{files // 3 + 1}.'  # 文件名中唯一的编号
+        rare_channel = CHANNELS[(files // 3 + 1) % len(CHANNELS)]
+        _, _, first_page = timed(lambda: index.files('工作区', '会议纪要', 50), repeat=1)
+        cursor = first_page[0][-1].id
+
+        cases = [
+            ('文件 常见词', lambda: index.files('工作区', '会议纪要', 50)),
+            ('文件 常见词 翻页', lambda: index.files('工作区', '会议纪要', 50, before_id=cursor)),
+            ('文件 英文（不区分大小写）', lambda: index.files('生活区', 'REPORT', 50)),
+            ('文件 罕见词', lambda: index.files(rare_channel, rare, 50)),
+            ('文件 多个词', lambda: index.files('工作区', '会议纪要 Design pdf', 50)),
+            ('文件 上传者', lambda: index.files('misc', 'alice', 50)),
+            ('文件 长词+短词', lambda: index.files('工作区', '年度报告 合同', 50)),
+            ('文件 只有短词（逐行匹配）', lambda: index.files('工作区', '合同', 50)),
+            ('消息 常见词', lambda: index.messages('工作区', '明天开会', 50)),
+            ('消息 罕见词', lambda: index.messages(CHANNELS[(messages // 2 + 1) % len(CHANNELS)], f'#{messages // 2 + 1}', 50)),
+        ]
+        for label, func in cases:
+            p50, worst, (rows, has_more) = timed(func)
+            print(f"{label:<24} p50 {p50:>7.2f}ms  max {worst:>7.2f}ms  {len(rows):>3} 条{'+' if has_more else ''}")
+
+        # 对比：没有全文索引时按 LIKE 逐行匹配
+        conn = sqlite3.connect(path)
+        p50, worst, _ = timed(lambda: conn.execute(
+            "SELECT id FROM files WHERE channel = ? AND is_deleted = 0 AND original_filename LIKE ? "
+            "ORDER BY id DESC LIMIT 51", (rare_channel, f'%{rare}%')
+        ).fetchall(), repeat=3)
+        conn.close()
+        print(f"\n{'对比 罕见词 LIKE 全表':<24} p50 {p50:>7.2f}ms  max {worst:>7.2f}ms")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
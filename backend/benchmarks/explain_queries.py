@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+热点查询的执行计划检查：确认每个查询都使用预期的索引，不扫描整张表、不额外排序
+
+用法: python benchmarks/explain_queries.py [文件数]
+在临时数据库中（经过全部迁移）生成测试数据并执行 ANALYZE，打印每个查询的
+EXPLAIN QUERY PLAN。有查询没有使用预期的索引、扫描 files/messages 全表或使用
+临时B树排序时返回非零退出码。修改模型索引、迁移或这些查询的写法后应当运行一次；
+tests/test_query_plans.py 用 pytest 执行同样的检查（python -m pytest backend/tests）。
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加backend目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, func, desc, asc, tuple_, text
+
+from models import FileRecord, Message, Channel, init_db
+
+CHANNELS = ['default', 'work', 'life', 'misc']
+HASH = 'a' * 64
+
+
+def hot_queries(now):
+    """与 app.py / channels.py / reaper.py 中写法相同的查询，(名称, 语句, 预期使用的索引)"""
+    cursor = (now - timedelta(hours=1), 1000)
+    expiring_until = now + timedelta(days=1)
+    return [
+        ('get_files 第一页', select(FileRecord).where(
+            FileRecord.channel == 'work', FileRecord.is_deleted == False
+        ).order_by(desc(FileRecord.upload_time), desc(FileRecord.id)).limit(51), 'ix_files_channel_listing'),
+        ('get_files 游标翻页', select(FileRecord).where(
+            FileRecord.channel == 'work', FileRecord.is_deleted == False,
+            tuple_(FileRecord.upload_time, FileRecord.id) < cursor
+        ).order_by(desc(FileRecord.upload_time), desc(FileRecord.id)).limit(51), 'ix_files_channel_listing'),
+        ('get_messages 最新一页', select(Message).where(
+            Message.channel == 'work', Message.is_deleted == False
+        ).order_by(desc(Message.send_time), desc(Message.id)).limit(51), 'ix_messages_channel_history'),
+        ('get_messages after_id', select(Message).where(
+            Message.channel == 'work', Message.is_deleted == False,
+            tuple_(Message.send_time, Message.id) > cursor
+        ).order_by(asc(Message.send_time), asc(Message.id)).limit(51), 'ix_messages_channel_history'),
+        ('get_channels', select(Channel.name), 'sqlite_autoindex_channels_1'),
+        ('频道统计 即将过期', select(FileRecord.channel, func.count()).where(
+            FileRecord.is_deleted == False, FileRecord.expire_time > now, FileRecord.expire_time <= expiring_until
+        ).group_by(FileRecord.channel), 'ix_files_expiry'),
+        ('过期清理 加载', select(FileRecord.expire_time, FileRecord.id).where(
+            FileRecord.is_deleted == False, FileRecord.expire_time <= expiring_until
+        ).order_by(FileRecord.expire_time).limit(10000), 'ix_files_expiry'),
+        ('过期清理 标记删除', update(FileRecord).where(
+            FileRecord.id.in_([1, 2, 3]), FileRecord.is_deleted == False, FileRecord.expire_time <= now
+        ).values(is_deleted=True), 'INTEGER PRIMARY KEY'),
+        ('按哈希查找文件', select(FileRecord.id).where(FileRecord.file_hash == HASH), 'ix_files_file_hash'),
+        ('按哈希查找聊天文件', select(Message.id).where(Message.file_hash == HASH), 'ix_messages_file_hash')
+    ]
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = []
+    for name in compiled.positiontup:
+        value = compiled.params[name]
+        params.append(value.isoformat(' ') if isinstance(value, datetime) else value)
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', tuple(params)).all()
+    return [row[3] for row in rows]
+
+
+def is_bad(detail):
+    """全表扫描（没有使用索引）或需要额外排序"""
+    full_scan = detail.startswith(('SCAN files', 'SCAN messages')) and 'INDEX' not in detail
+    return full_scan or 'TEMP B-TREE FOR ORDER BY' in detail
+
+
+def problems(plan, expected_index):
+    """执行计划中的问题，没有问题时返回空列表"""
+    found = [detail for detail in plan if is_bad(detail)]
+    if not any(expected_index in detail for detail in plan):
+        found.append(f'没有使用 {expected_index}')
+    return found
+
+
+def seed(Session, count):
+    now = datetime.now()
+    session = Session()
+    for i in range(count):
+        channel = CHANNELS[i % len(CHANNELS)]
+        session.add(FileRecord(
+            filename=f'f{i}', original_filename=f'f{i}.txt', file_size=1024, file_path=f'/tmp/f{i}',
+            channel=channel, upload_time=now - timedelta(minutes=i), expire_time=now + timedelta(minutes=count - i),
+            file_hash=f'{i:064x}', is_deleted=(i % 10 == 0)
+        ))
+        session.add(Message(
+            content=f'm{i}', channel=channel, send_time=now - timedelta(minutes=i), is_deleted=(i % 10 == 0)
+        ))
+    for channel in CHANNELS:
+        session.add(Channel(name=channel, file_count=0, message_count=0, total_bytes=0))
+    session.commit()
+    session.close()
+
+
+def check_plans(count=5000):
+    """在临时数据库中检查全部热点查询，返回 [(名称, 执行计划, 问题)]"""
+    tmp = tempfile.mkdtemp()
+    try:
+        engine, Session = init_db(os.path.join(tmp, 'explain.db'))
+        seed(Session, count)
+        results = []
+        with engine.connect() as conn:
+            conn.execute(text('ANALYZE'))
+            for name, statement, expected_index in hot_queries(datetime.now()):
+                plan = explain(conn, statement)
+                results.append((name, plan, problems(plan, expected_index)))
+        engine.dispose()
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    failed = 0
+    for name, plan, found in check_plans(count):
+        failed += bool(found)
+        print(f"{'FAIL' if found else 'ok  '} {name}")
+        for detail in plan:
+            print(f"       {detail}")
+        for problem in found:
+            print(f"    !! {problem}")
+    print(f"\n{failed} 个查询没有使用预期的索引" if failed else "\n全部查询都使用了预期的索引")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+并发负载测试：同时进行大量文件下载和WebSocket长连接
+
+分别以 werkzeug 开发服务器和 gunicorn 模式启动服务，统计：
+  - 成功建立并保持的WebSocket连接数
+  - 下载完成数、总吞吐量、单次下载耗时
+  - 发送消息后所有WebSocket客户端收到推送的延迟
+
+用法: python benchmarks/load_test.py [--mode both|gunicorn|werkzeug]
+                                     [--downloads 50] [--ws 200] [--duration 20] [--file-mb 32]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+import simple_websocket
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def start_server(mode, port, data_dir):
+    env = dict(os.environ)
+    env.update({
+        'SERVER_MODE': mode,
+        'PORT': str(port),
+        'DATABASE_PATH': os.path.join(data_dir, 'db', 'lanshare.db'),
+        'UPLOAD_FOLDER': os.path.join(data_dir, 'uploads'),
+    })
+    env.pop('FLASK_ENV', None)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'app.py')],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} 服务启动失败')
+
+
+def upload_file(port, size_mb):
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="load.bin"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode('ascii'),
+        os.urandom(size_mb * 1024 * 1024),
+        f'\r\n--{boundary}--\r\n'.encode('ascii'),
+    ])
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/api/files/upload', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    return json.loads(conn.getresponse().read())['file_id']
+
+
+def post_message(port, content):
+    """发送一条消息，返回是否成功"""
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('POST', '/api/messages', json.dumps({'content': content}), {'Content-Type': 'application/json'})
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+
+
+class WebSocketClient(threading.Thread):
+    """最简单的Socket.IO客户端：连接、加入频道、响应心跳、记录收到消息的时间"""
+
+    def __init__(self, port, stop):
+        super().__init__(daemon=True)
+        self.port = port
+        self.stop = stop
+        self.connected = False
+        self.received = {}
+
+    def run(self):
+        try:
+            ws = simple_websocket.Client(f'ws://127.0.0.1:{self.port}/socket.io/?EIO=4&transport=websocket')
+            ws.receive(timeout=10)  # engine.io open
+            ws.send('40')
+            ws.receive(timeout=10)  # namespace connect
+            ws.send('42' + json.dumps(['join_channel', {'channel': 'default'}]))
+            self.connected = True
+            while not self.stop.is_set():
+                packet = ws.receive(timeout=1)
+                if packet is None:
+                    continue
+                if packet == '2':
+                    ws.send('3')
+                elif packet.startswith('42["messages_batch"'):
+                    now = time.perf_counter()
+                    for message in json.loads(packet[2:])[1]['messages']:
+                        self.received.setdefault(message['content'], now)
+            ws.close()
+        except Exception:
+            pass
+        finally:
+            self.connected = self.connected and self.stop.is_set()
+
+
+def download_worker(port, file_id, stop, results):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request('GET', f'/api/files/{file_id}/download')
+            response = conn.getresponse()
+            size = 0
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+            conn.close()
+            if response.status != 200:
+                raise IOError(response.status)
+            results.append((time.perf_counter() - started, size))
+        except Exception:
+            results.append((None, 0))
+
+
+def run(mode, args, port):
+    data_dir = tempfile.mkdtemp(prefix='lanshare-load-')
+    process = start_server(mode, port, data_dir)
+    try:
+        file_id = upload_file(port, args.file_mb)
+        stop = threading.Event()
+
+        clients = [WebSocketClient(port, stop) for _ in range(args.ws)]
+        for client in clients:
+            client.start()
+        time.sleep(2)
+
+        results = []
+        workers = [
+            threading.Thread(target=download_worker, args=(port, file_id, stop, results), daemon=True)
+            for _ in range(args.downloads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+
+        # 下载进行期间定期发送消息，测量推送到所有客户端的延迟
+        sent = {}
+        failed_posts = 0
+        while time.perf_counter() - started < args.duration:
+            content = uuid.uuid4().hex
+            sent_at = time.perf_counter()
+            if post_message(port, content):
+                sent[content] = sent_at
+            else:
+                failed_posts += 1
+            time.sleep(1)
+
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=30)
+        for client in clients:
+            client.join(timeout=5)
+
+        ok = [r for r in results if r[0] is not None]
+        latencies = []
+        delivered = 0
+        for content, sent_at in sent.items():
+            for client in clients:
+                if content in client.received:
+                    delivered += 1
+                    latencies.append(client.received[content] - sent_at)
+
+        return {
+            'mode': mode,
+            'ws': sum(1 for client in clients if client.connected),
+            'downloads': len(ok),
+            'errors': len(results) - len(ok) + failed_posts,
+            'mbps': sum(size for _, size in ok) / elapsed / (1024 * 1024),
+            'dl_p50': percentile([r[0] for r in ok], 50),
+            'dl_p99': percentile([r[0] for r in ok], 99),
+            'delivered': delivered / max(1, len(sent) * args.ws),
+            'push_p50': percentile(latencies, 50) * 1000,
+            'push_p99': percentile(latencies, 99) * 1000,
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LanShare 并发负载测试')
+    parser.add_argument('--mode', default='both', choices=['both', 'gunicorn', 'werkzeug'])
+    parser.add_argument('--downloads', type=int, default=50, help='并发下载数')
+    parser.add_argument('--ws', type=int, default=200, help='WebSocket客户端数')
+    parser.add_argument('--duration', type=int, default=20, help='测试时长（秒）')
+    parser.add_argument('--file-mb', type=int, default=32, help='下载文件大小（MB）')
+    parser.add_argument('--port', type=int, default=7171)
+    args = parser.parse_args()
+
+    modes = ['werkzeug', 'gunicorn'] if args.mode == 'both' else [args.mode]
+    print(f"{args.downloads} 个并发下载（{args.file_mb}MB）+ {args.ws} 个WebSocket客户端，{args.duration} 秒")
+    print(f"{'模式':<10} {'WS在线':>7} {'下载数':>7} {'错误':>5} {'MB/s':>8} {'下载p50':>8} {'下载p99':>8} {'推送到达':>8} {'推送p50':>9} {'推送p99':>9}")
+    for index, mode in enumerate(modes):
+        r = run(mode, args, args.port + index)
+        print(f"{r['mode']:<10} {r['ws']:>7} {r['downloads']:>7} {r['errors']:>5} {r['mbps']:>8.0f} "
+              f"{r['dl_p50']:>7.2f}s {r['dl_p99']:>7.2f}s {r['delivered']:>8.1%} "
+              f"{r['push_p50']:>7.0f}ms {r['push_p99']:>7.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
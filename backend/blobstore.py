@@ -0,0 +1,251 @@
+"""
+内容寻址的文件存储
+
+文件按 SHA-256 保存在 <root>/<前两位>/<完整哈希>，内容相同的上传共享同一个
+blob，blobs 表记录引用计数，最后一个引用释放时才删除磁盘文件。
+
+引用计数的读改写和删除文件在 <root>/.lock 文件锁内进行，多个工作进程共用存储时
+不会一个进程刚删除blob、另一个进程又增加了它的引用。
+"""
+
+import os
+import re
+import zlib
+import hashlib
+import secrets
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from interprocess import file_lock
+
+from models import Blob
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# 秒传校验时服务端随机抽取的块数和每块的长度
+SAMPLE_COUNT = 4
+SAMPLE_LENGTH = 64 * 1024
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_sha256(value):
+    """检查是否为小写十六进制的SHA-256"""
+    return bool(value) and bool(_SHA256_RE.match(value))
+
+
+def checksum_file(path):
+    """一次读取同时计算文件的SHA-256和CRC-32"""
+    hasher = hashlib.sha256()
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(HASH_BUFFER_SIZE)
+            if not buf:
+                break
+            hasher.update(buf)
+            crc = zlib.crc32(buf, crc)
+    return hasher.hexdigest(), crc
+
+
+def choose_samples(file_size, count=SAMPLE_COUNT, length=SAMPLE_LENGTH):
+    """随机选择抽样块 [{offset, length}]，由服务端选择使客户端无法预先准备；小文件直接取整个文件"""
+    if file_size <= 0:
+        return []
+    if file_size <= length * count:
+        return [{'offset': 0, 'length': file_size}]
+    offsets = sorted(secrets.randbelow(file_size - length + 1) for _ in range(count))
+    return [{'offset': offset, 'length': length} for offset in offsets]
+
+
+def sample_key(file_hash, file_size, samples):
+    """抽样校验令牌绑定的内容：文件哈希、大小和抽样位置"""
+    positions = ','.join(f"{int(sample['offset'])}:{int(sample['length'])}" for sample in samples)
+    return f'precheck|{file_hash}|{file_size}|{positions}'
+
+
+def verify_samples(path, samples):
+    """校验客户端提供的抽样块哈希，samples 为 [{offset, length, sha256}]"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        for sample in samples:
+            offset = int(sample['offset'])
+            length = int(sample['length'])
+            if offset < 0 or length <= 0 or offset + length > file_size:
+                return False
+            f.seek(offset)
+            if hashlib.sha256(f.read(length)).hexdigest() != str(sample['sha256']).lower():
+                return False
+    return True
+
+
+class BlobStore:
+    """管理 blob 文件与引用计数"""
+
+    def __init__(self, root, Session):
+        self.root = root
+        self.Session = Session
+        # 引用计数的读改写需要串行（进程内和进程间），避免并发上传相同内容时重复插入
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _lock(self):
+        with self._thread_lock:
+            os.makedirs(self.root, exist_ok=True)
+            with file_lock(os.path.join(self.root, '.lock')):
+                yield
+
+    def blob_path(self, sha256):
+        if not is_sha256(sha256):
+            raise ValueError(f'无效的SHA-256: {sha256}')
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def store(self, src_path, sha256, file_size, crc32=None):
+        """把已落盘的文件放入存储并增加引用计数，返回blob路径
+
+        内容已存在时直接删除 src_path，不再保存重复副本。
+        """
+        path = self.blob_path(sha256)
+
+        with self._lock():
+            session = self.Session()
+            try:
+                blob = session.get(Blob, sha256)
+                if blob and os.path.exists(path):
+                    os.remove(src_path)
+                    blob.ref_count += 1
+                    if blob.crc32 is None:
+                        blob.crc32 = crc32
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(src_path, path)
+                    if blob:
+                        # 记录存在但文件丢失，用新上传的内容恢复
+                        blob.file_size = file_size
+                        blob.crc32 = crc32
+                        blob.ref_count += 1
+                    else:
+                        session.add(Blob(sha256=sha256, file_size=file_size, crc32=crc32, ref_count=1))
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+        return path
+
+    def lookup(self, sha256, file_size):
+        """查找内容与大小都一致的blob，返回路径或None"""
+        if not is_sha256(sha256):
+            return None
+
+        session = self.Session()
+        try:
+            blob = session.get(Blob, sha256)
+            if not blob or blob.file_size != file_size:
+                return None
+        finally:
+            session.close()
+
+        path = self.blob_path(sha256)
+        return path if os.path.exists(path) else None
+
+    def acquire(self, sha256, file_size):
+        """为已存在的blob增加一个引用，返回路径；blob不存在时返回None"""
+        if not is_sha256(sha256):
+            return None
+        path = self.blob_path(sha256)
+
+        with self._lock():
+            session = self.Session()
+            try:
+                blob = session.get(Blob, sha256)
+                if not blob or blob.file_size != file_size or not os.path.exists(path):
+                    return None
+                blob.ref_count += 1
+                session.commit()
+                return path
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+    def get_crc32(self, sha256):
+        """读取blob的CRC-32，旧数据没有时计算一次并保存"""
+        session = self.Session()
+        try:
+            blob = session.get(Blob, sha256)
+            if not blob:
+                return None
+            if blob.crc32 is None:
+                _, blob.crc32 = checksum_file(self.blob_path(sha256))
+                session.commit()
+            return blob.crc32
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def release(self, sha256):
+        """释放一个引用，引用计数归零时删除blob，返回是否已删除文件"""
+        path = self.blob_path(sha256)
+
+        with self._lock():
+            session = self.Session()
+            try:
+                blob = session.get(Blob, sha256)
+                if not blob:
+                    # 没有引用记录的文件不属于存储管理，不删除
+                    return False
+                blob.ref_count -= 1
+                if blob.ref_count > 0:
+                    session.commit()
+                    return False
+                session.delete(blob)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return True
+
+    def release_many(self, hashes):
+        """在一个事务中释放多个引用（可重复），返回引用计数归零、已删除文件的blob列表"""
+        releases = Counter(hashes)
+        removed = []
+
+        with self._lock():
+            session = self.Session()
+            try:
+                for sha256, count in releases.items():
+                    blob = session.get(Blob, sha256)
+                    if not blob:
+                        continue
+                    blob.ref_count -= count
+                    if blob.ref_count > 0:
+                        continue
+                    session.delete(blob)
+                    removed.append(sha256)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+            for sha256 in removed:
+                try:
+                    os.remove(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+        return removed
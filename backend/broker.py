@@ -0,0 +1,265 @@
+"""
+Socket.IO 消息队列的发布/订阅代理
+
+多个工作进程（或多台主机）通过发布/订阅交换 Socket.IO 广播。这里使用 Redis 协议
+（RESP）中发布/订阅需要的一小部分命令：PING、SUBSCRIBE、UNSUBSCRIBE、PUBLISH，
+所以 cluster.py 中的客户端既可以连接真正的 Redis，也可以连接内置的 LocalBroker，
+不需要额外安装 redis 依赖。
+
+LocalBroker 在一把锁内把消息依次写给所有订阅者，并在写完后才回复发布者，
+所有订阅者收到的消息顺序一致（与 Redis 相同）。
+
+单独运行（供本机测试使用）:
+    python broker.py --port 7071
+
+代理没有身份验证，默认只监听 127.0.0.1。多台主机共用时应使用设置了密码并限制
+访问来源的 Redis，而不是把代理暴露在局域网中。
+"""
+
+import socket
+import struct
+import argparse
+import threading
+from urllib.parse import urlparse, unquote
+
+# 订阅者长时间不读取数据时断开它，避免阻塞其他订阅者（它会自动重连并重新同步）
+SUBSCRIBER_SEND_TIMEOUT = 10
+
+
+class ResponseError(Exception):
+    """服务端返回的错误响应"""
+
+
+def encode_command(args):
+    """把命令编码为RESP数组"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif isinstance(arg, int):
+            arg = str(arg).encode('ascii')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    """从缓冲读取器中读取一个RESP值"""
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('连接已关闭')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest
+    if kind == b'-':
+        return ResponseError(rest.decode('utf-8', 'replace'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError('连接已关闭')
+        return data[:-2]
+    if kind == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f'无法解析的响应: {line[:50]!r}')
+
+
+class RespConnection:
+    """到 Redis 或 LocalBroker 的连接，URL 格式为 redis://[:密码@]主机:端口"""
+
+    def __init__(self, url, timeout=5):
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f'不支持的消息队列地址: {url}')
+        self.sock = socket.create_connection((parsed.hostname or '127.0.0.1', parsed.port or 6379), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.reader = self.sock.makefile('rb')
+        if parsed.password:
+            if parsed.username:
+                self.command('AUTH', unquote(parsed.username), unquote(parsed.password))
+            else:
+                self.command('AUTH', unquote(parsed.password))
+
+    def command(self, *args):
+        """发送命令并等待响应"""
+        self.sock.sendall(encode_command(args))
+        reply = read_reply(self.reader)
+        if isinstance(reply, ResponseError):
+            raise reply
+        return reply
+
+    def subscribe(self, channel):
+        """进入订阅模式，之后只能调用 read() 读取推送的消息"""
+        self.command('SUBSCRIBE', channel)
+        # 订阅连接上可能很久没有消息，不能超时
+        self.sock.settimeout(None)
+
+    def read(self):
+        return read_reply(self.reader)
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def read_command(reader):
+    """读取客户端发来的一条命令，返回参数列表；连接关闭时返回None"""
+    line = reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        # telnet 等工具发送的内联命令
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = reader.readline()
+        if not header.startswith(b'$'):
+            raise ConnectionError('无效的命令格式')
+        length = int(header[1:])
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            return None
+        args.append(data[:-2])
+    return args
+
+
+def set_send_timeout(sock, seconds):
+    """只限制写入的超时时间，订阅连接上的读取仍然一直等待"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', seconds, 0))
+    except (OSError, struct.error):
+        pass
+
+
+class _Subscriber:
+    """一个订阅者连接"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.channels = set()
+        self.send_lock = threading.Lock()
+
+    def send(self, data):
+        with self.send_lock:
+            self.sock.sendall(data)
+
+
+class LocalBroker:
+    """内置的发布/订阅代理，同一台主机上的工作进程通过它交换消息"""
+
+    def __init__(self, host='127.0.0.1', port=7071):
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self._channels = {}  # 频道 -> 订阅者集合
+        self._server = None
+
+    def start(self):
+        """在后台线程中开始监听"""
+        self._bind()
+        threading.Thread(target=self._accept_loop, name='lanshare-broker', daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._bind()
+        self._accept_loop()
+
+    def _bind(self):
+        self._server = socket.create_server((self.host, self.port), backlog=128)
+        print(f"消息队列代理已启动: redis://{self.host}:{self.port}")
+
+    def _accept_loop(self):
+        while True:
+            conn, _ = self._server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        client = _Subscriber(conn)
+        reader = conn.makefile('rb')
+        try:
+            while True:
+                args = read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                name = args[0].upper()
+                if name == b'PUBLISH' and len(args) == 3:
+                    client.send(b':%d\r\n' % self._publish(args[1], args[2]))
+                elif name == b'SUBSCRIBE' and len(args) > 1:
+                    set_send_timeout(conn, SUBSCRIBER_SEND_TIMEOUT)
+                    for channel in args[1:]:
+                        self._subscribe(client, channel)
+                        client.send(encode_command([b'subscribe', channel, len(client.channels)]))
+                elif name == b'UNSUBSCRIBE':
+                    for channel in args[1:] or list(client.channels):
+                        self._unsubscribe(client, channel)
+                        client.send(encode_command([b'unsubscribe', channel, len(client.channels)]))
+                elif name == b'PING':
+                    client.send(b'+PONG\r\n')
+                elif name == b'QUIT':
+                    client.send(b'+OK\r\n')
+                    break
+                else:
+                    client.send(b'-ERR unknown command\r\n')
+        except (OSError, ValueError):
+            pass
+        finally:
+            for channel in list(client.channels):
+                self._unsubscribe(client, channel)
+            reader.close()
+            conn.close()
+
+    def _subscribe(self, client, channel):
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(client)
+            client.channels.add(channel)
+
+    def _unsubscribe(self, client, channel):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._channels[channel]
+            client.channels.discard(channel)
+
+    def _publish(self, channel, payload):
+        """把消息写给所有订阅者，返回收到消息的订阅者数"""
+        message = encode_command([b'message', channel, payload])
+        delivered = 0
+        with self._lock:
+            for subscriber in list(self._channels.get(channel, ())):
+                try:
+                    subscriber.send(message)
+                    delivered += 1
+                except OSError:
+                    # 关闭连接，订阅者的处理线程随后会清理订阅关系
+                    try:
+                        subscriber.sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+        return delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LanShare 消息队列代理')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7071)
+    args = parser.parse_args()
+    LocalBroker(args.host, args.port).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+频道列表
+
+频道保存在 channels 表中，同时记录每个频道未删除的文件数、消息数、文件总大小
+和最近活动时间：
+  - 上传文件、发送消息和删除时，在写入记录的同一个事务中更新统计；
+    向列表中没有的频道写入时自动登记该频道
+  - 即将过期的文件数随时间变化，读取统计时通过 (is_deleted, expire_time) 索引
+    只扫描即将过期的文件
+  - 频道名称列表缓存在内存中，创建/重命名/删除后重新加载；其他进程的修改
+    通过 sync_state 中的版本号发现，读取频道列表不再扫描 files/messages 表
+  - 重命名时分批修改文件和消息记录的频道，每批一个短事务，不会长时间占用写锁
+
+旧版本的频道保存在 settings.json 中，升级后首次启动时连同已有记录中出现过的
+频道一起导入。
+"""
+
+import uuid
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Channel, FileRecord, Message, SyncState
+
+DEFAULT_CHANNEL = 'default'
+
+# 重命名时每个事务修改的记录数
+RENAME_BATCH_SIZE = 500
+
+VERSION_KEY = 'channels_version'
+
+
+class ChannelError(Exception):
+    """频道操作错误，status 为对应的HTTP状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _recount(channel):
+    """按已有记录统计频道的子查询，键为 channels 表的列名"""
+    def live(model, *columns):
+        return select(*columns).where(model.channel == channel, model.is_deleted == False)
+
+    last_times = union_all(
+        live(FileRecord, func.max(FileRecord.upload_time).label('t')),
+        live(Message, func.max(Message.send_time).label('t'))
+    ).subquery()
+    return {
+        'file_count': live(FileRecord, func.count()).scalar_subquery(),
+        'message_count': live(Message, func.count()).scalar_subquery(),
+        # 只统计聊天文件本身的大小，引用传输文件的消息不重复计算
+        'total_bytes': (
+            live(FileRecord, func.coalesce(func.sum(FileRecord.file_size), 0)).scalar_subquery()
+            + live(Message, func.coalesce(func.sum(Message.file_size), 0))
+            .where(Message.file_path.isnot(None))
+            .scalar_subquery()
+        ),
+        'last_activity': select(func.max(last_times.c.t)).scalar_subquery()
+    }
+
+
+def _insert_counted(channel, created_at=None):
+    """登记频道的 INSERT 语句，统计按已有记录计算"""
+    return sqlite_insert(Channel.__table__).values(
+        name=channel,
+        created_at=created_at or datetime.now(),
+        **_recount(channel)
+    )
+
+
+def _timestamp(value):
+    """毫秒时间戳，与文件和消息接口一致"""
+    return int(value.timestamp() * 1000) if value else None
+
+
+class ChannelStore:
+    """频道表的读写与频道名称缓存"""
+
+    def __init__(self, Session):
+        self.Session = Session
+        self._lock = threading.Lock()
+        self._names = None  # default 在前、其余按名称排序的频道列表
+        self._known = frozenset()
+        self._version = None
+        self._changed = set()  # 统计有变化、等待推送给客户端的频道
+
+    def _bump(self, session):
+        """在调用方的事务中更新频道列表版本，各进程下次读取时重新加载"""
+        session.execute(
+            sqlite_insert(SyncState.__table__)
+            .values(key=VERSION_KEY, value=uuid.uuid4().hex)
+            .on_conflict_do_update(index_elements=['key'], set_={'value': uuid.uuid4().hex})
+        )
+
+    def _invalidate(self, *channels):
+        with self._lock:
+            self._names = None
+            self._changed.update(channels)
+
+    def touch(self, channel):
+        """标记频道的统计有变化（如文件延期改变了即将过期的文件数）"""
+        with self._lock:
+            self._changed.add(channel)
+
+    def pop_changed(self):
+        """取出自上次调用以来统计有变化的频道"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return changed
+
+    def migrate(self, saved_channels):
+        """首次启动时导入 settings.json 中保存的频道和已有记录中出现过的频道"""
+        session = self.Session()
+        try:
+            result = session.execute(_insert_counted(DEFAULT_CHANNEL).on_conflict_do_nothing())
+            if result.rowcount == 0:
+                # default 已登记，说明已经导入过；升级后新增的统计列为空时重新统计
+                table = Channel.__table__
+                missing = session.execute(
+                    select(table.c.name).where(table.c.total_bytes.is_(None))
+                ).scalars().all()
+                for name in missing:
+                    session.execute(table.update().where(table.c.name == name).values(**_recount(name)))
+                session.commit()
+                return
+
+            names = set(ch for ch in saved_channels or [] if isinstance(ch, str))
+            for model in (FileRecord, Message):
+                names.update(ch for (ch,) in session.execute(select(model.channel).distinct()))
+            names = [ch for ch in names if ch and ch.strip() and ch != DEFAULT_CHANNEL]
+            for name in names:
+                session.execute(_insert_counted(name).on_conflict_do_nothing())
+            self._bump(session)
+            session.commit()
+            print(f"已导入 {len(names) + 1} 个频道")
+        finally:
+            session.close()
+        self._invalidate()
+
+    def _read_version(self, session):
+        return session.execute(select(SyncState.value).where(SyncState.key == VERSION_KEY)).scalar()
+
+    def version(self):
+        """频道列表的版本，创建/重命名/删除频道后改变（所有进程共用）"""
+        session = self.Session()
+        try:
+            return self._read_version(session)
+        finally:
+            session.close()
+
+    def names(self):
+        """全部频道名称，default 排在最前"""
+        session = self.Session()
+        try:
+            version = self._read_version(session)
+            names = self._names
+            if names is not None and version == self._version:
+                return names
+            rows = session.execute(select(Channel.name)).scalars().all()
+        finally:
+            session.close()
+
+        names = sorted(set(rows) - {DEFAULT_CHANNEL})
+        names.insert(0, DEFAULT_CHANNEL)
+        with self._lock:
+            self._names = names
+            self._known = frozenset(names)
+            self._version = version
+        return names
+
+    def counts(self, session, channel, files=0, messages=0, size=0):
+        """在调用方的事务中（提交前）更新频道的文件数、消息数和文件总大小
+
+        已登记的频道只按增量更新计数，不扫描频道的记录；增加记录时同时更新最近活动时间。
+        增加记录时频道不存在则自动登记，统计按已有记录（已包含本次写入）计算；
+        删除记录时频道不存在则忽略。
+        """
+        table = Channel.__table__
+        adding = files > 0 or messages > 0
+        values = {
+            'file_count': func.max(table.c.file_count + files, 0),
+            'message_count': func.max(table.c.message_count + messages, 0),
+            'total_bytes': func.max(func.coalesce(table.c.total_bytes, 0) + size, 0)
+        }
+        if adding:
+            values['last_activity'] = datetime.now()
+        update = table.update().where(table.c.name == channel).values(**values)
+
+        result = session.execute(update)
+        if result.rowcount == 0 and adding:
+            # 新频道：本次写入已 flush，统计中已包含
+            session.flush()
+            result = session.execute(_insert_counted(channel).on_conflict_do_nothing())
+            if result.rowcount == 0:
+                # 其他请求刚登记了该频道，统计中不一定包含本次写入，按增量更新
+                session.execute(update)
+            if channel not in self._known:
+                self._bump(session)
+                self._invalidate(channel)
+                return
+        self.touch(channel)
+
+    def stats(self, expiring_window, channels=None):
+        """频道统计列表，channels 为空时返回全部频道
+
+        只读取 channels 表和即将过期（expiring_window 秒内）的文件，不扫描全部记录。
+        """
+        now = datetime.now()
+        session = self.Session()
+        try:
+            query = select(Channel)
+            expiring = (
+                select(FileRecord.channel, func.count())
+                .where(
+                    FileRecord.is_deleted == False,
+                    FileRecord.expire_time > now,
+                    FileRecord.expire_time <= now + timedelta(seconds=expiring_window)
+                )
+                .group_by(FileRecord.channel)
+            )
+            if channels is not None:
+                query = query.where(Channel.name.in_(channels))
+                expiring = expiring.where(FileRecord.channel.in_(channels))
+            rows = session.execute(query).scalars().all()
+            expiring = dict(session.execute(expiring).all())
+        finally:
+            session.close()
+
+        rows.sort(key=lambda row: (row.name != DEFAULT_CHANNEL, row.name))
+        return [
+            {
+                'channel': row.name,
+                'file_count': row.file_count,
+                'message_count': row.message_count,
+                'total_bytes': row.total_bytes or 0,
+                'last_activity': _timestamp(row.last_activity),
+                'expiring_soon': expiring.get(row.name, 0),
+                'created_at': _timestamp(row.created_at)
+            }
+            for row in rows
+        ]
+
+    def create(self, name, exist_ok=False):
+        """创建频道，已存在时抛出 ChannelError（exist_ok 为真时忽略）"""
+        session = self.Session()
+        try:
+            result = session.execute(_insert_counted(name).on_conflict_do_nothing())
+            if result.rowcount == 0:
+                session.rollback()
+                if exist_ok:
+                    return
+                raise ChannelError('频道已存在', 400)
+            self._bump(session)
+            session.commit()
+        finally:
+            session.close()
+        self._invalidate(name)
+
+    def delete(self, name):
+        """从频道列表中删除频道，频道中的文件和消息保持不变"""
+        session = self.Session()
+        try:
+            result = session.execute(Channel.__table__.delete().where(Channel.name == name))
+            if result.rowcount == 0:
+                session.rollback()
+                raise ChannelError(f'频道 "{name}" 不存在', 404)
+            self._bump(session)
+            session.commit()
+        finally:
+            session.close()
+        self._invalidate(name)
+
+    def rename(self, old_name, new_name):
+        """重命名频道，并把原频道的文件和消息分批移动到新频道"""
+        table = Channel.__table__
+
+        # 1. 登记新频道，沿用原频道的创建时间
+        session = self.Session()
+        try:
+            old = session.get(Channel, old_name)
+            if old is None:
+                raise ChannelError('原频道不存在', 404)
+            if session.get(Channel, new_name) is not None:
+                raise ChannelError('新频道名称已存在', 400)
+            session.execute(table.insert().values(
+                name=new_name, created_at=old.created_at, file_count=0, message_count=0
+            ))
+            self._bump(session)
+            session.commit()
+        finally:
+            session.close()
+        self._invalidate(new_name)
+
+        # 2. 分批修改记录的频道，每批单独提交
+        moved = 0
+        for model in (FileRecord, Message):
+            records = model.__table__
+            while True:
+                session = self.Session()
+                try:
+                    batch = (
+                        select(records.c.id)
+                        .where(records.c.channel == old_name)
+                        .limit(RENAME_BATCH_SIZE)
+                        .scalar_subquery()
+                    )
+                    result = session.execute(
+                        records.update().where(records.c.id.in_(batch)).values(channel=new_name)
+                    )
+                    session.commit()
+                finally:
+                    session.close()
+                moved += result.rowcount
+                if result.rowcount < RENAME_BATCH_SIZE:
+                    break
+
+        # 3. 移动期间新写入原频道的记录一并移动，重新统计新频道并删除原频道
+        session = self.Session()
+        try:
+            for model in (FileRecord, Message):
+                records = model.__table__
+                result = session.execute(
+                    records.update().where(records.c.channel == old_name).values(channel=new_name)
+                )
+                moved += result.rowcount
+            session.execute(table.update().where(table.c.name == new_name).values(**_recount(new_name)))
+            session.execute(table.delete().where(table.c.name == old_name))
+            self._bump(session)
+            session.commit()
+        finally:
+            session.close()
+        self._invalidate(old_name, new_name)
+        return moved
@@ -0,0 +1,198 @@
+"""
+多进程 / 多主机部署
+
+多个工作进程共用一个端口（gunicorn --workers N）或分布在多台主机上时：
+  - Socket.IO 广播经过消息队列（Redis，或 broker.py 中内置的本机代理），
+    每个进程只向连接到自己的客户端推送
+  - 变更事件的序号由数据库分配（SharedEventLog），任何一个进程都能回答增量同步请求
+  - 在线人数：每个进程广播自己各频道的人数，其他进程汇总后推送给自己的客户端，
+    定期心跳，超时未更新的进程（已退出）不再计入
+"""
+
+import json
+import uuid
+import threading
+
+import socketio
+from sqlalchemy import select, func, literal
+from sqlalchemy.pool import NullPool
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from broker import RespConnection
+from models import SyncEvent, SyncState, create_sqlite_engine
+
+# 消息队列中除 Socket.IO 自身消息以外的两类消息
+EVENT_METHOD = 'lanshare_event'
+PRESENCE_METHOD = 'lanshare_presence'
+
+
+def create_message_queue(url, channel='lanshare', local_port=7071):
+    """按配置创建消息队列客户端，未配置时返回None（单进程模式）"""
+    if not url:
+        return None
+    if url == 'local':
+        url = f'redis://127.0.0.1:{local_port}'
+    return MessageQueueManager(url, channel=channel)
+
+
+class MessageQueueManager(socketio.PubSubManager):
+    """通过 Redis 协议的发布/订阅在多个进程之间同步 Socket.IO 消息"""
+
+    name = 'lanshare'
+
+    def __init__(self, url, channel='lanshare', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+        # 自定义消息的处理函数：method -> handler(message)
+        self.handlers = {}
+        # 订阅连接建立后调用 on_subscribed(是否为重连)
+        self.on_subscribed = None
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _publish(self, data):
+        # 消息队列没有身份验证，只交换JSON，不能使用 pickle（收到构造的数据会执行任意代码）
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = RespConnection(self.url)
+                    return self._publisher.command('PUBLISH', self.channel, payload)
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        retry_seconds = 1
+        subscribed_before = False
+        while True:
+            connection = None
+            try:
+                connection = RespConnection(self.url)
+                connection.subscribe(self.channel)
+                retry_seconds = 1
+                if self.on_subscribed is not None:
+                    self.on_subscribed(subscribed_before)
+                subscribed_before = True
+                while True:
+                    reply = connection.read()
+                    if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b'message':
+                        continue
+                    try:
+                        message = json.loads(reply[2])
+                    except ValueError:
+                        continue
+                    if not isinstance(message, dict):
+                        continue
+                    handler = self.handlers.get(message.get('method'))
+                    if handler is None:
+                        yield message
+                        continue
+                    try:
+                        handler(message)
+                    except Exception as e:
+                        print(f"处理消息队列消息失败: {e}")
+            except OSError as e:
+                print(f"消息队列连接断开: {e}，{retry_seconds}秒后重连")
+            finally:
+                if connection is not None:
+                    connection.close()
+            self.server.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, 30)
+
+    def publish_event(self, channel, event, data, seq):
+        """发布一个变更事件，所有进程（包括本进程）收到后各自推送"""
+        self._publish({
+            'method': EVENT_METHOD,
+            'host_id': self.host_id,
+            'channel': channel,
+            'event': event,
+            'data': data,
+            'seq': seq
+        })
+
+    def publish_presence(self, counts, full=False, request=False):
+        """发布本进程各频道的在线人数；full 表示包含全部频道，request 表示请求其他进程回报"""
+        self._publish({
+            'method': PRESENCE_METHOD,
+            'host_id': self.host_id,
+            'counts': counts,
+            'full': full,
+            'request': request
+        })
+
+
+class SharedEventLog:
+    """保存在数据库中的频道变更事件，接口与 events.EventLog 相同，所有进程共用
+
+    序号在写事务中分配（SQLite 同一时刻只有一个写事务）。事件在事务提交后才发布到
+    消息队列，不在持有写锁时等待网络；各进程收到的事件顺序可能与序号略有不同，
+    客户端按收到的最大序号增量同步，缺少的事件在重新同步时补齐。
+    """
+
+    def __init__(self, engine, size=1000):
+        # 使用独立的连接：请求线程在持有会话连接时发布事件，与请求共用连接池时可能因连接耗尽而互相等待
+        self.engine = create_sqlite_engine(engine.url, poolclass=NullPool)
+        self.size = size
+        state = SyncState.__table__
+        with engine.begin() as conn:
+            # 事件保存在数据库中，服务重启后序号仍然有效，epoch 只在首次创建时生成
+            conn.execute(
+                sqlite_insert(state).values(key='epoch', value=uuid.uuid4().hex).on_conflict_do_nothing()
+            )
+            self.epoch = conn.execute(select(state.c.value).where(state.c.key == 'epoch')).scalar_one()
+
+    def append(self, channel, event, data, notify=None):
+        """记录事件并返回分配的序号；notify(seq) 在事务提交后调用"""
+        events = SyncEvent.__table__
+        payload = json.dumps(data, ensure_ascii=False)
+        with self.engine.begin() as conn:
+            # INSERT ... SELECT 在取得写锁之后才读取最大序号，不同进程不会分到相同的序号
+            next_seq = select(
+                literal(channel), func.coalesce(func.max(events.c.seq), 0) + 1, literal(event), literal(payload)
+            ).where(events.c.channel == channel)
+            result = conn.execute(events.insert().from_select(['channel', 'seq', 'event', 'data'], next_seq))
+            seq = conn.execute(select(events.c.seq).where(events.c.id == result.lastrowid)).scalar_one()
+            conn.execute(events.delete().where(events.c.channel == channel, events.c.seq <= seq - self.size))
+        if notify is not None:
+            try:
+                notify(seq)
+            except Exception as e:
+                # 推送失败时事件仍然记录下来，客户端重新同步时可以补齐
+                print(f"发布事件失败: {e}")
+        return seq
+
+    def current(self, channel):
+        """频道当前的最新序号"""
+        events = SyncEvent.__table__
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(events.c.seq)).where(events.c.channel == channel)).scalar() or 0
+
+    def since(self, channel, seq, epoch):
+        """返回序号 seq 之后的事件列表；无法增量同步时返回None"""
+        if epoch != self.epoch or seq < 0:
+            return None
+        events = SyncEvent.__table__
+        with self.engine.connect() as conn:
+            first, current = conn.execute(
+                select(func.min(events.c.seq), func.max(events.c.seq)).where(events.c.channel == channel)
+            ).one()
+            current = current or 0
+            if seq > current:
+                return None
+            if seq < current and first > seq + 1:
+                # 需要的事件已被淘汰
+                return None
+            rows = conn.execute(
+                select(events.c.seq, events.c.event, events.c.data)
+                .where(events.c.channel == channel, events.c.seq > seq)
+                .order_by(events.c.seq)
+            )
+            return [
+                {'seq': event_seq, 'event': event, 'data': json.loads(data)}
+                for event_seq, event, data in rows
+            ]
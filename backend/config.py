@@ -5,13 +5,68 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'lanshare-secret-key-2025')
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
     DATABASE_PATH = os.environ.get('DATABASE_PATH', './data/lanshare.db')
-    MAX_CONTENT_LENGTH = None  # 无文件大小限制
+    MAX_CONTENT_LENGTH = int(os.environ['MAX_CONTENT_LENGTH']) if os.environ.get('MAX_CONTENT_LENGTH') else None  # 单个请求/文件大小上限（字节），默认无限制
     
     # WebSocket配置
     SOCKETIO_ASYNC_MODE = 'threading'
     
+    # 服务器模式：gunicorn（生产环境，参数见 gunicorn.conf.py）或 werkzeug（开发服务器）
+    SERVER_MODE = os.environ.get('SERVER_MODE', 'gunicorn')
+    
     # 支持的文件类型（已取消限制，支持所有类型）
     ALLOWED_EXTENSIONS = set()  # 空集合表示支持所有类型
     
     # 自动清理设置
-    AUTO_CLEAN_DAYS = int(os.environ.get('AUTO_CLEAN_DAYS', 7))
\ No newline at end of file
+    AUTO_CLEAN_DAYS = int(os.environ.get('AUTO_CLEAN_DAYS', 7))  # 文件过期后继续保留的天数（显示为已过期），之后自动删除
+    EXPIRY_REAPER_BATCH = int(os.environ.get('EXPIRY_REAPER_BATCH', 200))  # 每个事务删除的过期文件数
+    EXPIRY_REAPER_HORIZON = int(os.environ.get('EXPIRY_REAPER_HORIZON', 3600))  # 内存中只保存这段时间内（秒）到期的文件，用完后重新查询
+    
+    # 断点续传设置
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # 建议分片大小
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # 未完成会话保留秒数
+    UPLOAD_SESSION_CLEAN_INTERVAL = int(os.environ.get('UPLOAD_SESSION_CLEAN_INTERVAL', 600))  # 清理间隔秒数
+    PRECHECK_CHALLENGE_TTL = int(os.environ.get('PRECHECK_CHALLENGE_TTL', 300))  # 秒传抽样校验的有效期（秒）
+    
+    # 缩略图设置
+    THUMBNAIL_CACHE_SIZE = int(os.environ.get('THUMBNAIL_CACHE_SIZE', 512 * 1024 * 1024))  # 缓存总大小上限（字节）
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', min(4, os.cpu_count() or 1)))  # 生成进程数，0表示在线程中生成
+    
+    # WebSocket事件推送设置
+    EVENT_TICK_MS = int(os.environ.get('EVENT_TICK_MS', 30))  # 事件合并周期（毫秒）
+    EVENT_CHANNEL_LIMIT = int(os.environ.get('EVENT_CHANNEL_LIMIT', 1000))  # 单个频道每周期最多缓冲的事件数，超出时通知客户端重新加载
+    EVENT_CLIENT_QUEUE_LIMIT = int(os.environ.get('EVENT_CLIENT_QUEUE_LIMIT', 256))  # 单个客户端发送队列积压上限
+    EVENT_LOG_SIZE = int(os.environ.get('EVENT_LOG_SIZE', 1000))  # 每个频道保留的最近事件数，用于重连后增量同步
+    
+    # 多进程/多主机部署设置
+    MESSAGE_QUEUE = os.environ.get('MESSAGE_QUEUE', '')  # Socket.IO消息队列：空=单进程，local=内置本机代理，redis://主机:端口=Redis或单独运行的broker.py
+    MESSAGE_QUEUE_CHANNEL = os.environ.get('MESSAGE_QUEUE_CHANNEL', 'lanshare')  # 多个LanShare实例共用一个Redis时用不同的频道区分
+    LOCAL_BROKER_PORT = int(os.environ.get('LOCAL_BROKER_PORT', 7071))  # 内置代理监听的本机端口
+    PRESENCE_HEARTBEAT = int(os.environ.get('PRESENCE_HEARTBEAT', 10))  # 各进程上报在线人数的间隔（秒）
+    
+    # 设置缓存
+    SETTINGS_CHECK_INTERVAL = float(os.environ.get('SETTINGS_CHECK_INTERVAL', 1))  # 检查settings.json是否被其他进程修改的最小间隔（秒）
+    
+    # 密码保护设置
+    AUTH_SECRET = os.environ.get('SECRET_KEY', '')  # 会话令牌签名密钥，未设置SECRET_KEY时使用 data/secret.key 中随机生成的密钥
+    AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 7 * 24 * 3600))  # 会话令牌有效期（秒）
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 执行bcrypt计算的线程数
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))  # 同时排队的bcrypt计算上限，超出时返回503
+    LOGIN_MAX_ATTEMPTS = int(os.environ.get('LOGIN_MAX_ATTEMPTS', 10))  # 每个IP在时间窗口内最多尝试密码的次数
+    LOGIN_ATTEMPT_WINDOW = int(os.environ.get('LOGIN_ATTEMPT_WINDOW', 300))  # 密码尝试次数的统计窗口（秒）
+    
+    # 频道统计
+    CHANNEL_STATS_INTERVAL = float(os.environ.get('CHANNEL_STATS_INTERVAL', 1))  # 合并推送频道统计（channel_stats事件）的间隔（秒）
+    EXPIRING_SOON_HOURS = int(os.environ.get('EXPIRING_SOON_HOURS', 24))  # 统计“即将过期”文件的时间范围（小时）
+    
+    # 数据库设置
+    DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')  # SQLite同步模式：NORMAL（WAL下只在检查点同步磁盘）或FULL（每次提交都同步）
+    DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 30000))  # 等待其他进程释放写锁的最长时间（毫秒）
+    DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))  # 每个连接的页缓存大小（KiB）
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))  # 内存映射读取的数据库大小上限（字节），0表示不使用
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))  # 连接池中保持打开的连接数
+    DB_POOL_OVERFLOW = int(os.environ.get('DB_POOL_OVERFLOW', 56))  # 并发请求较多时额外打开的连接数上限
+    DB_WRITE_BATCH = int(os.environ.get('DB_WRITE_BATCH', 64))  # 写线程一次提交合并的写操作数上限
+    
+    # 列表缓存
+    LIST_CACHE_SIZE = int(os.environ.get('LIST_CACHE_SIZE', 32 * 1024 * 1024))  # 每个进程缓存的文件列表/消息历史响应总大小上限（字节）
+    LIST_CACHE_TTL = float(os.environ.get('LIST_CACHE_TTL', 30))  # 文件列表（剩余时间随时间变化）的最长缓存时间（秒）
\ No newline at end of file
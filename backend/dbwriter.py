@@ -0,0 +1,150 @@
+"""
+单写线程与合并提交
+
+SQLite 同一时刻只允许一个写事务。请求线程各自写入时，每个小事务都要单独
+取得写锁、提交（WAL追加和检查），并发较多时大量时间花在等待锁上。
+
+WriteQueue 把小的写操作交给一个专门的写线程执行：
+  - 请求线程提交 job(session)，阻塞等待结果（行为与直接写入相同，只是在另一个线程执行）
+  - 写线程取出队列中已有的全部操作（最多 max_batch 个），在一个 BEGIN IMMEDIATE
+    事务中依次执行，每个操作放在单独的 SAVEPOINT 中，出错时只撤销该操作
+  - 整批只提交一次，然后把结果交还给各个请求线程
+  - 请求线程等待超时后操作仍会执行：submit 抛出 WriteTimeout，提交后由写线程
+    调用 on_commit(result)，调用方在其中完成提交后的工作（如推送事件）
+
+目前只有发送和删除消息经过写线程；上传、删除文件、延期和频道统计等写操作
+仍在请求线程中各自提交（由 WAL 和 busy_timeout 排队）。
+
+job 在写线程中执行，不能访问 flask.request 等请求上下文；需要的值应在提交前取出。
+返回值应是普通数据（ID、时间等），提交后会话中的ORM对象即失效。
+"""
+
+import queue
+import threading
+from functools import partial
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from sqlalchemy.orm import sessionmaker
+
+from models import create_sqlite_engine
+
+
+class WriteQueue:
+    """由单个写线程执行并合并提交的写操作队列"""
+
+    def __init__(self, engine, pragmas=None, max_batch=64, timeout=30):
+        # 写线程独占一个连接，事务以 BEGIN IMMEDIATE 开始
+        self.engine = create_sqlite_engine(engine.url, pragmas=pragmas, immediate=True, pool_size=1, max_overflow=0)
+        self.Session = sessionmaker(bind=self.engine)
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._metrics = {'transactions': 0, 'operations': 0, 'max_batch': 0, 'timeouts': 0}
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='lanshare-db-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, job, on_commit=None):
+        """在写线程中执行 job(session) 并返回结果，job 抛出的异常在调用线程中重新抛出
+
+        等待超过 timeout 秒时抛出 WriteTimeout，操作留在队列中继续执行，
+        成功提交后调用 on_commit(result)。
+        """
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((job, future))
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            self._metrics['timeouts'] += 1
+            if on_commit is not None:
+                future.add_done_callback(partial(_after_commit, on_commit))
+            raise WriteTimeout('数据库繁忙，写操作稍后完成')
+
+    def metrics(self):
+        return dict(self._metrics)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """在一个事务中执行一批操作
+
+        先不使用 SAVEPOINT 直接执行整批（SQL语句最少）；有操作出错时回滚，
+        再逐个放在 SAVEPOINT 中重新执行，只撤销出错的操作。
+        """
+        batch = [(job, future) for job, future in batch if future.set_running_or_notify_cancel()]
+        try:
+            results = self._execute(batch, savepoints=False)
+        except _JobFailed:
+            try:
+                results = self._execute(batch, savepoints=True)
+            except Exception as e:
+                results = [(future, None, e) for _, future in batch]
+        except Exception as e:
+            # 提交失败时整批操作都没有生效
+            results = [(future, None, e) for _, future in batch]
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _execute(self, batch, savepoints):
+        results = []
+        session = self.Session()
+        try:
+            for job, future in batch:
+                if not savepoints:
+                    results.append((future, job(session), None))
+                    continue
+                try:
+                    with session.begin_nested():
+                        results.append((future, job(session), None))
+                except Exception as e:
+                    results.append((future, None, e))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if not savepoints and len(results) < len(batch):
+                # 某个操作出错（不是提交失败）
+                raise _JobFailed() from e
+            raise
+        finally:
+            session.close()
+
+        self._metrics['transactions'] += 1
+        self._metrics['operations'] += len(results)
+        self._metrics['max_batch'] = max(self._metrics['max_batch'], len(results))
+        return results
+
+
+class WriteTimeout(Exception):
+    """写操作没有在等待时间内完成（仍会执行）"""
+
+
+def _after_commit(on_commit, future):
+    if future.exception() is not None:
+        return
+    try:
+        on_commit(future.result())
+    except Exception as e:
+        print(f"写操作提交后的处理失败: {e}")
+
+
+class _JobFailed(Exception):
+    """整批执行时某个操作出错，需要逐个重新执行"""
@@ -0,0 +1,263 @@
+"""
+WebSocket 事件合并推送
+
+HTTP 处理函数只把事件放入缓冲区，由后台任务每隔一个周期（几十毫秒）
+按频道合并后推送：
+  - file_uploaded / file_deleted / file_expiry_extended → files_changed
+  - new_message / message_deleted → messages_batch
+  - presence 只保留最新的一条
+批量上传200个文件时每个客户端只会收到少量合并后的事件。
+
+背压处理：
+  - 单个频道缓冲的事件过多时丢弃明细，改为通知该频道的客户端重新同步（resync）
+  - 某个客户端的发送队列积压超过上限时暂停向它推送，队列清空后再发送 resync，
+    慢速设备不会拖慢其他客户端
+
+增量同步：
+  每个变更事件都有频道内单调递增的序号，最近的事件保存在环形缓冲区中。
+  客户端记录收到的最后序号，重连或收到 resync 后只拉取之后的事件；
+  序号已被淘汰或服务重启（epoch 变化）时才需要重新加载完整列表。
+
+多进程部署：
+  变更事件由 cluster.SharedEventLog 分配序号并经消息队列发给所有进程，
+  每个进程把收到的事件放入自己的缓冲区，只推送给连接到本进程的客户端。
+"""
+
+import uuid
+import threading
+from functools import partial
+from collections import deque
+
+FILE_EVENTS = ('file_uploaded', 'file_deleted', 'file_expiry_extended')
+MESSAGE_EVENTS = ('new_message', 'message_deleted')
+
+NAMESPACE = '/'
+
+
+class EventLog:
+    """按频道保存最近的变更事件及序号"""
+
+    def __init__(self, size=1000):
+        self.size = size
+        # 每次启动生成新的epoch，客户端据此判断序号是否仍然有效
+        self.epoch = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._seqs = {}
+        self._events = {}
+
+    def append(self, channel, event, data):
+        """记录事件并返回分配的序号"""
+        with self._lock:
+            seq = self._seqs.get(channel, 0) + 1
+            self._seqs[channel] = seq
+            events = self._events.get(channel)
+            if events is None:
+                events = self._events[channel] = deque(maxlen=self.size)
+            events.append((seq, event, data))
+            return seq
+
+    def current(self, channel):
+        """频道当前的最新序号"""
+        with self._lock:
+            return self._seqs.get(channel, 0)
+
+    def since(self, channel, seq, epoch):
+        """返回序号 seq 之后的事件列表；无法增量同步时返回None"""
+        with self._lock:
+            current = self._seqs.get(channel, 0)
+            if epoch != self.epoch or seq < 0 or seq > current:
+                return None
+            events = self._events.get(channel, ())
+            if seq < current and (not events or events[0][0] > seq + 1):
+                # 需要的事件已被淘汰
+                return None
+            return [
+                {'seq': event_seq, 'event': event, 'data': data}
+                for event_seq, event, data in events if event_seq > seq
+            ]
+
+
+class ChannelBuffer:
+    """一个频道在当前周期内积累的事件"""
+
+    def __init__(self):
+        self.count = 0
+        self.seq = None
+        self.overflow = False
+        self.uploaded = []
+        self.file_deleted = []
+        self.file_updated = {}
+        self.messages = []
+        self.message_deleted = []
+        self.presence = None
+
+    def add(self, event, data):
+        self.count += 1
+        if event == 'file_uploaded':
+            self.uploaded.append(data)
+        elif event == 'file_deleted':
+            self.file_deleted.append(data['file_id'])
+        elif event == 'file_expiry_extended':
+            # 同一文件多次延期只保留最后一次
+            self.file_updated[data['file_id']] = data
+        elif event == 'new_message':
+            self.messages.append(data)
+        elif event == 'message_deleted':
+            self.message_deleted.append(data['message_id'])
+        else:
+            raise ValueError(f'未知的事件类型: {event}')
+
+    def batches(self, channel, epoch):
+        """生成要推送的 (事件名, 数据) 列表，数据中带有本批最后的序号"""
+        if self.overflow:
+            yield 'resync', {'channel': channel}
+        else:
+            if self.uploaded or self.file_deleted or self.file_updated:
+                yield 'files_changed', {
+                    'channel': channel,
+                    'epoch': epoch,
+                    'seq': self.seq,
+                    'uploaded': self.uploaded,
+                    'deleted': self.file_deleted,
+                    'updated': list(self.file_updated.values())
+                }
+            if self.messages or self.message_deleted:
+                yield 'messages_batch', {
+                    'channel': channel,
+                    'epoch': epoch,
+                    'seq': self.seq,
+                    'messages': self.messages,
+                    'deleted': self.message_deleted
+                }
+        if self.presence is not None:
+            yield 'presence', self.presence
+
+
+class EventDispatcher:
+    """按频道合并事件并在后台批量推送"""
+
+    def __init__(self, socketio, event_log, tick_seconds=0.03, channel_limit=1000, client_queue_limit=256, queue=None):
+        self.socketio = socketio
+        self.event_log = event_log
+        # 多进程部署时的消息队列（cluster.MessageQueueManager），None 表示单进程
+        self.queue = queue
+        self.tick_seconds = tick_seconds
+        self.channel_limit = channel_limit
+        self.client_queue_limit = client_queue_limit
+        self._lock = threading.Lock()
+        self._buffers = {}
+        # 因发送队列积压而暂停推送的连接：sid -> 错过事件的频道集合
+        self._lagging = {}
+        self._started = False
+
+    def publish(self, channel, event, data):
+        """记录事件并放入缓冲区，立即返回"""
+        tracked = event in FILE_EVENTS or event in MESSAGE_EVENTS
+        if tracked and self.queue is not None:
+            # 由各进程收到消息队列中的事件后调用 deliver 放入缓冲区
+            self.event_log.append(channel, event, data, partial(self.queue.publish_event, channel, event, data))
+            return
+
+        with self._lock:
+            # 在同一把锁内分配序号，保证缓冲区中的事件按序号排列
+            seq = self.event_log.append(channel, event, data) if tracked else None
+            self._buffer(channel, event, data, seq)
+
+    def deliver(self, channel, event, data, seq):
+        """放入从消息队列收到的事件"""
+        with self._lock:
+            self._buffer(channel, event, data, seq)
+
+    def request_resync(self, channel):
+        """丢弃频道缓冲的事件，下个周期通知客户端重新同步"""
+        with self._lock:
+            self._overflow(channel)
+
+    def _overflow(self, channel):
+        """不再保留频道的事件明细，改为通知客户端重新加载；调用方需持有锁"""
+        previous = self._buffers.get(channel)
+        buffer = self._buffers[channel] = ChannelBuffer()
+        buffer.overflow = True
+        buffer.presence = previous.presence if previous is not None else None
+
+    def _buffer(self, channel, event, data, seq):
+        """放入频道缓冲区；调用方需持有锁"""
+        buffer = self._buffers.get(channel)
+        if buffer is None:
+            buffer = self._buffers[channel] = ChannelBuffer()
+        if event == 'presence':
+            buffer.presence = data
+        elif buffer.overflow:
+            return
+        elif buffer.count >= self.channel_limit:
+            # 积压过多时不再保留明细，让客户端重新加载
+            self._overflow(channel)
+        else:
+            buffer.add(event, data)
+            # 多进程部署时事件在提交后才经消息队列到达，顺序可能与序号略有不同
+            if buffer.seq is None or (seq is not None and seq > buffer.seq):
+                buffer.seq = seq
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"推送事件失败: {e}")
+
+    def flush(self):
+        """推送当前缓冲区中的所有事件"""
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+
+        self._release_drained()
+
+        for channel, buffer in buffers.items():
+            skip = self._lagging_sids(channel)
+            for event, data in buffer.batches(channel, self.event_log.epoch):
+                # 只推送给本进程的客户端，其他进程各自推送
+                self.socketio.emit(event, data, room=channel, skip_sid=skip or None, ignore_queue=True)
+
+    def _queue_size(self, eio_sid):
+        eio_socket = self.socketio.server.eio.sockets.get(eio_sid)
+        return None if eio_socket is None else eio_socket.queue.qsize()
+
+    def _lagging_sids(self, channel):
+        """找出发送队列积压的连接，本周期跳过它们"""
+        skip = []
+        server = self.socketio.server
+        if NAMESPACE not in server.manager.rooms:
+            # 还没有任何客户端连接过
+            return skip
+        for sid, eio_sid in server.manager.get_participants(NAMESPACE, channel):
+            if sid in self._lagging:
+                self._lagging[sid].add(channel)
+                skip.append(sid)
+                continue
+            size = self._queue_size(eio_sid)
+            if size is not None and size >= self.client_queue_limit:
+                self._lagging[sid] = {channel}
+                skip.append(sid)
+        return skip
+
+    def _release_drained(self):
+        """发送队列已清空的连接恢复推送，并让它重新加载错过的频道"""
+        if not self._lagging:
+            return
+        manager = self.socketio.server.manager
+        for sid, channels in list(self._lagging.items()):
+            eio_sid = manager.eio_sid_from_sid(sid, NAMESPACE)
+            size = None if eio_sid is None else self._queue_size(eio_sid)
+            if size is None:
+                # 连接已断开
+                del self._lagging[sid]
+            elif size == 0:
+                del self._lagging[sid]
+                for channel in channels:
+                    self.socketio.emit('resync', {'channel': channel}, to=sid, ignore_queue=True)
@@ -0,0 +1,49 @@
+"""
+gunicorn 配置（生产环境）
+
+使用 gthread 工作模式：每个连接占用一个线程，WebSocket 通过 simple-websocket
+直接接管连接，文件下载由 gunicorn 调用 sendfile 发送（见 ranges.py）。
+
+默认只启动一个工作进程，并发能力由线程数决定。GUNICORN_WORKERS 大于1时，
+各进程通过消息队列同步Socket.IO广播（见 cluster.py）：未设置 MESSAGE_QUEUE 时
+由主进程运行内置的本机代理（broker.py）。
+启动: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7070)}"
+
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+if workers > 1 and not os.environ.get('MESSAGE_QUEUE'):
+    # 工作进程由主进程 fork，继承这里设置的环境变量
+    os.environ['MESSAGE_QUEUE'] = 'local'
+# 同时处理的连接数上限：每个WebSocket长连接和正在进行的下载都占用一个线程，
+# 线程空闲时只占用很少的内存，按在线设备数的上限设置
+threads = int(os.environ.get('GUNICORN_THREADS', 1024))
+# 包括空闲keep-alive连接在内的连接总数上限
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2048))
+
+# 大文件上传/下载可能持续很久；gthread的心跳由主循环发送，不受单个请求耗时影响
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+# 允许较长的请求头（Range多区间、Cookie等）
+limit_request_field_size = 16384
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """主进程开始监听后、启动工作进程之前，按需启动内置的消息队列代理"""
+    if os.environ.get('MESSAGE_QUEUE') != 'local':
+        return
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from broker import LocalBroker
+    LocalBroker(port=int(os.environ.get('LOCAL_BROKER_PORT', 7071))).start()
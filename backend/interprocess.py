@@ -0,0 +1,55 @@
+"""
+多个工作进程共用数据目录时的文件加锁与原子写入
+
+settings.json、上传会话元数据等文件的"读取-修改-写入"用文件锁串行化；
+写入时先写临时文件再 rename，读取方不会看到写了一半的内容。
+"""
+
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 flock，只在进程内加锁
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """对 path 加独占锁，锁文件不存在时自动创建（所在目录必须已存在）"""
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+        with lock:
+            yield
+        return
+
+    # flock 锁属于打开的文件，同一进程内的不同线程各自打开时也会互斥
+    with open(path, 'a+b') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_json(path, data, **kwargs):
+    """把 data 以JSON格式原子地写入 path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
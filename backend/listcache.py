@@ -0,0 +1,97 @@
+"""
+文件列表和消息历史的响应缓存
+
+客户端收到变更事件后经常重新请求同一个列表，而两次请求之间列表没有变化。
+这里在进程内按 (频道, 游标, 过滤条件) 缓存编码好的响应：
+  - 每个缓存项带有生成时频道的版本，版本不同时重新生成。版本由调用方提供，
+    应当在任何写入该频道的操作之后改变（app.py 使用频道的事件序号和频道列表版本）
+  - 同一个键、同一个版本的并发请求只生成一次，其余请求等待并共用结果；
+    等待超时（例如生成的请求被数据库锁阻塞）时各自直接生成，不写入缓存
+  - 按响应总大小做LRU淘汰；内容随时间变化的列表（文件的剩余时间）可以指定最长缓存时间
+  - 每个响应带有内容哈希作为 ETag，客户端带 If-None-Match 请求未变化的列表时返回304
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from listing import dumps
+
+
+class ListCache:
+    """按版本失效、按大小做LRU淘汰的JSON响应缓存"""
+
+    def __init__(self, max_bytes, timeout=30):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # 键 -> (版本, 过期时间, 响应内容, ETag)，最久未使用的在前
+        self._entries = OrderedDict()
+        self._total = 0
+        # 正在生成的响应，(键, 版本) -> Future
+        self._pending = {}
+        self._metrics = {'hits': 0, 'misses': 0, 'coalesced': 0, 'timeouts': 0}
+
+    def get(self, key, version, build, ttl=None):
+        """返回 (响应内容, ETag)；缓存中没有该版本时调用 build() 生成响应数据
+
+        ttl 为缓存项的最长保留秒数，None 表示只按版本失效。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                return entry[2], entry[3]
+            future = self._pending.get((key, version))
+            created = future is None
+            if created:
+                future = self._pending[(key, version)] = Future()
+                self._metrics['misses'] += 1
+            else:
+                self._metrics['coalesced'] += 1
+
+        if not created:
+            try:
+                return future.result(self.timeout)
+            except FutureTimeout:
+                with self._lock:
+                    self._metrics['timeouts'] += 1
+                return self._encode(build)
+
+        try:
+            body, etag = self._encode(build)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop((key, version), None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._pending.pop((key, version), None)
+            self._store(key, (version, None if ttl is None else time.monotonic() + ttl, body, etag))
+        future.set_result((body, etag))
+        return body, etag
+
+    def _encode(self, build):
+        body = dumps(build())
+        return body, hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def _store(self, key, entry):
+        """保存缓存项并淘汰超出大小上限的部分；调用方需持有锁"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total -= len(previous[2])
+        if len(entry[2]) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._total += len(entry[2])
+        while self._total > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total -= len(evicted[2])
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, entries=len(self._entries), bytes=self._total)
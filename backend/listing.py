@@ -0,0 +1,141 @@
+"""
+列表接口的读取路径
+
+文件列表和消息历史每页可能有成千上万行，逐行构造ORM对象、再复制成字典、
+最后用标准库 json 编码，大部分CPU时间都花在与数据本身无关的地方。这里：
+  - 只查询需要的列（SQLAlchemy Core 的 select），通过会话的连接直接执行，
+    不经过ORM的结果处理，结果是普通的元组
+  - 元组按固定顺序直接转换成响应中的字典
+  - 安装了 orjson 时用它编码JSON，否则使用标准库 json
+
+剩余时间的显示（remaining_text 等）在文件列表、上传通知和延期通知中格式相同，
+统一由 remaining_time() 计算。
+"""
+
+import json
+
+from flask import Response
+
+from models import FileRecord, Message
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，没有安装时使用标准库
+    orjson = None
+
+
+def dumps(obj):
+    """把响应数据编码为UTF-8的JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """与 jsonify 相同的JSON响应，编码更快"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def fetch_rows(session, query):
+    """在会话的连接上执行Core查询，返回全部行"""
+    return session.connection().execute(query).all()
+
+
+# 已过期文件的 (remaining_text, 天, 小时, 分钟)
+EXPIRED = ('已过期', 0, 0, 0)
+
+
+def split_remaining(total_seconds):
+    """剩余秒数转为 (remaining_text, 天, 小时, 分钟)"""
+    if total_seconds <= 0:
+        return EXPIRED
+    days, rest = divmod(total_seconds, 24 * 3600)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    if days > 0:
+        text = f'{days}天'
+    elif hours > 0:
+        text = f'{hours}小时{minutes}分钟'
+    else:
+        text = f'{minutes}分钟'
+    return text, days, hours, minutes
+
+
+def remaining_time(expire_time, now):
+    """计算文件的剩余时间及其显示文本（上传和延期通知使用）"""
+    total_seconds = int((expire_time - now).total_seconds())
+    text, days, hours, minutes = split_remaining(total_seconds)
+    return {
+        'is_expired': total_seconds <= 0,
+        'remaining_text': text,
+        'remaining_days': days,
+        'remaining_hours': hours,
+        'remaining_minutes': minutes,
+        'total_remaining_seconds': max(0, total_seconds)
+    }
+
+
+# 文件列表需要的列，顺序与 file_item() 中的解包一致
+FILE_COLUMNS = (
+    FileRecord.id,
+    FileRecord.original_filename,
+    FileRecord.file_size,
+    FileRecord.upload_time,
+    FileRecord.expire_time,
+    FileRecord.uploader_name,
+    FileRecord.file_type
+)
+
+
+def file_item(row, now):
+    """FILE_COLUMNS 查询结果的一行转为文件列表中的一项"""
+    file_id, filename, file_size, upload_time, expire_time, uploader_name, file_type = row
+    # 与 remaining_time() 相同，展开写以减少每行的函数调用
+    total_seconds = int((expire_time - now).total_seconds())
+    text, days, hours, minutes = split_remaining(total_seconds)
+    return {
+        'id': file_id,
+        'filename': filename,
+        'file_size': file_size,
+        'upload_time': int(upload_time.timestamp() * 1000),  # 毫秒时间戳
+        'expire_time': int(expire_time.timestamp() * 1000),
+        'uploader_name': uploader_name,
+        'file_type': file_type,
+        'download_url': f'/api/files/{file_id}/download',
+        'is_expired': total_seconds <= 0,
+        'remaining_text': text,
+        'remaining_days': days,
+        'remaining_hours': hours,
+        'remaining_minutes': minutes,
+        'total_remaining_seconds': total_seconds if total_seconds > 0 else 0
+    }
+
+
+# 消息历史需要的列，顺序与 message_item() 中的解包一致
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.content,
+    Message.sender_name,
+    Message.send_time,
+    Message.message_type,
+    Message.file_id,
+    Message.file_name,
+    Message.file_size,
+    Message.file_type
+)
+
+
+def message_item(row):
+    """MESSAGE_COLUMNS 查询结果的一行转为消息列表中的一项"""
+    message_id, content, sender_name, send_time, message_type, file_id, file_name, file_size, file_type = row
+    return {
+        'id': message_id,
+        'content': content,
+        'sender_name': sender_name,
+        'send_time': int(send_time.timestamp() * 1000),
+        'message_type': message_type,
+        'file_id': file_id,
+        'file_name': file_name,
+        'file_size': file_size,
+        'file_type': file_type
+    }
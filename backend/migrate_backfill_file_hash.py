@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为已有文件计算SHA-256并迁入内容寻址存储
+迁移后这些文件也可以参与去重和秒传
+"""
+
+import os
+import sys
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import FileRecord, Message, init_db
+from blobstore import BlobStore, checksum_file
+from config import Config
+
+def resolve_file_path(file_path):
+    """兼容相对路径和迁移上传目录后失效的绝对路径"""
+    if not os.path.isabs(file_path):
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_path)
+    if os.path.exists(file_path):
+        return file_path
+
+    alt_path = os.path.join(Config.UPLOAD_FOLDER, os.path.basename(file_path))
+    return alt_path if os.path.exists(alt_path) else None
+
+def migrate_backfill_file_hash():
+    """为没有file_hash的文件记录和聊天文件补充哈希"""
+    print("开始数据库迁移：补充文件哈希...")
+
+    engine, Session = init_db(Config.DATABASE_PATH)
+    blob_store = BlobStore(os.path.join(Config.UPLOAD_FOLDER, 'blobs'), Session)
+    session = Session()
+
+    try:
+        file_records = session.query(FileRecord).filter(
+            FileRecord.file_hash == None,
+            FileRecord.is_deleted == False
+        ).all()
+
+        file_messages = session.query(Message).filter(
+            Message.file_hash == None,
+            Message.message_type == 'file',
+            Message.file_path != None,
+            Message.is_deleted == False
+        ).all()
+
+        print(f"找到 {len(file_records)} 个文件记录、{len(file_messages)} 个聊天文件需要补充哈希")
+
+        migrated = 0
+        missing = 0
+        for item in file_records + file_messages:
+            file_path = resolve_file_path(item.file_path)
+            if not file_path:
+                missing += 1
+                continue
+
+            file_size = os.path.getsize(file_path)
+            file_hash, file_crc = checksum_file(file_path)
+            blob_path = blob_store.store(file_path, file_hash, file_size, file_crc)
+
+            item.file_hash = file_hash
+            item.file_path = blob_path
+            item.file_size = file_size
+            if isinstance(item, FileRecord):
+                item.filename = os.path.relpath(blob_path, Config.UPLOAD_FOLDER)
+
+            # 逐条提交，中断后可以重新运行继续迁移
+            session.commit()
+            migrated += 1
+
+        print(f"已迁移 {migrated} 个文件，{missing} 个文件在磁盘上不存在")
+        print("数据库迁移完成！")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    migrate_backfill_file_hash()
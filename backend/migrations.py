@@ -0,0 +1,159 @@
+"""
+数据库结构迁移
+
+每个迁移有一个递增的版本号，执行后记录在 schema_version 表中，启动时（init_db）
+只执行尚未记录的迁移。新数据库由 create_all 按模型建表后同样执行全部迁移并记录版本。
+
+SQLite 驱动不会为 ALTER/CREATE 语句开启事务，迁移中途中断时可能只完成了一部分，
+所以每个迁移都写成可以重复执行：列或索引已存在时跳过，数据修正只处理尚未修正的行。
+迁移中的表结构按当时的定义写死，不引用 models 中的模型，模型以后修改也不影响已有的迁移。
+
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)，版本号不能修改或复用。
+"""
+
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(text(f'PRAGMA table_info({table})'))}
+
+
+def add_column(conn, table, column, column_type):
+    """添加可空列，已存在时跳过"""
+    if column not in column_names(conn, table):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+
+
+def create_index(conn, name, table, columns):
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+
+def add_expire_time(conn):
+    add_column(conn, 'files', 'expire_time', 'DATETIME')
+    # 旧文件按上传时间 + 15天过期
+    conn.execute(text(
+        "UPDATE files SET expire_time = datetime(upload_time, '+15 days') "
+        "WHERE expire_time IS NULL AND upload_time IS NOT NULL"
+    ))
+
+
+def add_message_file_path(conn):
+    add_column(conn, 'messages', 'file_path', 'VARCHAR(500)')
+
+
+def add_blob_columns(conn):
+    add_column(conn, 'files', 'file_hash', 'VARCHAR(64)')
+    add_column(conn, 'messages', 'file_hash', 'VARCHAR(64)')
+    add_column(conn, 'blobs', 'crc32', 'INTEGER')
+    # 释放blob时按哈希查找引用它的记录
+    create_index(conn, 'ix_files_file_hash', 'files', ['file_hash'])
+    create_index(conn, 'ix_messages_file_hash', 'messages', ['file_hash'])
+
+
+def add_listing_indexes(conn):
+    # 文件列表和消息历史按 (时间, id) 做游标分页
+    create_index(conn, 'ix_files_channel_listing', 'files', ['channel', 'is_deleted', 'upload_time', 'id'])
+    create_index(conn, 'ix_messages_channel_history', 'messages', ['channel', 'is_deleted', 'send_time', 'id'])
+
+
+def add_channel_stats(conn):
+    add_column(conn, 'channels', 'total_bytes', 'INTEGER')
+    add_column(conn, 'channels', 'last_activity', 'DATETIME')
+    # 即将过期的文件统计和过期清理按过期时间范围查找
+    create_index(conn, 'ix_files_expiry', 'files', ['is_deleted', 'expire_time'])
+
+
+def fts5_trigram_supported(conn):
+    """SQLite 是否带有 FTS5 扩展和 trigram 分词器（3.34 以上）"""
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')"))
+    except OperationalError:
+        return False
+    conn.execute(text('DROP TABLE temp.fts5_probe'))
+    return True
+
+
+def create_search_index(conn, table, fts_table, columns):
+    """为 table 的 columns 建立外部内容的全文索引，只索引未删除的记录
+
+    标记删除（is_deleted 改为1）时由触发器从索引中移除，重命名频道只修改 channel 列，
+    不触发索引更新。
+    """
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{names}, content='{table}', content_rowid='id', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} '
+        f'WHEN new.is_deleted = 0 BEGIN '
+        f'INSERT INTO {fts_table} (rowid, {names}) VALUES (new.id, {new_values}); END'
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} '
+        f'WHEN old.is_deleted = 0 BEGIN '
+        f"INSERT INTO {fts_table} ({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {names}, is_deleted ON {table} BEGIN '
+        f"INSERT INTO {fts_table} ({fts_table}, rowid, {names}) "
+        f"SELECT 'delete', old.id, {old_values} WHERE old.is_deleted = 0; "
+        f'INSERT INTO {fts_table} (rowid, {names}) SELECT new.id, {new_values} WHERE new.is_deleted = 0; END'
+    ))
+    # 重新执行时先清空索引再导入，不会重复
+    conn.execute(text(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('delete-all')"))
+    conn.execute(text(
+        f'INSERT INTO {fts_table} (rowid, {names}) SELECT id, {names} FROM {table} WHERE is_deleted = 0'
+    ))
+
+
+def add_search_index(conn):
+    if not fts5_trigram_supported(conn):
+        # 搜索改为逐行匹配（见 search.py），升级SQLite后需删除此版本记录重新执行
+        print("SQLite 不支持 FTS5 trigram 分词器，跳过全文索引")
+        return
+    create_search_index(conn, 'files', 'files_fts', ['original_filename', 'uploader_name'])
+    create_search_index(conn, 'messages', 'messages_fts', ['content'])
+
+
+MIGRATIONS = [
+    (1, '文件过期时间', add_expire_time),
+    (2, '聊天文件路径', add_message_file_path),
+    (3, '内容寻址存储的哈希列与索引', add_blob_columns),
+    (4, '文件列表和消息历史的分页索引', add_listing_indexes),
+    (5, '频道统计列与过期时间索引', add_channel_stats),
+    (6, '文件名和聊天消息的全文索引', add_search_index)
+]
+
+
+def current_version(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at DATETIME NOT NULL)'
+    ))
+    return conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+
+def run_migrations(engine):
+    """执行尚未执行的迁移，返回执行的迁移数；调用方负责在多进程之间加锁"""
+    with engine.begin() as conn:
+        version = current_version(conn)
+
+    applied = 0
+    for migration_version, description, migrate in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': migration_version, 'd': description, 't': datetime.now()}
+            )
+        print(f"数据库迁移 {migration_version}: {description}")
+        applied += 1
+    return applied
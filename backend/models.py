@@ -1,10 +1,14 @@
 # type: ignore[import-untyped]
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean  # type: ignore[import-untyped]
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Text, Boolean, Index  # type: ignore[import-untyped]
 from sqlalchemy.ext.declarative import declarative_base  # type: ignore[import-untyped]
 from sqlalchemy.orm import sessionmaker  # type: ignore[import-untyped]
+from sqlalchemy.pool import QueuePool  # type: ignore[import-untyped]
 from datetime import datetime, timedelta
 import os
 
+from interprocess import file_lock
+from migrations import run_migrations
+
 Base = declarative_base()
 
 class FileRecord(Base):
@@ -21,8 +25,16 @@ class FileRecord(Base):
     uploader_name = Column(String(100), default='匿名用户')
     channel = Column(String(50), default='default')
     file_type = Column(String(50))
+    file_hash = Column(String(64), nullable=True, index=True)  # 内容SHA-256，对应blobs表
     is_deleted = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # 文件列表按 (upload_time, id) 做游标分页，每页只需一次索引范围扫描
+        Index('ix_files_channel_listing', 'channel', 'is_deleted', 'upload_time', 'id'),
+        # 按过期时间范围查找即将过期/已过期的文件
+        Index('ix_files_expiry', 'is_deleted', 'expire_time'),
+    )
+
 class Message(Base):
     __tablename__ = 'messages'
     
@@ -38,11 +50,111 @@ class Message(Base):
     file_name = Column(String(255), nullable=True)  # 文件名
     file_size = Column(Integer, nullable=True)  # 文件大小
     file_type = Column(String(50), nullable=True)  # 文件类型
+    file_hash = Column(String(64), nullable=True, index=True)  # 内容SHA-256，对应blobs表
     is_deleted = Column(Boolean, default=False)
 
-def init_db(database_path):
-    """初始化数据库"""
+    __table_args__ = (
+        # 消息历史按 (send_time, id) 做游标分页
+        Index('ix_messages_channel_history', 'channel', 'is_deleted', 'send_time', 'id'),
+    )
+
+class Blob(Base):
+    """内容寻址存储的文件实体，多个文件记录/消息可共享同一个blob"""
+    __tablename__ = 'blobs'
+    
+    sha256 = Column(String(64), primary_key=True)
+    file_size = Column(Integer, nullable=False)
+    crc32 = Column(Integer, nullable=True)  # 打包下载时ZIP条目需要的CRC-32
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+
+class Channel(Base):
+    """频道列表与统计，计数和大小只包含未删除的记录，见 channels.ChannelStore"""
+    __tablename__ = 'channels'
+    
+    name = Column(String(50), primary_key=True)
+    created_at = Column(DateTime, default=datetime.now)
+    file_count = Column(Integer, nullable=False, default=0)
+    message_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, default=0)  # 传输文件和聊天文件的总大小
+    last_activity = Column(DateTime, nullable=True)  # 最近一次上传文件或发送消息的时间
+
+class SyncEvent(Base):
+    """多进程部署时共享的频道变更事件，见 cluster.SharedEventLog"""
+    __tablename__ = 'sync_events'
+    
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(50), nullable=False)
+    seq = Column(Integer, nullable=False)  # 频道内递增的序号
+    event = Column(String(50), nullable=False)
+    data = Column(Text, nullable=False)  # 事件数据（JSON）
+
+    __table_args__ = (
+        Index('ix_sync_events_channel_seq', 'channel', 'seq', unique=True),
+    )
+
+class SyncState(Base):
+    """全局状态（事件同步的epoch、频道列表版本等）"""
+    __tablename__ = 'sync_state'
+    
+    key = Column(String(50), primary_key=True)
+    value = Column(Text)
+
+# 每个连接建立时执行的PRAGMA，create_sqlite_engine 的 pragmas 参数可以覆盖其中的项
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # 读写互不阻塞，多个工作进程可以同时读取
+    'synchronous': 'NORMAL',  # WAL模式下只在检查点时同步磁盘，断电可能丢失最近的提交，但不会损坏数据库
+    'busy_timeout': 30000,  # 其他连接持有写锁时最多等待的毫秒数，而不是立即报 database is locked
+    'cache_size': -16384,  # 每个连接的页缓存，负数表示KiB
+    'mmap_size': 256 * 1024 * 1024,  # 通过内存映射读取数据库文件，减少读取时的复制
+    'temp_store': 'MEMORY'  # 排序和临时索引放在内存中
+}
+
+def configure_connection(pragmas, immediate=False):
+    """返回连接建立时设置 PRAGMA 的事件处理函数"""
+    def connect(dbapi_connection, connection_record):
+        if immediate:
+            # 由 begin 事件自行开始事务，pysqlite 不再隐式 BEGIN，SAVEPOINT 才能正常工作
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return connect
+
+def begin_immediate(conn):
+    """事务开始时就取得写锁，读取之后再写入时不会因为快照过期而失败"""
+    conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+def create_sqlite_engine(url, pragmas=None, immediate=False, **kwargs):
+    """创建SQLite引擎并在每个连接上设置 PRAGMA
+
+    immediate 为真时每个事务以 BEGIN IMMEDIATE 开始，并且可以使用 SAVEPOINT，
+    用于单独的写线程（见 dbwriter.WriteQueue）。
+    """
+    pragmas = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+    engine = create_engine(url, connect_args={'timeout': pragmas['busy_timeout'] / 1000}, **kwargs)
+    event.listen(engine, 'connect', configure_connection(pragmas, immediate))
+    if immediate:
+        event.listen(engine, 'begin', begin_immediate)
+    return engine
+
+def init_db(database_path, pragmas=None, pool_size=5, max_overflow=10):
+    """初始化数据库
+
+    请求线程从连接池中取得连接，pool_size 为保持打开的连接数（连接保留页缓存和内存映射），
+    max_overflow 为并发较多时额外打开的连接数上限。
+    """
     os.makedirs(os.path.dirname(database_path), exist_ok=True)
-    engine = create_engine(f'sqlite:///{database_path}')
-    Base.metadata.create_all(engine)
+    engine = create_sqlite_engine(
+        f'sqlite:///{database_path}',
+        pragmas=pragmas,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow
+    )
+    # 工作进程同时启动时串行执行建表和升级
+    with file_lock(f'{database_path}.lock'):
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
     return engine, sessionmaker(bind=engine)
\ No newline at end of file
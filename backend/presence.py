@@ -0,0 +1,126 @@
+"""
+WebSocket 频道订阅关系与在线人数
+
+记录每个连接订阅了哪些频道、每个频道有哪些连接，
+在线人数直接取集合大小，不需要遍历全部连接。
+多进程部署时还记录其他进程上报的各频道人数（见 cluster.py），在线人数取合计。
+"""
+
+import time
+import threading
+
+# 频道名称最大长度，与频道API的限制一致
+MAX_CHANNEL_LENGTH = 50
+
+
+def normalize_channel(data):
+    """从 join_channel/leave_channel 事件数据中取出频道名，无效时返回None"""
+    channel = data.get('channel') if isinstance(data, dict) else data
+    if not isinstance(channel, str):
+        return None
+    channel = channel.strip()
+    if not channel or len(channel) > MAX_CHANNEL_LENGTH:
+        return None
+    return channel
+
+
+class ChannelRegistry:
+    """连接与频道的双向索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}  # 频道 -> 连接sid集合
+        self._sessions = {}  # 连接sid -> 频道集合
+        self._remote = {}  # 其他进程ID -> (最后上报时间, {频道: 人数})
+
+    def join(self, sid, channel):
+        """加入频道，返回在线人数是否发生变化"""
+        with self._lock:
+            members = self._channels.setdefault(channel, set())
+            if sid in members:
+                return False
+            members.add(sid)
+            self._sessions.setdefault(sid, set()).add(channel)
+            return True
+
+    def leave(self, sid, channel):
+        """退出频道，返回在线人数是否发生变化"""
+        with self._lock:
+            members = self._channels.get(channel)
+            if not members or sid not in members:
+                return False
+            members.discard(sid)
+            if not members:
+                del self._channels[channel]
+            channels = self._sessions.get(sid)
+            if channels is not None:
+                channels.discard(channel)
+                if not channels:
+                    del self._sessions[sid]
+            return True
+
+    def disconnect(self, sid):
+        """连接断开时退出所有频道，返回受影响的频道列表"""
+        with self._lock:
+            channels = self._sessions.pop(sid, set())
+            for channel in channels:
+                members = self._channels.get(channel)
+                if members is not None:
+                    members.discard(sid)
+                    if not members:
+                        del self._channels[channel]
+            return sorted(channels)
+
+    def channels_of(self, sid):
+        with self._lock:
+            return set(self._sessions.get(sid, ()))
+
+    def count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ())) + sum(
+                counts.get(channel, 0) for _, counts in self._remote.values()
+            )
+
+    def counts(self):
+        """所有有在线连接的频道及人数"""
+        with self._lock:
+            result = {channel: len(members) for channel, members in self._channels.items()}
+            for _, counts in self._remote.values():
+                for channel, count in counts.items():
+                    result[channel] = result.get(channel, 0) + count
+            return result
+
+    def local_counts(self, channels=None):
+        """本进程的连接在各频道的人数（默认所有频道）"""
+        with self._lock:
+            if channels is None:
+                return {channel: len(members) for channel, members in self._channels.items()}
+            return {channel: len(self._channels.get(channel, ())) for channel in channels}
+
+    def update_remote(self, host_id, counts, replace=False):
+        """记录其他进程上报的人数，replace 表示 counts 包含该进程的全部频道；返回人数有变化的频道"""
+        with self._lock:
+            _, previous = self._remote.get(host_id, (0, {}))
+            merged = dict(counts) if replace else dict(previous, **counts)
+            merged = {channel: count for channel, count in merged.items() if count}
+            self._remote[host_id] = (time.monotonic(), merged)
+            return {
+                channel for channel in set(previous) | set(merged)
+                if previous.get(channel, 0) != merged.get(channel, 0)
+            }
+
+    def expire_remote(self, max_age):
+        """移除超过 max_age 秒没有上报的进程（已退出），返回受影响的频道"""
+        deadline = time.monotonic() - max_age
+        changed = set()
+        with self._lock:
+            for host_id, (updated_at, counts) in list(self._remote.items()):
+                if updated_at < deadline:
+                    del self._remote[host_id]
+                    changed.update(counts)
+        return changed
+
+    def total(self):
+        """已订阅频道的连接数"""
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,287 @@
+"""
+文件区间传输与条件请求（RFC 7232 / RFC 7233）
+
+所有文件下载、预览接口统一通过 serve_file() 返回，打包下载等
+动态生成的内容通过 serve_content() 复用同一套逻辑：
+  - 单区间、后缀区间（bytes=-N）、多区间（multipart/byteranges）
+  - If-Range / If-Match / If-None-Match / If-Modified-Since 条件请求
+  - 无法满足的区间返回 416
+ETag 使用不可变的存储名（内容哈希或带UUID的文件名），属于强校验器。
+
+区间响应优先交给 WSGI 服务器的 wsgi.file_wrapper，由服务器调用
+os.sendfile 在内核中完成拷贝；服务器不支持时退回到按对齐大块读取。
+"""
+
+import os
+import uuid
+import unicodedata
+from urllib.parse import quote
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+# 回退路径每次读取的大小，读取位置按 ALIGNMENT 对齐
+READ_BUFFER_SIZE = 1024 * 1024
+ALIGNMENT = 64 * 1024
+
+# 单个请求最多接受的区间数，超过时忽略Range返回整个文件
+MAX_RANGES = 32
+
+# 已知会按 Content-Length 截断 wsgi.file_wrapper 输出并使用 sendfile 的服务器
+SENDFILE_SERVERS = ('gunicorn',)
+
+
+def iter_file_range(path, start, length, buffer_size=READ_BUFFER_SIZE):
+    """按对齐的大块读取文件中的 [start, start + length) 区间"""
+    with open(path, 'rb', buffering=0) as f:
+        f.seek(start)
+        remaining = length
+        # 第一块只读到对齐边界，之后每次读取都从对齐位置开始
+        read_size = min(remaining, buffer_size - (start % ALIGNMENT))
+        while remaining > 0:
+            data = f.read(read_size)
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+            read_size = min(remaining, buffer_size)
+
+
+def supports_sendfile(environ):
+    """当前WSGI服务器能否安全地用 file_wrapper 发送文件区间"""
+    if not environ.get('wsgi.file_wrapper'):
+        return False
+    server = environ.get('SERVER_SOFTWARE', '').lower()
+    return server.startswith(SENDFILE_SERVERS)
+
+
+def file_range_body(path, start, length, environ=None):
+    """生成文件区间的响应体，返回 (body, 是否为服务器file_wrapper)"""
+    environ = environ if environ is not None else request.environ
+
+    if supports_sendfile(environ):
+        f = open(path, 'rb')
+        try:
+            f.seek(start)
+            # 服务器从当前偏移量开始 sendfile，发送 Content-Length 个字节后停止
+            return environ['wsgi.file_wrapper'](f, READ_BUFFER_SIZE), True
+        except Exception:
+            f.close()
+            raise
+
+    return iter_file_range(path, start, length), False
+
+
+def _is_number(value):
+    """只由ASCII数字组成（str.isdigit 对 '²' 等字符也返回True，但 int() 无法转换）"""
+    return value.isascii() and value.isdigit()
+
+
+def parse_range_header(value, file_size):
+    """解析Range请求头，返回闭区间列表 [(start, end), ...]
+
+    请求头不存在或语法无效时返回 None（应忽略Range），
+    所有区间都无法满足时返回空列表（应返回416）。
+    """
+    if not value:
+        return None
+    units, _, spec = value.partition('=')
+    if units.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    parts = [part.strip() for part in spec.split(',') if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        start_str, sep, end_str = part.partition('-')
+        start_str, end_str = start_str.strip(), end_str.strip()
+        if not sep:
+            return None
+
+        if not start_str:
+            # 后缀区间：最后N个字节
+            if not _is_number(end_str):
+                return None
+            suffix_length = int(end_str)
+            if suffix_length == 0 or file_size == 0:
+                continue
+            ranges.append((max(0, file_size - suffix_length), file_size - 1))
+            continue
+
+        if not _is_number(start_str) or (end_str and not _is_number(end_str)):
+            return None
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+        if end_str and end < start:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+
+    return coalesce_ranges(ranges) if len(ranges) > 1 else ranges
+
+
+def coalesce_ranges(ranges):
+    """合并重叠或相邻的区间"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def make_etag(file_path, file_hash=None):
+    """由不可变的存储名生成强ETag"""
+    return file_hash or os.path.basename(file_path)
+
+
+def _if_range_matches(if_range, etag, last_modified):
+    """If-Range 校验通过时才处理Range，否则返回整个文件"""
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == quote_etag(etag)
+    if if_range.startswith('W/'):
+        return False
+    date = parse_date(if_range)
+    return date is not None and int(date.timestamp()) == int(last_modified)
+
+
+def _not_modified(etag, last_modified):
+    """按 RFC 7232 的顺序计算条件请求结果，返回 304/412 或 None"""
+    if_match = request.headers.get('If-Match')
+    if if_match:
+        etags = parse_etags(if_match)
+        if not etags.is_strong(etag) and not etags.star_tag:
+            return 412
+    else:
+        since = parse_date(request.headers.get('If-Unmodified-Since'))
+        if since is not None and int(last_modified) > since.timestamp():
+            return 412
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if etags.contains_weak(etag):
+            return 304 if request.method in ('GET', 'HEAD') else 412
+    elif request.method in ('GET', 'HEAD'):
+        since = parse_date(request.headers.get('If-Modified-Since'))
+        if since is not None and int(last_modified) <= since.timestamp():
+            return 304
+    return None
+
+
+def _multipart_body(iter_range, ranges, boundary, part_headers):
+    for (start, end), header in zip(ranges, part_headers):
+        yield header
+        yield from iter_range(start, end - start + 1)
+    yield f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+
+def serve_file(path, mimetype=None, download_name=None, as_attachment=False,
+               etag=None, max_age=3600, file_size=None, headers=None):
+    """返回支持区间与条件请求的文件响应"""
+    stat = os.stat(path)
+    return serve_content(
+        stat.st_size if file_size is None else file_size,
+        lambda start, length: iter_file_range(path, start, length),
+        etag=etag or make_etag(path),
+        last_modified=stat.st_mtime,
+        mimetype=mimetype,
+        download_name=download_name,
+        as_attachment=as_attachment,
+        max_age=max_age,
+        headers=headers,
+        body=lambda start, length: file_range_body(path, start, length)[0]
+    )
+
+
+def serve_content(content_size, iter_range, etag, last_modified, mimetype=None,
+                  download_name=None, as_attachment=False, max_age=3600,
+                  headers=None, body=None):
+    """返回支持区间与条件请求的响应
+
+    iter_range(start, length) 生成指定区间的数据；body(start, length) 可选，
+    用于单区间/整体响应（例如交给服务器 sendfile 的文件对象）。
+    """
+    mimetype = mimetype or 'application/octet-stream'
+    body = body or iter_range
+
+    base_headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': f'public, max-age={max_age}' if max_age else 'no-cache',
+    }
+    base_headers.update(headers or {})
+
+    def build(response_body, status, content_length, content_type=mimetype):
+        response = Response(response_body, status=status, content_type=content_type, direct_passthrough=True)
+        for key, value in base_headers.items():
+            response.headers[key] = value
+        if content_length is not None:
+            response.headers['Content-Length'] = str(content_length)
+        if download_name:
+            _set_content_disposition(response, download_name, as_attachment)
+        return response
+
+    status = _not_modified(etag, last_modified)
+    if status is not None:
+        return build([], status, None if status == 304 else 0)
+
+    ranges = None
+    range_header = request.headers.get('Range')
+    if range_header and request.method in ('GET', 'HEAD'):
+        if_range = request.headers.get('If-Range')
+        if not if_range or _if_range_matches(if_range, etag, last_modified):
+            ranges = parse_range_header(range_header, content_size)
+
+    head_only = request.method == 'HEAD'
+
+    if ranges is None:
+        return build([] if head_only else body(0, content_size), 200, content_size)
+
+    if not ranges:
+        response = build([], 416, 0)
+        response.headers['Content-Range'] = f'bytes */{content_size}'
+        return response
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        response = build([] if head_only else body(start, length), 206, length)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{content_size}'
+        return response
+
+    # 多区间：multipart/byteranges，长度可以预先算出
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (f'\r\n--{boundary}\r\n'
+         f'Content-Type: {mimetype}\r\n'
+         f'Content-Range: bytes {start}-{end}/{content_size}\r\n\r\n').encode('latin-1')
+        for start, end in ranges
+    ]
+    content_length = (
+        sum(len(header) for header in part_headers)
+        + sum(end - start + 1 for start, end in ranges)
+        + len(f'\r\n--{boundary}--\r\n')
+    )
+    response_body = [] if head_only else _multipart_body(iter_range, ranges, boundary, part_headers)
+    return build(response_body, 206, content_length, f'multipart/byteranges; boundary={boundary}')
+
+
+def _set_content_disposition(response, download_name, as_attachment):
+    """与 Flask send_file 相同的 Content-Disposition 处理，支持中文文件名"""
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name)
+        simple = simple.encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        response.headers.set('Content-Disposition', disposition, filename=simple, **{'filename*': f"UTF-8''{quoted}"})
+    else:
+        response.headers.set('Content-Disposition', disposition, filename=download_name)
@@ -0,0 +1,206 @@
+"""
+过期文件清理
+
+传输文件到达过期时间并再保留 grace 秒（AUTO_CLEAN_DAYS）后由后台任务删除：
+  - 即将到期的文件按清理时间保存在最小堆中，只保存 horizon 秒内到期的部分，
+    启动时和时间窗口用完时通过 (is_deleted, expire_time) 索引重新加载
+  - 上传和延期时调用 schedule()，清理时间早于当前等待时间时立即唤醒
+  - 到期的文件每批最多 batch_size 个：在一个事务中标记删除并更新频道统计，
+    再批量释放blob引用，最后由调用方推送 file_deleted 事件（事件推送任务会合并）
+
+延期后堆中的旧条目不需要删除：标记删除时重新检查过期时间，未到期的记录不受影响。
+多进程部署时每个进程各自清理，标记删除的 UPDATE 只会对其中一个进程生效，
+blob 不会被重复释放。
+"""
+
+import os
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import FileRecord
+
+
+class ExpiryReaper:
+    """按过期时间删除传输文件"""
+
+    def __init__(self, Session, blob_store, channel_store, on_deleted=None,
+                 grace=0, batch_size=200, horizon=3600, load_limit=10000):
+        self.Session = Session
+        self.blob_store = blob_store
+        self.channel_store = channel_store
+        # on_deleted(channel, file_ids) 在每批删除完成后按频道调用
+        self.on_deleted = on_deleted
+        self.grace = timedelta(seconds=grace)
+        self.batch_size = batch_size
+        self.horizon = timedelta(seconds=horizon)
+        self.load_limit = load_limit
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._heap = []  # (清理时间, 文件ID)
+        self._loaded_until = None  # 堆中包含此时间之前到期的全部文件
+        self._metrics = {
+            'files_deleted': 0,
+            'bytes_reclaimed': 0,  # 实际删除的磁盘文件大小（仍被其他记录引用的blob不计入）
+            'batches': 0,
+            'last_run': None,
+            'errors': 0
+        }
+
+    def schedule(self, file_id, expire_time):
+        """登记文件的过期时间（上传或延期后调用）"""
+        deadline = expire_time + self.grace
+        with self._lock:
+            if self._loaded_until is None or deadline > self._loaded_until:
+                # 不在当前时间窗口内，重新加载时会从数据库读到
+                return
+            wake = not self._heap or deadline < self._heap[0][0]
+            heapq.heappush(self._heap, (deadline, file_id))
+        if wake:
+            self._wake.set()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics, pending=len(self._heap))
+        if metrics['last_run'] is not None:
+            metrics['last_run'] = metrics['last_run'].isoformat()
+        return metrics
+
+    def _reload(self, now):
+        """从数据库加载 horizon 内需要清理的文件"""
+        until = now + self.horizon
+        session = self.Session()
+        try:
+            rows = session.execute(
+                select(FileRecord.expire_time, FileRecord.id)
+                .where(FileRecord.is_deleted == False, FileRecord.expire_time <= until - self.grace)
+                .order_by(FileRecord.expire_time)
+                .limit(self.load_limit)
+            ).all()
+        finally:
+            session.close()
+
+        heap = [(expire_time + self.grace, file_id) for expire_time, file_id in rows]
+        heapq.heapify(heap)
+        if len(rows) >= self.load_limit:
+            # 积压过多，先清理已加载的部分，之后接着加载
+            until = rows[-1][0] + self.grace
+        with self._lock:
+            self._heap = heap
+            self._loaded_until = until
+
+    def _due(self, now):
+        """取出已到清理时间的文件ID，最多 batch_size 个"""
+        file_ids = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(file_ids) < self.batch_size:
+                file_ids.append(heapq.heappop(self._heap)[1])
+        return file_ids
+
+    def _next_wakeup(self, now):
+        """距离下一次需要处理（清理或重新加载）的秒数"""
+        with self._lock:
+            wakeup = self._loaded_until
+            if self._heap and self._heap[0][0] < wakeup:
+                wakeup = self._heap[0][0]
+        return max((wakeup - now).total_seconds(), 0)
+
+    def reap(self, file_ids, now):
+        """删除一批已过期的文件，返回实际删除的文件数"""
+        files = FileRecord.__table__
+        session = self.Session()
+        try:
+            # 过期时间在加入堆之后可能被延长，以数据库中的值为准
+            rows = session.execute(
+                files.update()
+                .where(
+                    files.c.id.in_(file_ids),
+                    files.c.is_deleted == False,
+                    files.c.expire_time <= now - self.grace
+                )
+                .values(is_deleted=True)
+                .returning(files.c.id, files.c.channel, files.c.file_size, files.c.file_hash, files.c.file_path)
+            ).all()
+            by_channel = {}
+            for row in rows:
+                by_channel.setdefault(row.channel, []).append(row)
+            for channel, channel_rows in by_channel.items():
+                self.channel_store.counts(
+                    session, channel,
+                    files=-len(channel_rows),
+                    size=-sum(row.file_size for row in channel_rows)
+                )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        if not rows:
+            return 0
+
+        reclaimed = 0
+        sizes = {row.file_hash: row.file_size for row in rows if row.file_hash}
+        for sha256 in self.blob_store.release_many(row.file_hash for row in rows if row.file_hash):
+            reclaimed += sizes[sha256]
+        for row in rows:
+            if row.file_hash:
+                continue
+            # 内容寻址存储之前上传的文件直接保存在上传目录中，相对路径基于应用目录
+            path = row.file_path
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+            try:
+                os.remove(path)
+                reclaimed += row.file_size
+            except OSError:
+                pass
+
+        with self._lock:
+            self._metrics['files_deleted'] += len(rows)
+            self._metrics['bytes_reclaimed'] += reclaimed
+            self._metrics['batches'] += 1
+
+        if self.on_deleted is not None:
+            for channel, channel_rows in by_channel.items():
+                self.on_deleted(channel, [row.id for row in channel_rows])
+        return len(rows)
+
+    def run_once(self):
+        """处理所有已到期的文件，返回删除的文件数"""
+        now = datetime.now()
+        if self._loaded_until is None or now >= self._loaded_until:
+            self._reload(now)
+        deleted = 0
+        while True:
+            file_ids = self._due(now)
+            if not file_ids:
+                break
+            deleted += self.reap(file_ids, now)
+        with self._lock:
+            self._metrics['last_run'] = now
+        return deleted
+
+    def run(self):
+        """后台任务：等到下一个文件到期（或有更早的文件加入）时清理"""
+        while True:
+            # 先清除唤醒标记，处理期间加入的更早的文件会让下面的等待立即返回
+            self._wake.clear()
+            try:
+                deleted = self.run_once()
+                if deleted:
+                    print(f"已清理 {deleted} 个过期文件")
+            except Exception as e:
+                print(f"清理过期文件失败: {e}")
+                with self._lock:
+                    self._metrics['errors'] += 1
+                    # 已取出的文件可能没有删除，稍后重新从数据库加载
+                    self._loaded_until = None
+                    self._heap = []
+                time.sleep(60)
+                continue
+            self._wake.wait(self._next_wakeup(datetime.now()))
@@ -0,0 +1,108 @@
+"""
+文件名和聊天消息搜索
+
+全文索引是 SQLite FTS5 的 trigram 分词（迁移 6 创建，由触发器随写入更新）：
+按连续3个字符建立索引，中文文件名不需要分词也能按任意子串查找。
+  - 搜索词按空白分成多个词，全部出现才算匹配（不区分大小写）
+  - 3个字符以上的词通过全文索引查找；更短的词（如两个汉字）trigram 无法索引，
+    在全文索引的结果上用 LIKE 过滤；只有短词时按频道逐行匹配
+  - 结果限定在一个频道内，按记录ID从新到旧排列，游标为上一页最后一条的ID
+
+SQLite 不支持 FTS5 trigram 时迁移不会创建索引，全部改为逐行匹配。
+"""
+
+from sqlalchemy import select, text, literal_column, or_
+from sqlalchemy.sql import table, column
+
+from models import FileRecord, Message
+from listing import FILE_COLUMNS, MESSAGE_COLUMNS, fetch_rows
+
+# trigram 分词能索引的最短词长
+MIN_INDEXED_LENGTH = 3
+
+# 搜索词最多使用的词数
+MAX_TERMS = 8
+
+FILES_FTS = table('files_fts', column('rowid'))
+MESSAGES_FTS = table('messages_fts', column('rowid'))
+
+
+def split_terms(query):
+    """把搜索词按空白拆分并去重，保持原有顺序"""
+    terms = []
+    for term in query.split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """FTS5 查询表达式：每个词作为短语（避免被解析为查询语法），全部出现"""
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def like_pattern(term):
+    """包含 term 的 LIKE 模式，转义通配符"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+class SearchIndex:
+    """在一个频道内按文件名/上传者或消息内容搜索"""
+
+    def __init__(self, Session, engine):
+        self.Session = Session
+        with engine.connect() as conn:
+            names = set(conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE name IN ('files_fts', 'messages_fts')"
+            )).scalars())
+        self.fts = names == {'files_fts', 'messages_fts'}
+
+    def files(self, channel, query, limit, before_id=None):
+        """返回 (FILE_COLUMNS 的行, 是否还有更多)"""
+        return self._search(
+            FileRecord, FILES_FTS, FILE_COLUMNS,
+            [FileRecord.original_filename, FileRecord.uploader_name],
+            channel, query, limit, before_id
+        )
+
+    def messages(self, channel, query, limit, before_id=None):
+        """返回 (MESSAGE_COLUMNS 的行, 是否还有更多)"""
+        return self._search(
+            Message, MESSAGES_FTS, MESSAGE_COLUMNS,
+            [Message.content],
+            channel, query, limit, before_id
+        )
+
+    def _search(self, model, fts_table, columns, searched, channel, query, limit, before_id):
+        terms = split_terms(query)
+        if not terms:
+            return [], False
+        if self.fts:
+            indexed = [term for term in terms if len(term) >= MIN_INDEXED_LENGTH]
+            short = [term for term in terms if len(term) < MIN_INDEXED_LENGTH]
+        else:
+            indexed, short = [], terms
+
+        statement = select(*columns).where(model.channel == channel, model.is_deleted == False)
+        if indexed:
+            # 全文索引按 rowid 倒序给出匹配的记录，取满一页即可停止
+            statement = statement.join(fts_table, fts_table.c.rowid == model.id).where(
+                literal_column(fts_table.name).op('MATCH')(match_expression(indexed))
+            )
+            sort_key = fts_table.c.rowid
+        else:
+            sort_key = model.id
+        for term in short:
+            pattern = like_pattern(term)
+            statement = statement.where(or_(*[col.like(pattern, escape='\\') for col in searched]))
+        if before_id is not None:
+            statement = statement.where(sort_key < before_id)
+        statement = statement.order_by(sort_key.desc()).limit(limit + 1)
+
+        session = self.Session()
+        try:
+            rows = fetch_rows(session, statement)
+        finally:
+            session.close()
+        return rows[:limit], len(rows) > limit
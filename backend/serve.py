@@ -0,0 +1,47 @@
+"""
+启动入口（Docker 镜像使用）: python serve.py
+
+生产环境直接用 gunicorn 替换当前进程，不导入 app.py：导入 app.py 会初始化
+数据库、启动写线程、缩略图进程池和后台任务，而这些在 exec 之后全部作废，
+gunicorn 的工作进程会各自重新导入。开发服务器模式（SERVER_MODE=werkzeug 或
+FLASK_ENV=development）以及没有 gunicorn 的系统上按 python app.py 的方式运行。
+"""
+
+import os
+import sys
+import runpy
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_gunicorn():
+    """用 gunicorn 替换当前进程，配置见 gunicorn.conf.py"""
+    # 不切换工作目录，相对路径的 DATABASE_PATH 等配置保持原来的含义
+    os.execvp(sys.executable, [
+        sys.executable, '-m', 'gunicorn',
+        '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+        '--pythonpath', BACKEND_DIR,
+        'app:app'
+    ])
+
+
+def use_gunicorn():
+    """与 config.py 中 SERVER_MODE 的默认值保持一致"""
+    if os.environ.get('SERVER_MODE', 'gunicorn') != 'gunicorn':
+        return False
+    if os.environ.get('FLASK_ENV') == 'development':
+        return False
+    try:
+        import gunicorn  # noqa: F401  Windows 上不可用
+    except ImportError:
+        print("未安装gunicorn或当前系统不支持，使用开发服务器")
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    if use_gunicorn():
+        print(f"Starting gunicorn on port {os.environ.get('PORT', 7070)}")
+        run_gunicorn()
+    sys.path.insert(0, BACKEND_DIR)
+    runpy.run_path(os.path.join(BACKEND_DIR, 'app.py'), run_name='__main__')
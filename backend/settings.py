@@ -0,0 +1,91 @@
+"""
+settings.json 的内存缓存
+
+每个API请求都要检查是否启用了密码，频道列表等接口也要读取设置。
+SettingsStore 把解析后的设置保存在内存中：
+  - 读取时最多每隔 check_interval 秒检查一次文件的 inode/修改时间/大小，
+    文件被其他工作进程（或手工）修改后才重新解析
+  - 通过 edit() 修改时持有进程间文件锁，先从磁盘读取最新内容，
+    修改后原子写入（临时文件 + rename）并直接更新本进程的缓存
+
+snapshot()/get() 返回的字典在线程之间共享，调用方不能修改。
+"""
+
+import os
+import copy
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from interprocess import file_lock, atomic_write_json
+
+
+class SettingsStore:
+    """settings.json 的读取缓存与加锁修改"""
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._settings = None
+        self._signature = None  # 缓存内容对应的 (inode, 修改时间, 大小)
+        self._checked_at = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        """从磁盘读取设置，返回 (签名, 设置)；文件不存在时返回空设置"""
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return None, {}
+        with f:
+            # 签名取自已打开的文件，读取期间文件被替换也不会把旧内容当成新版本缓存
+            st = os.fstat(f.fileno())
+            settings = json.load(f)
+        if not isinstance(settings, dict):
+            settings = {}
+        return (st.st_ino, st.st_mtime_ns, st.st_size), settings
+
+    def snapshot(self):
+        """返回当前设置（只读）"""
+        now = time.monotonic()
+        settings = self._settings
+        if settings is not None and now - self._checked_at < self.check_interval:
+            return settings
+        with self._lock:
+            if self._settings is None or now - self._checked_at >= self.check_interval:
+                signature = self._stat()
+                if self._settings is None or signature != self._signature:
+                    self._signature, self._settings = self._load()
+                self._checked_at = now
+            return self._settings
+
+    def get(self, key, default=None):
+        return self.snapshot().get(key, default)
+
+    @contextmanager
+    def edit(self):
+        """修改设置：返回最新设置的副本，正常退出且内容有变化时原子写回
+
+        with 块内提前 return（如参数校验失败）且未修改副本时不会写文件；
+        抛出异常时放弃修改。
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with file_lock(f'{self.path}.lock'):
+            signature, settings = self._load()
+            draft = copy.deepcopy(settings)
+            yield draft
+            if draft != settings:
+                atomic_write_json(self.path, draft, indent=2)
+                signature = self._stat()
+            with self._lock:
+                self._signature = signature
+                self._settings = draft
+                self._checked_at = time.monotonic()
@@ -0,0 +1,157 @@
+"""
+秒传预检查（/api/files/precheck）：服务端抽样 challenge 与令牌往返
+
+运行: python -m pytest backend/tests
+"""
+
+import io
+import os
+import sys
+import hashlib
+import importlib
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import TokenSigner
+from blobstore import SAMPLE_COUNT, SAMPLE_LENGTH, choose_samples, sample_key, verify_samples
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def answer(content, samples):
+    """客户端按 challenge 中的位置计算抽样块哈希"""
+    return [dict(s, sha256=digest(content[s['offset']:s['offset'] + s['length']])) for s in samples]
+
+
+def test_choose_samples():
+    assert choose_samples(0) == []
+    assert choose_samples(100) == [{'offset': 0, 'length': 100}]
+    assert choose_samples(SAMPLE_LENGTH * SAMPLE_COUNT) == [{'offset': 0, 'length': SAMPLE_LENGTH * SAMPLE_COUNT}]
+
+    size = SAMPLE_LENGTH * SAMPLE_COUNT + 1
+    for _ in range(50):
+        samples = choose_samples(size)
+        assert len(samples) == SAMPLE_COUNT
+        assert [s['offset'] for s in samples] == sorted(s['offset'] for s in samples)
+        assert all(0 <= s['offset'] and s['offset'] + s['length'] <= size for s in samples)
+
+
+def test_verify_samples(tmp_path):
+    content = os.urandom(SAMPLE_LENGTH * SAMPLE_COUNT + 5000)
+    path = tmp_path / 'blob'
+    path.write_bytes(content)
+
+    samples = answer(content, choose_samples(len(content)))
+    assert verify_samples(str(path), samples)
+    assert not verify_samples(str(path), [dict(samples[0], sha256='0' * 64)])
+    assert not verify_samples(str(path), [{'offset': len(content) - 1, 'length': 2, 'sha256': digest(content[-1:])}])
+    assert not verify_samples(str(path), [{'offset': 0, 'length': 0, 'sha256': digest(b'')}])
+
+
+def test_token_round_trip():
+    signer = TokenSigner('secret', ttl=60)
+    file_hash = digest(b'x')
+    samples = [{'offset': 10, 'length': 20}, {'offset': 100, 'length': 20}]
+    token = signer.issue(sample_key(file_hash, 1000, samples))
+
+    # 客户端回传的抽样带有 sha256 字段，不影响令牌绑定的内容
+    assert signer.verify(token, sample_key(file_hash, 1000, answer(bytes(1000), samples)))
+    assert not signer.verify(token, sample_key(file_hash, 1001, samples))
+    assert not signer.verify(token, sample_key(digest(b'y'), 1000, samples))
+    assert not signer.verify(token, sample_key(file_hash, 1000, [dict(samples[0], offset=11), samples[1]]))
+    assert not signer.verify(token, sample_key(file_hash, 1000, samples[:1]))
+    assert not signer.verify(token[:-2] + 'xx', sample_key(file_hash, 1000, samples))
+    assert not TokenSigner('other', ttl=60).verify(token, sample_key(file_hash, 1000, samples))
+    assert not TokenSigner('secret', ttl=-1).verify(
+        TokenSigner('secret', ttl=-1).issue(sample_key(file_hash, 1000, samples)),
+        sample_key(file_hash, 1000, samples)
+    )
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # app.py 在导入时读取配置并初始化数据库，必须先设置好环境变量
+    root = tmp_path_factory.mktemp('lanshare')
+    env = {
+        'DATABASE_PATH': str(root / 'lanshare.db'),
+        'UPLOAD_FOLDER': str(root / 'uploads'),
+        'THUMBNAIL_WORKERS': '0',
+        'SECRET_KEY': 'precheck-test',  # 不在 backend/data 中生成 secret.key
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        app_module = importlib.import_module('app')
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    if app_module.app.config['DATABASE_PATH'] != env['DATABASE_PATH']:
+        pytest.skip('app 已经以其他配置导入')
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='module')
+def uploaded(client):
+    content = os.urandom(SAMPLE_LENGTH * SAMPLE_COUNT + 12345)
+    response = client.post('/api/files/upload', data={'file': (io.BytesIO(content), 'a.bin'), 'channel': 'precheck'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return content, {'filename': 'b.bin', 'sha256': digest(content), 'size': len(content), 'channel': 'precheck'}
+
+
+def test_unknown_content(client):
+    response = client.post('/api/files/precheck', json={'filename': 'c.bin', 'sha256': digest(b'none'), 'size': 4})
+    assert response.get_json() == {'exists': False}
+
+
+def test_challenge_round_trip(client, uploaded):
+    content, request = uploaded
+
+    first = client.post('/api/files/precheck', json=request).get_json()
+    assert first['exists'] is False
+    challenge = first['challenge']
+    assert len(challenge['samples']) == SAMPLE_COUNT
+
+    response = client.post('/api/files/precheck', json=dict(
+        request, challenge=challenge['token'], samples=answer(content, challenge['samples'])
+    ))
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['exists'] is True
+    assert result['filename'] == 'b.bin'
+
+
+def test_client_chosen_samples_are_not_accepted(client, uploaded):
+    content, request = uploaded
+    own = answer(content, [{'offset': 0, 'length': 10}])
+    result = client.post('/api/files/precheck', json=dict(request, samples=own)).get_json()
+    assert result['exists'] is False
+    assert 'challenge' in result
+
+
+def test_challenge_rejects_wrong_answers(client, uploaded):
+    content, request = uploaded
+    challenge = client.post('/api/files/precheck', json=request).get_json()['challenge']
+    good = answer(content, challenge['samples'])
+
+    wrong_hash = [dict(s, sha256='0' * 64) for s in good]
+    response = client.post('/api/files/precheck', json=dict(request, challenge=challenge['token'], samples=wrong_hash))
+    assert response.status_code == 409
+
+    moved = answer(content, [dict(s, offset=s['offset'] + 1) for s in challenge['samples']])
+    result = client.post('/api/files/precheck', json=dict(request, challenge=challenge['token'], samples=moved)).get_json()
+    assert result['exists'] is False
+
+    tampered = challenge['token'][:-2] + 'xx'
+    result = client.post('/api/files/precheck', json=dict(request, challenge=tampered, samples=good)).get_json()
+    assert result['exists'] is False
+
+    response = client.post('/api/files/precheck', json=dict(request, challenge=challenge['token'], samples=[{'x': 1}]))
+    assert response.status_code == 400
@@ -0,0 +1,26 @@
+"""
+热点查询的执行计划：每个查询都应使用预期的索引（见 benchmarks/explain_queries.py）
+
+运行: python -m pytest backend/tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from explain_queries import check_plans, problems
+
+RESULTS = check_plans(2000)
+
+
+@pytest.mark.parametrize('name, plan, found', RESULTS, ids=[name for name, _, _ in RESULTS])
+def test_query_uses_expected_index(name, plan, found):
+    assert not found, '\n'.join(plan + found)
+
+
+def test_missing_index_is_reported():
+    plan = ['SCAN files']
+    assert problems(plan, 'ix_files_channel_listing') == ['SCAN files', '没有使用 ix_files_channel_listing']
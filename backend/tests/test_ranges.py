@@ -0,0 +1,151 @@
+"""
+区间请求与条件请求（ranges.py）：单区间、后缀区间、多区间、304、412、416
+
+运行: python -m pytest backend/tests
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranges import parse_range_header, serve_file
+
+CONTENT = bytes(range(256)) * 40  # 10240 字节
+ETAG = 'abc123'
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', [(0, 99)]),
+    ('bytes=100-', [(100, 10239)]),
+    ('bytes=10000-20000', [(10000, 10239)]),
+    ('bytes=-100', [(10140, 10239)]),
+    ('bytes=-20000', [(0, 10239)]),
+    ('bytes=0-9, 20-29', [(0, 9), (20, 29)]),
+    ('bytes=0-9,10-19,5-12', [(0, 19)]),
+    ('bytes=20000-', []),
+    ('bytes=-0', []),
+    ('bytes=5-1', None),
+    ('bytes=abc', None),
+    ('bytes=²-5', None),
+    ('bytes=0-²', None),
+    ('items=0-9', None),
+    ('bytes=' + ','.join(['0-0'] * 33), None),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, len(CONTENT)) == expected
+
+
+def test_parse_range_header_empty_file():
+    assert parse_range_header('bytes=-10', 0) == []
+    assert parse_range_header('bytes=0-', 0) == []
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(CONTENT)
+    os.utime(path, (1700000000, 1700000000))
+
+    app = Flask(__name__)
+
+    @app.route('/file', methods=['GET', 'HEAD', 'PUT'])
+    def download():
+        return serve_file(str(path), mimetype='application/octet-stream', etag=ETAG)
+
+    return app.test_client()
+
+
+def body(response):
+    return b''.join(response.response)
+
+
+def test_full_response(client):
+    response = client.get('/file')
+    assert response.status_code == 200
+    assert body(response) == CONTENT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == f'"{ETAG}"'
+
+
+def test_single_range(client):
+    response = client.get('/file', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+    assert response.headers['Content-Length'] == '100'
+    assert body(response) == CONTENT[100:200]
+
+
+def test_suffix_range(client):
+    response = client.get('/file', headers={'Range': 'bytes=-50'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes {len(CONTENT) - 50}-{len(CONTENT) - 1}/{len(CONTENT)}'
+    assert body(response) == CONTENT[-50:]
+
+
+def test_multipart_ranges(client):
+    response = client.get('/file', headers={'Range': 'bytes=0-9, 5000-5019'})
+    assert response.status_code == 206
+    content_type = response.headers['Content-Type']
+    assert content_type.startswith('multipart/byteranges; boundary=')
+    boundary = content_type.split('boundary=')[1]
+
+    data = body(response)
+    assert int(response.headers['Content-Length']) == len(data)
+    parts = data.split(f'--{boundary}'.encode())
+    assert parts[-1] == b'--\r\n'
+    parts = parts[1:-1]
+    assert len(parts) == 2
+    for part, (start, end) in zip(parts, [(0, 9), (5000, 5019)]):
+        head, _, payload = part.partition(b'\r\n\r\n')
+        assert f'Content-Range: bytes {start}-{end}/{len(CONTENT)}'.encode() in head
+        assert payload[:-2] == CONTENT[start:end + 1]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get('/file', headers={'Range': f'bytes={len(CONTENT)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+
+def test_invalid_range_is_ignored(client):
+    response = client.get('/file', headers={'Range': 'bytes=²-5'})
+    assert response.status_code == 200
+    assert body(response) == CONTENT
+
+
+def test_if_none_match(client):
+    response = client.get('/file', headers={'If-None-Match': f'"{ETAG}"'})
+    assert response.status_code == 304
+    assert body(response) == b''
+
+    assert client.get('/file', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_if_modified_since(client):
+    assert client.get('/file', headers={'If-Modified-Since': http_date(1700000000)}).status_code == 304
+    assert client.get('/file', headers={'If-Modified-Since': http_date(1600000000)}).status_code == 200
+
+
+def test_if_match_fails(client):
+    assert client.get('/file', headers={'If-Match': '"other"'}).status_code == 412
+    assert client.get('/file', headers={'If-Match': f'"{ETAG}"'}).status_code == 200
+    assert client.get('/file', headers={'If-Unmodified-Since': http_date(1600000000)}).status_code == 412
+
+
+def test_if_none_match_on_put_is_412(client):
+    assert client.put('/file', headers={'If-None-Match': '*'}).status_code == 412
+
+
+def test_if_range(client):
+    matching = client.get('/file', headers={'Range': 'bytes=0-9', 'If-Range': f'"{ETAG}"'})
+    assert matching.status_code == 206
+
+    stale = client.get('/file', headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert stale.status_code == 200
+    assert body(stale) == CONTENT
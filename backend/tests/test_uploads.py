@@ -0,0 +1,159 @@
+"""
+断点续传会话（uploads.py）：区间合并、缺失区间、续传与完成
+
+运行: python -m pytest backend/tests
+"""
+
+import io
+import os
+import sys
+import uuid
+import hashlib
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uploads import UploadSessionManager, UploadError, merge_ranges, missing_ranges
+
+
+@pytest.mark.parametrize('ranges, start, end, expected', [
+    ([], 0, 10, [[0, 10]]),
+    ([[0, 10]], 20, 30, [[0, 10], [20, 30]]),
+    ([[20, 30]], 0, 10, [[0, 10], [20, 30]]),
+    ([[0, 10]], 10, 20, [[0, 20]]),
+    ([[10, 20]], 0, 10, [[0, 20]]),
+    ([[0, 10], [20, 30]], 10, 20, [[0, 30]]),
+    ([[0, 10], [20, 30], [40, 50]], 5, 45, [[0, 50]]),
+    ([[0, 10], [20, 30]], 12, 18, [[0, 10], [12, 18], [20, 30]]),
+    ([[0, 100]], 20, 30, [[0, 100]]),
+    ([[0, 10], [40, 50]], 60, 70, [[0, 10], [40, 50], [60, 70]]),
+])
+def test_merge_ranges(ranges, start, end, expected):
+    assert merge_ranges(ranges, start, end) == expected
+
+
+@pytest.mark.parametrize('ranges, total_size, expected', [
+    ([], 0, []),
+    ([], 100, [[0, 100]]),
+    ([[0, 100]], 100, []),
+    ([[10, 20]], 100, [[0, 10], [20, 100]]),
+    ([[0, 10], [20, 30]], 30, [[10, 20]]),
+    ([[0, 10], [5, 20]], 30, [[20, 30]]),
+])
+def test_missing_ranges(ranges, total_size, expected):
+    assert missing_ranges(ranges, total_size) == expected
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return UploadSessionManager(str(tmp_path / '.partial'), ttl_seconds=3600, chunk_size=4, max_size=1024)
+
+
+def write(manager, upload_id, offset, data, length=None, sha256=None):
+    return manager.write_chunk(upload_id, offset, io.BytesIO(data), len(data) if length is None else length, sha256)
+
+
+def test_out_of_order_upload_and_finalize(manager, tmp_path):
+    meta = manager.create('a.txt', 10)
+    upload_id = meta['upload_id']
+    assert manager.get(upload_id)['missing'] == [[0, 10]]
+
+    state = write(manager, upload_id, 6, b'ghij')
+    assert state['missing'] == [[0, 6]]
+    assert state['received_bytes'] == 4
+
+    with pytest.raises(UploadError) as e:
+        manager.finalize(upload_id, str(tmp_path / 'out.txt'))
+    assert e.value.status == 409
+
+    state = write(manager, upload_id, 0, b'abcdef')
+    assert state['missing'] == []
+
+    meta = manager.finalize(upload_id, str(tmp_path / 'out.txt'))
+    assert meta['filename'] == 'a.txt'
+    assert (tmp_path / 'out.txt').read_bytes() == b'abcdefghij'
+    assert not os.path.exists(os.path.join(manager.root, upload_id))
+    assert upload_id not in manager._locks
+
+
+def test_interrupted_chunk_is_resumed(manager, tmp_path):
+    upload_id = manager.create('a.txt', 8)['upload_id']
+
+    # 连接中断：声明8字节但只收到3字节
+    with pytest.raises(UploadError) as e:
+        write(manager, upload_id, 0, b'abc', length=8)
+    assert e.value.status == 400
+    assert manager.get(upload_id)['missing'] == [[3, 8]]
+
+    write(manager, upload_id, 3, b'defgh')
+    manager.finalize(upload_id, str(tmp_path / 'out.txt'))
+    assert (tmp_path / 'out.txt').read_bytes() == b'abcdefgh'
+
+
+def test_verified_chunk(manager):
+    upload_id = manager.create('a.txt', 4)['upload_id']
+
+    with pytest.raises(UploadError) as e:
+        write(manager, upload_id, 0, b'abcd', sha256=hashlib.sha256(b'xxxx').hexdigest())
+    assert e.value.status == 422
+    assert manager.get(upload_id)['missing'] == [[0, 4]]
+
+    # 不完整的校验分片整体丢弃
+    with pytest.raises(UploadError):
+        write(manager, upload_id, 0, b'ab', length=4, sha256=hashlib.sha256(b'abcd').hexdigest())
+    assert manager.get(upload_id)['missing'] == [[0, 4]]
+
+    state = write(manager, upload_id, 0, b'abcd', sha256=hashlib.sha256(b'abcd').hexdigest().upper())
+    assert state['missing'] == []
+
+
+def test_chunk_outside_file(manager):
+    upload_id = manager.create('a.txt', 4)['upload_id']
+    with pytest.raises(UploadError) as e:
+        write(manager, upload_id, 2, b'abc')
+    assert e.value.status == 416
+
+
+def test_create_rejects_invalid_sizes(manager):
+    with pytest.raises(UploadError) as e:
+        manager.create('a.txt', -1)
+    assert e.value.status == 400
+
+    with pytest.raises(UploadError) as e:
+        manager.create('a.txt', 1025)
+    assert e.value.status == 413
+
+    unlimited = UploadSessionManager(manager.root, ttl_seconds=3600, chunk_size=4)
+    with pytest.raises(UploadError) as e:
+        unlimited.create('a.txt', 2 ** 62)
+    assert e.value.status == 507
+    assert os.listdir(manager.root) == []
+
+
+def test_unknown_session_does_not_leak_locks(manager, tmp_path):
+    for _ in range(3):
+        with pytest.raises(UploadError) as e:
+            write(manager, str(uuid.uuid4()), 0, b'x')
+        assert e.value.status == 404
+        with pytest.raises(UploadError) as e:
+            manager.finalize(str(uuid.uuid4()), str(tmp_path / 'out'))
+        assert e.value.status == 404
+
+    with pytest.raises(UploadError) as e:
+        manager.get('../../etc')
+    assert e.value.status == 404
+    assert manager._locks == {}
+
+
+def test_discard_and_cleanup(manager):
+    upload_id = manager.create('a.txt', 4)['upload_id']
+    manager.discard(upload_id)
+    with pytest.raises(UploadError) as e:
+        manager.get(upload_id)
+    assert e.value.status == 404
+
+    manager.create('b.txt', 4)
+    manager.ttl_seconds = -1
+    assert manager.cleanup_expired() == 1
+    assert os.listdir(manager.root) == []
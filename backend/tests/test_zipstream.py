@@ -0,0 +1,163 @@
+"""
+流式ZIP打包（zipstream.py）：生成的压缩包用标准库 zipfile 读取校验
+
+运行: python -m pytest backend/tests
+"""
+
+import io
+import os
+import sys
+import zlib
+import random
+import zipfile
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zipstream import ZipArchive, ZipEntry, ZIP64_LIMIT, ZIP_FILECOUNT_LIMIT, archive_name, unique_names
+
+MODIFIED = datetime(2024, 5, 6, 7, 8, 10)
+
+
+class ArchiveReader(io.RawIOBase):
+    """只通过 iter_range 读取压缩包的可定位文件对象，zipfile 的每次读取都检验区间偏移"""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = self.archive.size + offset
+        return self.position
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.archive.size - self.position)
+        if length <= 0:
+            return 0
+        data = b''.join(self.archive.iter_range(self.position, length))
+        assert len(data) == length
+        buffer[:length] = data
+        self.position += length
+        return length
+
+
+def make_entry(tmp_path, name, data):
+    path = tmp_path / f'{len(os.listdir(tmp_path))}.bin'
+    path.write_bytes(data)
+    return ZipEntry(name, str(path), len(data), zlib.crc32(data), MODIFIED)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    files = {
+        'hello.txt': b'hello world\n',
+        '中文名.txt': '你好'.encode('utf-8') * 1000,
+        'empty.bin': b'',
+        'random.bin': random.Random(1).randbytes(300000),
+    }
+    entries = [make_entry(tmp_path, name, data) for name, data in files.items()]
+    return ZipArchive(entries), files
+
+
+def test_zipfile_reads_archive(archive):
+    archive, files = archive
+    data = b''.join(archive.iter_range(0, archive.size))
+    assert len(data) == archive.size
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == list(files)
+        for name, content in files.items():
+            assert zf.read(name) == content
+            info = zf.getinfo(name)
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time == (2024, 5, 6, 7, 8, 10)
+
+
+def test_iter_range_matches_full_archive(archive):
+    archive, _ = archive
+    full = b''.join(archive.iter_range(0, archive.size))
+
+    rng = random.Random(2)
+    for _ in range(200):
+        start = rng.randrange(archive.size)
+        length = rng.randrange(1, archive.size - start + 1)
+        assert b''.join(archive.iter_range(start, length)) == full[start:start + length]
+
+    assert b''.join(archive.iter_range(archive.size - 1, 1)) == full[-1:]
+
+
+def test_zipfile_reads_through_iter_range(archive):
+    archive, files = archive
+    with zipfile.ZipFile(io.BufferedReader(ArchiveReader(archive), 4096)) as zf:
+        for name, content in files.items():
+            assert zf.read(name) == content
+
+
+def test_zip64_large_entry(tmp_path):
+    """超过4GB的条目及其后的偏移量写入ZIP64扩展字段（大文件用稀疏文件，不读取其内容）"""
+    large = tmp_path / 'large.bin'
+    with open(large, 'wb') as f:
+        f.truncate(ZIP64_LIMIT + 1024)
+    small = make_entry(tmp_path, 'after.txt', b'after the large entry')
+    entries = [ZipEntry('large.bin', str(large), ZIP64_LIMIT + 1024, 0, MODIFIED), small]
+    archive = ZipArchive(entries)
+    assert archive.size > ZIP64_LIMIT
+
+    with zipfile.ZipFile(io.BufferedReader(ArchiveReader(archive), 4096)) as zf:
+        large_info, small_info = zf.infolist()
+        assert large_info.file_size == ZIP64_LIMIT + 1024
+        assert small_info.header_offset > ZIP64_LIMIT
+        assert zf.read('after.txt') == b'after the large entry'
+        # 只读开头，校验本地文件头中的ZIP64扩展字段（读到末尾会计算4GB的CRC）
+        with zf.open('large.bin') as f:
+            assert f.read(16) == b'\0' * 16
+
+
+def test_zip64_entry_count(tmp_path):
+    """条目数超过65535时写入ZIP64目录结束记录"""
+    count = ZIP_FILECOUNT_LIMIT + 10
+    entries = [ZipEntry(f'{i}.txt', None, 0, 0, MODIFIED) for i in range(count)]
+    archive = ZipArchive(entries)
+    data = b''.join(archive.iter_range(0, archive.size))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+    assert len(names) == count
+    assert names[-1] == f'{count - 1}.txt'
+
+
+def test_unique_names():
+    assert unique_names(['a.txt', 'A.txt', 'a.txt', 'dir/b.txt', '']) == [
+        'a.txt', 'A (1).txt', 'a (2).txt', 'dir_b.txt', 'file'
+    ]
+
+
+@pytest.mark.parametrize('name, expected', [
+    (None, 'lanshare'),
+    ('', 'lanshare'),
+    ('  照片  ', '照片'),
+    ('a\r\nSet-Cookie: x=1', 'aSet-Cookie: x=1'),
+    ('../../etc/passwd', '_.._etc_passwd'),
+    ('dir\\name', 'dir_name'),
+    ('...', 'lanshare'),
+    ('x' * 500, 'x' * 100),
+])
+def test_archive_name(name, expected):
+    assert archive_name(name) == expected
@@ -0,0 +1,238 @@
+"""
+图片缩略图生成与磁盘缓存
+
+缩略图由独立进程中的 Pillow 生成，避免解码大图时占用Web进程的GIL。
+生成结果保存在 <root>/<键前两位>/<键>-<宽度>.<格式>，键是不可变的存储名
+（内容哈希或带UUID的文件名），所以缓存永远不会过时，只需要按大小做LRU淘汰。
+
+缓存目录由所有Web工作进程共用，总大小记录在 <root>/.size 中，
+在 <root>/.lock 文件锁下更新；超过上限时重新扫描目录，按修改时间淘汰
+（命中时会更新修改时间，不依赖可能被 noatime 关闭的访问时间）。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from interprocess import file_lock
+
+# 允许的缩略图宽度，请求的宽度向上取整到其中之一，避免缓存被任意尺寸撑满
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+
+# 上传后预先生成的宽度（文件列表图标和聊天图片）
+PREGENERATE_WIDTHS = (128, 512)
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+TEMP_SUFFIX = '.tmp'
+
+# 超过这个时间的临时文件视为崩溃遗留，其他进程可能还在写入较新的临时文件
+STALE_TEMP_SECONDS = 600
+
+# 超过上限时淘汰到上限的这个比例，避免每生成一张都重新扫描目录
+EVICT_TARGET_RATIO = 0.9
+
+# 生成失败的图片在这段时间内不再重试（秒），以及最多记住的条数
+FAILURE_TTL = 300
+MAX_FAILURES = 1024
+
+
+def snap_width(width):
+    """把请求的宽度对齐到允许的尺寸"""
+    for allowed in THUMBNAIL_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def render_thumbnail(src_path, dest_path, width, fmt):
+    """在工作进程中生成缩略图，最长边不超过 width"""
+    with Image.open(src_path) as img:
+        # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，大幅减少解码开销
+        img.draft('RGB', (width, width))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, width), Image.LANCZOS)
+
+        if fmt == 'jpeg' and img.mode != 'RGB':
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or 'A' in img.mode else 'RGB')
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        temp_path = f'{dest_path}.{os.getpid()}{TEMP_SUFFIX}'
+        try:
+            img.save(temp_path, FORMATS[fmt][0], quality=80, method=4 if fmt == 'webp' else 0)
+            os.replace(temp_path, dest_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class ThumbnailError(Exception):
+    """缩略图生成失败（最近失败过的图片在 FAILURE_TTL 内直接返回这个错误）"""
+
+
+class ThumbnailCache:
+    """按总大小限制的LRU缩略图缓存，多个进程共用同一目录"""
+
+    def __init__(self, root, max_bytes, workers):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock_path = os.path.join(root, '.lock')
+        self._size_path = os.path.join(root, '.size')
+        self._lock = threading.Lock()
+        # 正在生成的缩略图，同一缩略图的并发请求共享一个任务
+        self._pending = {}
+        # 生成失败的缩略图路径 -> 过期时间，最早记录的在前
+        self._failures = OrderedDict()
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        os.makedirs(root, exist_ok=True)
+        with file_lock(self._lock_path):
+            self._write_total(self._rescan(self.max_bytes))
+
+    def _scan(self):
+        """列出缓存文件 (修改时间, 路径, 大小)，顺便清理崩溃遗留的临时文件"""
+        found = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if dirpath == self.root and name.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(TEMP_SUFFIX):
+                        if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                            os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        return found
+
+    def _rescan(self, limit):
+        """按目录实际内容重新统计，淘汰最久未使用的直到不超过 limit；调用方需持有文件锁"""
+        found = sorted(self._scan())
+        total = sum(size for _, _, size in found)
+        # 至少保留最新的一张，避免刚生成的缩略图立即被删掉
+        for _, path, size in found[:-1]:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+    def _read_total(self):
+        try:
+            with open(self._size_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return None
+
+    def _write_total(self, total):
+        with open(self._size_path, 'w', encoding='utf-8') as f:
+            f.write(str(total))
+
+    def _account(self, size):
+        """把新生成的缩略图计入共享的总大小，超过上限时淘汰"""
+        with file_lock(self._lock_path):
+            total = self._read_total()
+            if total is not None:
+                total += size
+            # 记录丢失或超过上限时以目录实际内容为准（多进程重复生成等造成的偏差也在这里修正）
+            if total is None or total > self.max_bytes:
+                total = self._rescan(int(self.max_bytes * EVICT_TARGET_RATIO))
+            self._write_total(total)
+
+    def thumbnail_path(self, key, width, fmt):
+        return os.path.join(self.root, key[:2], f'{key}-{width}.{fmt}')
+
+    def _cached(self, path):
+        """缩略图已在磁盘上时更新修改时间（LRU顺序）并返回 True"""
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def _failed(self, path):
+        """最近是否生成失败过；调用方需持有锁"""
+        expires = self._failures.get(path)
+        if expires is None:
+            return False
+        if expires > time.monotonic():
+            return True
+        del self._failures[path]
+        return False
+
+    def _submit(self, src_path, path, width, fmt):
+        """提交生成任务，返回 (Future, 是否为新任务)；调用方需持有锁"""
+        future = self._pending.get(path)
+        if future is not None:
+            return future, False
+        future = self._executor.submit(render_thumbnail, src_path, path, width, fmt)
+        self._pending[path] = future
+        return future, True
+
+    def _finish(self, path, future):
+        with self._lock:
+            self._pending.pop(path, None)
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._failures.pop(path, None)
+                self._failures[path] = time.monotonic() + FAILURE_TTL
+                while len(self._failures) > MAX_FAILURES:
+                    self._failures.popitem(last=False)
+                return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        try:
+            self._account(size)
+        except OSError as e:
+            print(f"更新缩略图缓存大小失败: {e}")
+
+    def get(self, src_path, key, width, fmt, timeout=None):
+        """返回缩略图路径，缓存中没有时生成并等待完成"""
+        path = self.thumbnail_path(key, width, fmt)
+        if self._cached(path):
+            return path
+        with self._lock:
+            if self._failed(path):
+                raise ThumbnailError('缩略图生成失败')
+            future, created = self._submit(src_path, path, width, fmt)
+
+        # 回调可能在当前线程中立即执行，必须在锁外注册
+        if created:
+            future.add_done_callback(lambda f: self._finish(path, f))
+        future.result(timeout)
+        return path
+
+    def schedule(self, src_path, key, widths=PREGENERATE_WIDTHS, fmt='webp'):
+        """后台预先生成缩略图，不等待结果"""
+        for width in widths:
+            path = self.thumbnail_path(key, width, fmt)
+            if os.path.exists(path):
+                continue
+            with self._lock:
+                if self._failed(path):
+                    continue
+                future, created = self._submit(src_path, path, width, fmt)
+            if created:
+                future.add_done_callback(lambda f, path=path: self._finish(path, f))
@@ -0,0 +1,396 @@
+"""
+上传写入与断点续传会话管理
+
+普通表单上传通过 IngestFile 直接写入上传目录，避免先写临时文件再复制。
+
+上传会话保存在 UPLOAD_FOLDER/.partial/<upload_id>/ 目录下：
+  data       预分配的稀疏数据文件，分片按偏移量直接写入
+  meta.json  会话元数据（文件名、总大小、已接收的字节区间等）
+  lock       多个工作进程之间的锁文件
+会话超过 TTL 未更新时由后台任务清理。
+"""
+
+import os
+import json
+import uuid
+import time
+import zlib
+import shutil
+import tempfile
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from interprocess import file_lock
+
+# 每次从请求流中读取的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 正在接收的表单上传文件名前缀
+INCOMING_PREFIX = '.incoming-'
+
+
+class UploadError(Exception):
+    """上传会话错误，status 为对应的HTTP状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def merge_ranges(ranges, start, end):
+    """把半开区间 [start, end) 合并到已排序的区间列表中"""
+    merged = []
+    placed = False
+    for r_start, r_end in ranges:
+        if r_end < start:
+            merged.append([r_start, r_end])
+        elif r_start > end:
+            if not placed:
+                merged.append([start, end])
+                placed = True
+            merged.append([r_start, r_end])
+        else:
+            start = min(start, r_start)
+            end = max(end, r_end)
+    if not placed:
+        merged.append([start, end])
+    return merged
+
+
+def missing_ranges(ranges, total_size):
+    """计算尚未接收的区间"""
+    missing = []
+    cursor = 0
+    for r_start, r_end in ranges:
+        if r_start > cursor:
+            missing.append([cursor, r_start])
+        cursor = max(cursor, r_end)
+    if cursor < total_size:
+        missing.append([cursor, total_size])
+    return missing
+
+
+class IngestFile:
+    """直接写入上传目录的临时文件，写入的同时统计字节数并计算SHA-256和CRC-32
+
+    作为 Werkzeug 表单解析的 stream_factory 返回值使用，上传完成后
+    commit() 只需在同一目录内重命名，不会再复制一遍文件内容。
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{INCOMING_PREFIX}{uuid.uuid4()}')
+        self.size = 0
+        self.committed = False
+        self._hasher = hashlib.sha256()
+        self.crc32 = 0
+        self._file = open(self.path, 'w+b', buffering=COPY_BUFFER_SIZE)
+
+    @property
+    def sha256(self):
+        return self._hasher.hexdigest()
+
+    def write(self, data):
+        self._file.write(data)
+        self._hasher.update(data)
+        self.crc32 = zlib.crc32(data, self.crc32)
+        self.size += len(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def commit(self, dest_path):
+        """把已接收的文件移动到最终路径"""
+        self.close()
+        os.replace(self.path, dest_path)
+        self.path = dest_path
+        self.committed = True
+
+    def discard(self):
+        """删除未提交的临时文件"""
+        self.close()
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def save_upload(file_storage, dest_path):
+    """保存表单上传的文件，返回 (文件大小, SHA-256, CRC-32)"""
+    stream = file_storage.stream
+    if isinstance(stream, IngestFile):
+        stream.commit(dest_path)
+        return stream.size, stream.sha256, stream.crc32
+
+    # 非直写流（例如测试客户端的内存文件），边复制边计算
+    hasher = hashlib.sha256()
+    crc = 0
+    size = 0
+    with open(dest_path, 'wb') as f:
+        while True:
+            buf = stream.read(COPY_BUFFER_SIZE)
+            if not buf:
+                break
+            f.write(buf)
+            hasher.update(buf)
+            crc = zlib.crc32(buf, crc)
+            size += len(buf)
+    return size, hasher.hexdigest(), crc
+
+
+def cleanup_incoming(directory, max_age_seconds):
+    """清理异常中断后遗留的表单上传临时文件"""
+    if not os.path.isdir(directory):
+        return 0
+
+    removed = 0
+    deadline = time.time() - max_age_seconds
+    for name in os.listdir(directory):
+        if not name.startswith(INCOMING_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class UploadSessionManager:
+    """管理磁盘上的断点续传会话"""
+
+    def __init__(self, root, ttl_seconds, chunk_size, max_size=None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.chunk_size = chunk_size
+        # 单个文件的大小上限，None 表示只受磁盘剩余空间限制
+        self.max_size = max_size
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _session_dir(self, upload_id):
+        # upload_id 由服务端生成，这里仍校验格式防止路径穿越
+        try:
+            upload_id = str(uuid.UUID(upload_id))
+        except (ValueError, TypeError):
+            raise UploadError('上传会话不存在', 404)
+        return os.path.join(self.root, upload_id)
+
+    @contextmanager
+    def _lock(self, upload_id):
+        """同一会话的操作互斥：进程内用线程锁，多个工作进程之间用会话目录中的锁文件"""
+        session_dir = self._session_dir(upload_id)
+        # 先确认会话存在，不存在的 upload_id 不会在 _locks 中留下条目
+        if not os.path.isdir(session_dir):
+            raise UploadError('上传会话不存在', 404)
+        with self._locks_guard:
+            lock = self._locks.get(upload_id)
+            if lock is None:
+                lock = self._locks[upload_id] = threading.Lock()
+        with lock:
+            if not os.path.isdir(session_dir):
+                # 等待期间会话已被完成或清理
+                with self._locks_guard:
+                    self._locks.pop(upload_id, None)
+                raise UploadError('上传会话不存在', 404)
+            with file_lock(os.path.join(session_dir, 'lock')):
+                yield
+
+    def _read_meta(self, session_dir):
+        try:
+            with open(os.path.join(session_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('上传会话不存在', 404)
+
+    def _write_meta(self, session_dir, meta):
+        meta_path = os.path.join(session_dir, 'meta.json')
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def create(self, filename, total_size, target='file', chunk_size=None, extra=None):
+        """创建上传会话并预分配数据文件"""
+        if total_size < 0:
+            raise UploadError('文件大小无效')
+        if self.max_size is not None and total_size > self.max_size:
+            raise UploadError('文件大小超过上传限制', 413)
+
+        os.makedirs(self.root, exist_ok=True)
+        # 数据文件是稀疏的，创建时不占空间，这里先拒绝磁盘肯定放不下的文件
+        if total_size > shutil.disk_usage(self.root).free:
+            raise UploadError('磁盘空间不足', 507)
+
+        upload_id = str(uuid.uuid4())
+        session_dir = os.path.join(self.root, upload_id)
+        os.makedirs(session_dir, exist_ok=True)
+
+        # truncate 生成稀疏文件，分片可以按任意顺序写入
+        with open(os.path.join(session_dir, 'data'), 'wb') as f:
+            f.truncate(total_size)
+
+        now = time.time()
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'total_size': total_size,
+            'chunk_size': chunk_size or self.chunk_size,
+            'target': target,
+            'extra': extra or {},
+            'ranges': [],
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._write_meta(session_dir, meta)
+        return meta
+
+    def get(self, upload_id):
+        """读取会话元数据，附带缺失区间"""
+        session_dir = self._session_dir(upload_id)
+        meta = self._read_meta(session_dir)
+        return self._describe(meta)
+
+    def _describe(self, meta):
+        received = sum(end - start for start, end in meta['ranges'])
+        return dict(
+            meta,
+            received_bytes=received,
+            missing=missing_ranges(meta['ranges'], meta['total_size']),
+            expires_at=meta['updated_at'] + self.ttl_seconds,
+        )
+
+    def write_chunk(self, upload_id, offset, stream, length, sha256=None):
+        """把请求流中的一个分片写入到指定偏移量"""
+        session_dir = self._session_dir(upload_id)
+
+        with self._lock(upload_id):
+            meta = self._read_meta(session_dir)
+
+            if length is None or length < 0:
+                raise UploadError('缺少Content-Length', 411)
+            if offset < 0 or offset + length > meta['total_size']:
+                raise UploadError('分片超出文件范围', 416)
+
+            data_path = os.path.join(session_dir, 'data')
+            if sha256:
+                # 带校验值的分片先写入临时文件，校验通过后才写入数据文件，
+                # 校验失败或不完整时已接收的数据保持不变
+                written = self._write_verified(session_dir, data_path, offset, stream, length, sha256)
+            else:
+                written = 0
+                with open(data_path, 'r+b') as f:
+                    f.seek(offset)
+                    while written < length:
+                        buf = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                        if not buf:
+                            break
+                        f.write(buf)
+                        written += len(buf)
+
+            # 连接中断时只记录实际写入的部分，客户端可从缺失位置继续
+            if written:
+                meta['ranges'] = merge_ranges(meta['ranges'], offset, offset + written)
+            meta['updated_at'] = time.time()
+            self._write_meta(session_dir, meta)
+
+            if written < length:
+                raise UploadError('分片数据不完整', 400)
+            return self._describe(meta)
+
+    def _write_verified(self, session_dir, data_path, offset, stream, length, sha256):
+        """接收分片并校验SHA-256，通过后写入数据文件，返回写入的字节数（不完整时为0）"""
+        hasher = hashlib.sha256()
+        received = 0
+        with tempfile.TemporaryFile(dir=session_dir) as staging:
+            while received < length:
+                buf = stream.read(min(COPY_BUFFER_SIZE, length - received))
+                if not buf:
+                    break
+                staging.write(buf)
+                hasher.update(buf)
+                received += len(buf)
+            if received < length:
+                # 不完整的分片无法校验，全部丢弃
+                return 0
+            if hasher.hexdigest() != sha256.lower():
+                raise UploadError('分片校验失败', 422)
+
+            staging.seek(0)
+            with open(data_path, 'r+b') as f:
+                f.seek(offset)
+                shutil.copyfileobj(staging, f, COPY_BUFFER_SIZE)
+        return received
+
+    def finalize(self, upload_id, dest_path):
+        """确认所有区间都已接收，把数据文件移动到最终位置"""
+        session_dir = self._session_dir(upload_id)
+
+        with self._lock(upload_id):
+            meta = self._read_meta(session_dir)
+            if missing_ranges(meta['ranges'], meta['total_size']):
+                raise UploadError('文件尚未上传完整', 409)
+
+            os.replace(os.path.join(session_dir, 'data'), dest_path)
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+        return meta
+
+    def discard(self, upload_id):
+        """取消上传会话"""
+        session_dir = self._session_dir(upload_id)
+        if not os.path.isdir(session_dir):
+            raise UploadError('上传会话不存在', 404)
+        with self._lock(upload_id):
+            shutil.rmtree(session_dir, ignore_errors=True)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def cleanup_expired(self):
+        """删除超过TTL未更新的会话，返回清理的会话数"""
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        deadline = time.time() - self.ttl_seconds
+        for upload_id in os.listdir(self.root):
+            session_dir = os.path.join(self.root, upload_id)
+            try:
+                meta_path = os.path.join(session_dir, 'meta.json')
+                updated_at = os.path.getmtime(meta_path if os.path.exists(meta_path) else session_dir)
+            except OSError:
+                continue
+            if updated_at < deadline:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                with self._locks_guard:
+                    self._locks.pop(upload_id, None)
+                removed += 1
+        return removed
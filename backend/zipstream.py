@@ -0,0 +1,158 @@
+"""
+流式ZIP打包（STORE模式，支持ZIP64）
+
+所有条目不压缩，文件大小和CRC-32事先已知，因此整个压缩包的布局在
+发送前就能确定：Content-Length 可以预先算出，任意字节区间都能直接
+定位到对应的头部或文件内容，支持断点续传。压缩包不会在内存或磁盘上生成。
+"""
+
+import os
+import struct
+import bisect
+import unicodedata
+
+from ranges import iter_file_range
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+# 通用标志位：第11位表示文件名使用UTF-8编码
+FLAG_UTF8 = 0x0800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+
+# 压缩包文件名（不含扩展名）的最大长度
+ARCHIVE_NAME_MAX_LENGTH = 100
+
+
+class ZipEntry:
+    """压缩包中的一个文件"""
+
+    def __init__(self, name, path, size, crc32, modified):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.crc32 = crc32
+        self.modified = modified  # datetime
+
+
+def _dos_datetime(dt):
+    """ZIP使用的DOS日期时间格式（只能表示1980年以后）"""
+    if dt.year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+    dos_date = ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+    return dos_time, dos_date
+
+
+def unique_names(names):
+    """去除路径分隔符并为重名文件追加序号"""
+    seen = set()
+    result = []
+    for name in names:
+        name = name.replace('/', '_').replace('\\', '_').strip() or 'file'
+        candidate = name
+        index = 1
+        while candidate.lower() in seen:
+            stem, ext = os.path.splitext(name)
+            candidate = f'{stem} ({index}){ext}'
+            index += 1
+        seen.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def archive_name(name, default='lanshare'):
+    """下载时使用的压缩包文件名（不含.zip）：去掉控制字符和路径分隔符并限制长度"""
+    name = ''.join(ch for ch in name or '' if unicodedata.category(ch)[0] != 'C')
+    name = name.replace('/', '_').replace('\\', '_').strip().strip('.')
+    return name[:ARCHIVE_NAME_MAX_LENGTH].strip() or default
+
+
+class ZipArchive:
+    """由头部字节与文件区间组成的虚拟ZIP文件"""
+
+    def __init__(self, entries):
+        # 每个分段为 (起始偏移, 长度, bytes 或 文件路径)
+        self._segments = []
+        self.size = 0
+
+        central_directory = []
+        for entry in entries:
+            offset = self.size
+            name = entry.name.encode('utf-8')
+            dos_time, dos_date = _dos_datetime(entry.modified)
+            zip64 = entry.size >= ZIP64_LIMIT
+            version = VERSION_ZIP64 if zip64 else VERSION_DEFAULT
+
+            # 本地文件头
+            extra = struct.pack('<HHQQ', 0x0001, 16, entry.size, entry.size) if zip64 else b''
+            size_field = ZIP64_LIMIT if zip64 else entry.size
+            header = struct.pack(
+                '<IHHHHHIIIHH',
+                0x04034b50, version, FLAG_UTF8, 0, dos_time, dos_date,
+                entry.crc32, size_field, size_field, len(name), len(extra)
+            ) + name + extra
+            self._add(header)
+            self._add(entry.path, entry.size)
+
+            # 中央目录条目，超出32位的字段放入ZIP64扩展字段
+            cd_extra_fields = []
+            if zip64:
+                cd_extra_fields += [entry.size, entry.size]
+            if offset >= ZIP64_LIMIT:
+                cd_extra_fields.append(offset)
+            cd_extra = b''
+            if cd_extra_fields:
+                cd_extra = struct.pack('<HH', 0x0001, 8 * len(cd_extra_fields)) + struct.pack(f'<{len(cd_extra_fields)}Q', *cd_extra_fields)
+                version = VERSION_ZIP64
+            central_directory.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII',
+                0x02014b50, (3 << 8) | version, version, FLAG_UTF8, 0, dos_time, dos_date,
+                entry.crc32, size_field, size_field, len(name), len(cd_extra), 0,
+                0, 0, 0o100644 << 16, min(offset, ZIP64_LIMIT)
+            ) + name + cd_extra)
+
+        cd_offset = self.size
+        cd_data = b''.join(central_directory)
+        cd_size = len(cd_data)
+        count = len(central_directory)
+
+        trailer = cd_data
+        if count >= ZIP_FILECOUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            zip64_eocd_offset = cd_offset + cd_size
+            trailer += struct.pack(
+                '<IQHHIIQQQQ',
+                0x06064b50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, cd_size, cd_offset
+            )
+            trailer += struct.pack('<IIQI', 0x07064b50, 0, zip64_eocd_offset, 1)
+        trailer += struct.pack(
+            '<IHHHHIIH',
+            0x06054b50, 0, 0,
+            min(count, ZIP_FILECOUNT_LIMIT), min(count, ZIP_FILECOUNT_LIMIT),
+            min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0
+        )
+        self._add(trailer)
+        self._starts = [segment[0] for segment in self._segments]
+
+    def _add(self, data, length=None):
+        length = len(data) if length is None else length
+        if length:
+            self._segments.append((self.size, length, data))
+            self.size += length
+
+    def iter_range(self, start, length):
+        """生成压缩包中 [start, start + length) 区间的数据"""
+        end = start + length
+        index = max(0, bisect.bisect_right(self._starts, start) - 1)
+        while start < end and index < len(self._segments):
+            seg_start, seg_length, data = self._segments[index]
+            offset = start - seg_start
+            count = min(seg_length - offset, end - start)
+            if isinstance(data, bytes):
+                yield data[offset:offset + count]
+            else:
+                yield from iter_file_range(data, offset, count)
+            start += count
+            index += 1
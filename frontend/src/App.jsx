@@ -73,7 +73,7 @@ function App() {
             return
           }
           
-          if (token === 'authenticated') {
+          if (token) {
             // 验证token有效性 - 调用需要密码验证的API来确保认证有效
             try {
               const verifyResponse = await fetch('/api/files', {
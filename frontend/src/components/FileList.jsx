@@ -23,7 +23,7 @@ import { useSocket } from '../contexts/SocketContext'
 import toast from 'react-hot-toast'
 import FilePreview from './NewFilePreview'
 
-const FileList = ({ files, loading, onDelete, onUploadSuccess }) => {
+const FileList = ({ files, loading, onDelete, onUploadSuccess, hasMore, onLoadMore }) => {
   const [deleteConfirm, setDeleteConfirm] = useState(null)
   const [extendDialog, setExtendDialog] = useState(null) // 延长过期时间对话框
   const [extendDays, setExtendDays] = useState(15) // 延长的天数
@@ -58,26 +58,6 @@ const FileList = ({ files, loading, onDelete, onUploadSuccess }) => {
     localStorage.setItem('pastedMessages', JSON.stringify(pastedMessages))
   }, [pastedMessages])
 
-  // 监听 WebSocket 事件
-  useEffect(() => {
-    if (!socket) return
-
-    // 监听文件过期时间延长事件
-    const handleFileExpiryExtended = (data) => {
-      // 刷新文件列表
-      if (onUploadSuccess) {
-        onUploadSuccess()
-      }
-      toast.success(`文件过期时间已延长，剩余 ${data.remaining_text}`)
-    }
-
-    socket.on('file_expiry_extended', handleFileExpiryExtended)
-
-    return () => {
-      socket.off('file_expiry_extended', handleFileExpiryExtended)
-    }
-  }, [socket, onUploadSuccess])
-
   // 当频道切换时，清空当前频道的粘贴消息
   useEffect(() => {
     // 频道切换时保持消息不变，因为消息是全局的
@@ -537,7 +517,14 @@ const FileList = ({ files, loading, onDelete, onUploadSuccess }) => {
                     {/* 文件图标 */}
                     <div className="flex-shrink-0 mt-1 md:mt-0">
                       <div className="w-8 h-8 md:w-10 md:h-10">
-                        {getFileIcon(file.file_type)}
+                        {file.file_type === 'image' ? (
+                          <img
+                            src={fileAPI.thumbnailFile(file.id)}
+                            alt={file.filename}
+                            loading="lazy"
+                            className="w-full h-full object-cover rounded"
+                          />
+                        ) : getFileIcon(file.file_type)}
                       </div>
                     </div>
 
@@ -613,6 +600,16 @@ const FileList = ({ files, loading, onDelete, onUploadSuccess }) => {
                 </motion.div>
               ))}
             </AnimatePresence>
+
+            {/* 加载更多 */}
+            {hasMore && (
+              <button
+                onClick={onLoadMore}
+                className="w-full py-2 text-sm text-muted-foreground rounded-lg border border-border hover:bg-accent transition-colors"
+              >
+                加载更多
+              </button>
+            )}
           </div>
         </div>
       </div>
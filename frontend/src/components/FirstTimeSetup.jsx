@@ -2,6 +2,7 @@ import React, { useState } from 'react'
 import { motion } from 'framer-motion'
 import { Shield, Lock, Unlock, ArrowRight } from 'lucide-react'
 import { toast } from 'react-hot-toast'
+import { setAuthToken } from '../utils/api'
 
 const FirstTimeSetup = ({ onComplete }) => {
   const [step, setStep] = useState(1) // 1: 选择模式, 2: 设置密码
@@ -48,13 +49,9 @@ const FirstTimeSetup = ({ onComplete }) => {
       if (response.ok) {
         toast.success('设置完成！欢迎使用 LanShare')
         
-        // 如果启用了密码，保存认证token到localStorage和axios默认header
+        // 如果启用了密码，保存认证token，后续API请求由拦截器附加到Authorization头
         if (usePassword && data.token) {
-          localStorage.setItem('lanshare_auth', data.token)
-          // 设置Authorization header用于后续API请求
-          if (window.axios) {
-            window.axios.defaults.headers.common['Authorization'] = `Bearer ${data.token}`
-          }
+          setAuthToken(data.token)
         }
         
         onComplete()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import FileUpload from './FileUpload'
 import FileList from './FileList'
@@ -8,24 +8,52 @@ import { useSocket } from '../contexts/SocketContext'
 import { fileAPI, messageAPI } from '../utils/api'
 import toast from 'react-hot-toast'
 
+// 文件列表每页条数
+const FILE_PAGE_SIZE = 100
+// 消息每页条数
+const MESSAGE_PAGE_SIZE = 50
+
 const MainContent = ({ onStatsUpdate }) => {
   const [activeTab, setActiveTab] = useState('files')
   const [files, setFiles] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [messages, setMessages] = useState([])
+  const [hasMoreMessages, setHasMoreMessages] = useState(false)
   const [loading, setLoading] = useState(false)
   // 保存FileUpload组件的状态，避免切换标签页时丢失
   const [fileUploadState, setFileUploadState] = useState({
     selectedFiles: [],
     uploading: false
   })
-  const { socket, currentChannel, connected } = useSocket()
+  const { socket, currentChannel, connected, onlineUsers, channelStats } = useSocket()
+  // 当前列表对应的事件序号，重连后据此增量同步（epoch 变化表示服务器已重启）
+  const syncRef = useRef({ epoch: null, filesSeq: null, messagesSeq: null })
+
+  const recordSync = (key, epoch, seq) => {
+    const state = syncRef.current
+    syncRef.current = state.epoch === epoch
+      ? { ...state, [key]: seq }
+      : { epoch, filesSeq: null, messagesSeq: null, [key]: seq }
+  }
+
+  const advanceSync = (epoch, seq) => {
+    const state = syncRef.current
+    if (state.epoch !== epoch || seq == null) return
+    syncRef.current = {
+      epoch,
+      filesSeq: state.filesSeq === null ? null : Math.max(state.filesSeq, seq),
+      messagesSeq: state.messagesSeq === null ? null : Math.max(state.messagesSeq, seq)
+    }
+  }
 
   // 加载文件列表
   const loadFiles = async () => {
     try {
       setLoading(true)
-      const response = await fileAPI.getFiles(currentChannel)
+      const response = await fileAPI.getFiles(currentChannel, { limit: FILE_PAGE_SIZE })
       setFiles(response.files || [])
+      setNextCursor(response.next_cursor || null)
+      recordSync('filesSeq', response.epoch, response.seq)
     } catch (error) {
       console.error('加载文件失败:', error)
       toast.error('加载文件失败')
@@ -34,56 +62,179 @@ const MainContent = ({ onStatsUpdate }) => {
     }
   }
 
+  // 加载下一页文件
+  const loadMoreFiles = async () => {
+    if (!nextCursor) return
+    try {
+      const response = await fileAPI.getFiles(currentChannel, { limit: FILE_PAGE_SIZE, cursor: nextCursor })
+      setFiles(prev => {
+        const loaded = new Set(prev.map(file => file.id))
+        return [...prev, ...(response.files || []).filter(file => !loaded.has(file.id))]
+      })
+      setNextCursor(response.next_cursor || null)
+    } catch (error) {
+      console.error('加载文件失败:', error)
+      toast.error('加载文件失败')
+    }
+  }
+
   // 加载消息列表
   const loadMessages = async () => {
     try {
-      const response = await messageAPI.getMessages(currentChannel)
+      const response = await messageAPI.getMessages(currentChannel, { limit: MESSAGE_PAGE_SIZE })
       setMessages(response.messages || [])
+      setHasMoreMessages(!!response.has_more)
+      recordSync('messagesSeq', response.epoch, response.seq)
     } catch (error) {
       console.error('加载消息失败:', error)
       toast.error('加载消息失败')
     }
   }
 
-  // Socket事件监听
-  useEffect(() => {
-    if (!socket) return
+  // 加载更早的消息
+  const loadEarlierMessages = async () => {
+    if (!hasMoreMessages || messages.length === 0) return
+    try {
+      const response = await messageAPI.getMessages(currentChannel, {
+        limit: MESSAGE_PAGE_SIZE,
+        before_id: messages[0].id
+      })
+      setMessages(prev => [...(response.messages || []), ...prev])
+      setHasMoreMessages(!!response.has_more)
+    } catch (error) {
+      console.error('加载消息失败:', error)
+      toast.error('加载消息失败')
+    }
+  }
 
-    // 监听文件上传事件
-    socket.on('file_uploaded', (data) => {
-      setFiles(prev => [data, ...prev])
-      toast.success(`新文件: ${data.filename}`)
+  // 应用文件变化：新增、删除、过期时间更新
+  const applyFilesChanged = ({ uploaded, deleted, updated }, notify) => {
+    const deletedIds = new Set(deleted)
+    const updatedById = new Map(updated.map(item => [item.file_id, item]))
+    setFiles(prev => {
+      const existing = new Set(prev.map(file => file.id))
+      const added = uploaded.filter(file => !existing.has(file.id)).reverse()
+      return [...added, ...prev]
+        .filter(file => !deletedIds.has(file.id))
+        .map(file => {
+          const item = updatedById.get(file.id)
+          if (!item) return file
+          const { file_id, ...changes } = item
+          return { ...file, ...changes, is_expired: false }
+        })
     })
 
-    // 监听文件删除事件
-    socket.on('file_deleted', (data) => {
-      setFiles(prev => prev.filter(file => file.id !== data.file_id))
+    if (!notify) return
+    if (uploaded.length === 1) {
+      toast.success(`新文件: ${uploaded[0].filename}`)
+    } else if (uploaded.length > 1) {
+      toast.success(`新增 ${uploaded.length} 个文件`)
+    }
+    if (deleted.length > 0) {
       toast.success('文件已删除')
+    }
+    if (updated.length === 1) {
+      toast.success(`文件过期时间已延长，剩余 ${updated[0].remaining_text}`)
+    }
+  }
+
+  // 应用消息变化：新消息与删除
+  const applyMessagesBatch = ({ messages: added, deleted }) => {
+    const deletedIds = new Set(deleted)
+    setMessages(prev => {
+      const existing = new Set(prev.map(message => message.id))
+      return [...prev, ...added.filter(message => !existing.has(message.id))]
+        .filter(message => !deletedIds.has(message.id))
     })
+  }
 
-    // 监听新消息事件
-    socket.on('new_message', (data) => {
-      setMessages(prev => [...prev, data])
+  // 增量同步：只拉取最后序号之后的事件，无法增量时重新加载列表
+  const syncChannel = () => {
+    const { epoch, filesSeq, messagesSeq } = syncRef.current
+    if (!socket || epoch === null || filesSeq === null || messagesSeq === null) {
+      loadFiles()
+      loadMessages()
+      return
+    }
+
+    socket.emit('sync_channel', { channel: currentChannel, since: Math.min(filesSeq, messagesSeq), epoch }, (result) => {
+      if (!result || result.error || result.reset) {
+        loadFiles()
+        loadMessages()
+        return
+      }
+
+      const fileChanges = { uploaded: [], deleted: [], updated: [] }
+      const messageChanges = { messages: [], deleted: [] }
+      result.events.forEach(({ event, data }) => {
+        if (event === 'file_uploaded') fileChanges.uploaded.push(data)
+        else if (event === 'file_deleted') fileChanges.deleted.push(data.file_id)
+        else if (event === 'file_expiry_extended') fileChanges.updated.push(data)
+        else if (event === 'new_message') messageChanges.messages.push(data)
+        else if (event === 'message_deleted') messageChanges.deleted.push(data.message_id)
+      })
+      applyFilesChanged(fileChanges, false)
+      applyMessagesBatch(messageChanges)
+      syncRef.current = { epoch: result.epoch, filesSeq: result.seq, messagesSeq: result.seq }
     })
+  }
+
+  // Socket事件监听
+  useEffect(() => {
+    if (!socket) return
+
+    // 文件变化（服务器按频道合并后批量推送）
+    const handleFilesChanged = (data) => {
+      if (data.channel !== currentChannel) return
+      applyFilesChanged(data, true)
+      advanceSync(data.epoch, data.seq)
+    }
+
+    // 新消息与消息删除
+    const handleMessagesBatch = (data) => {
+      if (data.channel !== currentChannel) return
+      applyMessagesBatch(data)
+      advanceSync(data.epoch, data.seq)
+    }
+
+    // 推送积压时服务器要求重新同步
+    const handleResync = (data) => {
+      if (data.channel !== currentChannel) return
+      syncChannel()
+    }
+
+    // 断线重连后（SocketContext 已重新加入频道）补齐错过的事件
+    const handleReconnect = () => {
+      if (syncRef.current.epoch !== null) {
+        syncChannel()
+      }
+    }
+
+    socket.on('files_changed', handleFilesChanged)
+    socket.on('messages_batch', handleMessagesBatch)
+    socket.on('resync', handleResync)
+    socket.on('connect', handleReconnect)
 
     return () => {
-      socket.off('file_uploaded')
-      socket.off('file_deleted')
-      socket.off('new_message')
+      socket.off('files_changed', handleFilesChanged)
+      socket.off('messages_batch', handleMessagesBatch)
+      socket.off('resync', handleResync)
+      socket.off('connect', handleReconnect)
     }
-  }, [socket])
+  }, [socket, currentChannel])
 
-  // 统计数据更新
+  // 统计数据更新（文件数由服务器统计，分页加载时 files 只是已加载的部分）
+  const channelFileCount = channelStats[currentChannel]?.file_count
   useEffect(() => {
     if (onStatsUpdate) {
-      // 模拟在线用户数（可以根据实际情况调整）
-      const onlineUsers = connected ? 1 : 0
-      onStatsUpdate({ onlineUsers, totalFiles: files.length })
+      const totalFiles = channelFileCount ?? files.length
+      onStatsUpdate({ onlineUsers: connected ? onlineUsers : 0, totalFiles })
     }
-  }, [files.length, connected, onStatsUpdate])
+  }, [files.length, channelFileCount, connected, onlineUsers, onStatsUpdate])
 
   // 当频道切换时重新加载数据
   useEffect(() => {
+    syncRef.current = { epoch: null, filesSeq: null, messagesSeq: null }
     loadFiles()
     loadMessages()
   }, [currentChannel])
@@ -133,7 +284,7 @@ const MainContent = ({ onStatsUpdate }) => {
                 onStateChange={setFileUploadState}
               />
               <ErrorBoundary>
-                <FileList files={files} loading={loading} onDelete={loadFiles} onUploadSuccess={loadFiles} />
+                <FileList files={files} loading={loading} onDelete={loadFiles} onUploadSuccess={loadFiles} hasMore={!!nextCursor} onLoadMore={loadMoreFiles} />
               </ErrorBoundary>
             </motion.div>
           )}
@@ -149,6 +300,8 @@ const MainContent = ({ onStatsUpdate }) => {
               <MessageArea
                 messages={messages}
                 onSendMessage={loadMessages}
+                hasMore={hasMoreMessages}
+                onLoadMore={loadEarlierMessages}
               />
             </motion.div>
           )}
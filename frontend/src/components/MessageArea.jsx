@@ -1,13 +1,13 @@
 import React, { useState, useRef, useEffect } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { Send, Image, Paperclip, Smile, Copy, Check, Trash2, X, Download, Eye } from 'lucide-react'
-import { messageAPI } from '../utils/api'
+import { messageAPI, withAuthToken } from '../utils/api'
 import { useSocket } from '../contexts/SocketContext'
 import { formatTime, formatFileSize } from '../utils'
 import toast from 'react-hot-toast'
 import NewFilePreview from './NewFilePreview'
 
-const MessageArea = ({ messages, onSendMessage }) => {
+const MessageArea = ({ messages, onSendMessage, hasMore, onLoadMore }) => {
   const [newMessage, setNewMessage] = useState('')
   const [senderName, setSenderName] = useState(() => {
     return localStorage.getItem('senderName') || '匿名用户'
@@ -31,35 +31,31 @@ const MessageArea = ({ messages, onSendMessage }) => {
     }
   }
 
+  // 只有最新消息变化时才滚动到底部，加载更早的消息时保持当前位置
+  const lastMessageId = messages.length > 0 ? messages[messages.length - 1].id : null
   useEffect(() => {
     // 延迟滚动，确保 DOM 更新完成
     const timer = setTimeout(scrollToBottom, 50)
     return () => clearTimeout(timer)
-  }, [messages])
+  }, [lastMessageId])
+
+  const handleLoadMore = async () => {
+    const container = messagesContainerRef.current
+    const previousHeight = container ? container.scrollHeight : 0
+    await onLoadMore()
+    // 新内容插入到顶部后，保持用户看到的位置不变
+    requestAnimationFrame(() => {
+      if (container) {
+        container.scrollTop += container.scrollHeight - previousHeight
+      }
+    })
+  }
 
   // 保存用户名
   useEffect(() => {
     localStorage.setItem('senderName', senderName)
   }, [senderName])
 
-  // 监听WebSocket事件
-  useEffect(() => {
-    if (!socket) return
-
-    // 监听消息删除事件
-    const handleMessageDeleted = (data) => {
-      console.log('收到消息删除事件:', data)
-      // 重新加载消息列表
-      onSendMessage && onSendMessage()
-    }
-
-    socket.on('message_deleted', handleMessageDeleted)
-
-    return () => {
-      socket.off('message_deleted', handleMessageDeleted)
-    }
-  }, [socket, onSendMessage])
-
   // 复制消息到剪贴板
   const copyMessage = async (messageContent, messageId) => {
     try {
@@ -240,7 +236,7 @@ const MessageArea = ({ messages, onSendMessage }) => {
             )}
             
             <a
-              href={`/api/messages/${message.id}/file/download`}
+              href={withAuthToken(`/api/messages/${message.id}/file/download`)}
               className="p-1.5 text-gray-400 hover:text-green-600 hover:bg-green-50 rounded transition-colors"
               title="下载"
             >
@@ -253,7 +249,8 @@ const MessageArea = ({ messages, onSendMessage }) => {
         {isImage && message.id && (
           <div className="mt-3">
             <img
-              src={`/api/messages/${message.id}/file/preview`}
+              src={messageAPI.thumbnailFile(message.id)}
+              loading="lazy"
               alt={fileName}
               className="max-w-full h-auto max-h-64 rounded-lg border cursor-pointer"
               onClick={() => setPreviewFile({
@@ -294,6 +291,16 @@ const MessageArea = ({ messages, onSendMessage }) => {
         className="flex-1 overflow-y-auto custom-scrollbar p-4 md:p-6"
       >
         <div className="max-w-4xl mx-auto">
+          {hasMore && (
+            <div className="text-center mb-4">
+              <button
+                onClick={handleLoadMore}
+                className="px-4 py-1.5 text-sm text-muted-foreground rounded-lg border border-border hover:bg-accent transition-colors"
+              >
+                加载更早的消息
+              </button>
+            </div>
+          )}
           <div className="space-y-3 md:space-y-4">
             <AnimatePresence>
               {messages.map((message) => (
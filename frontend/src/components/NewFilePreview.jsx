@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { X, Download, Maximize2, Minimize2, Volume2, VolumeX, Play, Pause, RotateCcw } from 'lucide-react';
+import { withAuthToken } from '../utils/api';
 
 const NewFilePreview = ({ file, isOpen, onClose }) => {
   const [isLoading, setIsLoading] = useState(true);
@@ -33,9 +34,9 @@ const NewFilePreview = ({ file, isOpen, onClose }) => {
     const retry = retryCount > 0 ? `&retry=${retryCount}` : '';
     
     // 判断是聊天文件还是传输文件
-    const url = file.is_chat_file 
+    const url = withAuthToken(file.is_chat_file 
       ? `/api/messages/${file.id}/file/preview?v=1${retry}`  // 聊天文件使用消息ID
-      : `/api/files/${file.id}/preview?v=1${retry}`;         // 传输文件使用文件ID
+      : `/api/files/${file.id}/preview?v=1${retry}`);        // 传输文件使用文件ID
       
     console.log(`[NewFilePreview] 生成预览URL: ${url} (${file.is_chat_file ? '聊天文件' : '传输文件'}, ID: ${file.id}, 重试: ${retryCount})`);
     return url;
@@ -261,9 +262,9 @@ const NewFilePreview = ({ file, isOpen, onClose }) => {
     if (!file) return;
     
     // 根据文件类型使用不同的下载接口
-    const url = file.is_chat_file 
+    const url = withAuthToken(file.is_chat_file 
       ? `/api/messages/${file.id}/file/download`  // 聊天文件下载接口
-      : `/api/files/${file.id}/download`;         // 传输文件下载接口
+      : `/api/files/${file.id}/download`);        // 传输文件下载接口
       
     const link = document.createElement('a');
     link.href = url;
@@ -30,7 +30,7 @@ const PasswordAuth = ({ onAuthenticated }) => {
       const data = await response.json()
 
       if (response.ok && data.valid) {
-        setAuthToken('authenticated')
+        setAuthToken(data.token)
         onAuthenticated()
         toast.success('验证成功')
       } else {
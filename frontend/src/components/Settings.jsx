@@ -3,7 +3,7 @@ import { motion } from 'framer-motion'
 import { Shield, Lock, Unlock, Save, Eye, EyeOff, LogOut } from 'lucide-react'
 import { toast } from 'react-hot-toast'
 import { channelAPI } from '../utils/api'
-import { clearAuthToken } from '../utils/api'
+import { clearAuthToken, setAuthToken } from '../utils/api'
 
 const Settings = ({ onClose }) => {
   const [password, setPassword] = useState('')
@@ -86,6 +86,8 @@ const Settings = ({ onClose }) => {
       const data = await response.json()
       
       if (response.ok) {
+        // 修改密码设置后之前的token失效，保存新的token
+        setAuthToken(data.token)
         toast.success('密码保护已关闭')
         setIsPasswordMode(false)
         setShowPasswordVerify(false)
@@ -139,6 +141,8 @@ const Settings = ({ onClose }) => {
       const modifyData = await modifyResponse.json()
       
       if (modifyResponse.ok) {
+        // 修改密码后之前的token失效，保存新的token
+        setAuthToken(modifyData.token)
         toast.success('密码已修改')
         setPassword('')
         setConfirmPassword('')
@@ -182,6 +186,8 @@ const Settings = ({ onClose }) => {
       const data = await response.json()
       
       if (response.ok) {
+        // 修改密码设置后之前的token失效，保存新的token
+        setAuthToken(data.token)
         setRefreshLockEnabled(!refreshLockEnabled)
         setCurrentPassword('')
         setShowRefreshLockVerify(false)
@@ -227,6 +233,8 @@ const Settings = ({ onClose }) => {
       const data = await response.json()
       
       if (response.ok) {
+        // 修改密码设置后之前的token失效，保存新的token
+        setAuthToken(data.token)
         toast.success('设置已保存')
         setPassword('')
         setConfirmPassword('')
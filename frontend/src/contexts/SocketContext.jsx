@@ -1,6 +1,7 @@
-import React, { createContext, useContext, useEffect, useState } from 'react'
+import React, { createContext, useContext, useEffect, useRef, useState } from 'react'
 import { io } from 'socket.io-client'
 import toast from 'react-hot-toast'
+import { channelAPI } from '../utils/api'
 
 const SocketContext = createContext()
 
@@ -12,6 +13,11 @@ export function SocketProvider({ children }) {
   const [socket, setSocket] = useState(null)
   const [connected, setConnected] = useState(false)
   const [currentChannel, setCurrentChannel] = useState('default')
+  const [onlineUsers, setOnlineUsers] = useState(0)
+  // 各频道的统计（文件数、大小等），连接时加载一次，之后由 channel_stats 事件增量更新
+  const [channelStats, setChannelStats] = useState({})
+  // 重连时需要重新加入当前频道，事件回调中通过ref读取最新值
+  const channelRef = useRef('default')
 
   useEffect(() => {
     const socketInstance = io('/', {
@@ -20,9 +26,16 @@ export function SocketProvider({ children }) {
 
     socketInstance.on('connect', () => {
       setConnected(true)
-      // 初始连接时加入默认频道
-      socketInstance.emit('join_channel', { channel: 'default' })
+      // 连接（包括断线重连）后加入当前频道
+      socketInstance.emit('join_channel', { channel: channelRef.current })
       // 不显示连接成功的toast，减少干扰
+      channelAPI.getStats()
+        .then((response) => {
+          const stats = {}
+          response.data.channels.forEach((item) => { stats[item.channel] = item })
+          setChannelStats(stats)
+        })
+        .catch((error) => console.error('加载频道统计失败:', error))
     })
 
     socketInstance.on('disconnect', () => {
@@ -31,6 +44,23 @@ export function SocketProvider({ children }) {
       toast.error('与服务器断开连接')
     })
 
+    // 当前频道的在线人数
+    socketInstance.on('presence', (data) => {
+      if (data.channel === channelRef.current) {
+        setOnlineUsers(data.online)
+      }
+    })
+
+    // 统计有变化的频道
+    socketInstance.on('channel_stats', (data) => {
+      setChannelStats((prev) => {
+        const next = { ...prev }
+        data.channels.forEach((item) => { next[item.channel] = item })
+        data.removed.forEach((name) => { delete next[name] })
+        return next
+      })
+    })
+
     socketInstance.on('connect_error', (error) => {
       console.error('连接错误:', error)
       toast.error('连接服务器失败')
@@ -47,6 +77,7 @@ export function SocketProvider({ children }) {
     if (socket && currentChannel !== channel) {
       socket.emit('leave_channel', { channel: currentChannel })
       socket.emit('join_channel', { channel })
+      channelRef.current = channel
       setCurrentChannel(channel)
       // 不显示频道切换的toast，减少干扰
     }
@@ -57,6 +88,8 @@ export function SocketProvider({ children }) {
       socket,
       connected,
       currentChannel,
+      onlineUsers,
+      channelStats,
       joinChannel
     }}>
       {children}
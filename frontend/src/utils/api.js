@@ -24,6 +24,15 @@ export const clearAuthToken = () => {
   sessionStorage.removeItem('lanshare_auth')
 }
 
+// 在URL上附加认证token（<video>、<img>和下载链接无法携带Authorization头）
+export const withAuthToken = (url) => {
+  const token = getAuthToken()
+  if (!token) {
+    return url
+  }
+  return `${url}${url.includes('?') ? '&' : '?'}token=${encodeURIComponent(token)}`
+}
+
 // 请求拦截器
 api.interceptors.request.use(
   (config) => {
@@ -66,7 +75,7 @@ export const systemAPI = {
 
 // 文件API
 export const fileAPI = {
-  getFiles: (channel = 'default') => api.get(`/files?channel=${channel}`),
+  getFiles: (channel = 'default', params = {}) => api.get('/files', { params: { channel, ...params } }),
   uploadFile: (formData) => api.post('/files/upload', formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
@@ -79,16 +88,19 @@ export const fileAPI = {
       console.log(`上传进度: ${percentCompleted}%`)
     },
   }),
-  downloadFile: (fileId) => `/api/files/${fileId}/download`,
-  previewFile: (fileId) => `/api/files/${fileId}/preview`,
+  downloadFile: (fileId) => withAuthToken(`/api/files/${fileId}/download`),
+  previewFile: (fileId) => withAuthToken(`/api/files/${fileId}/preview`),
+  // 缩略图是公开端点，不附加token，地址不随登录变化，浏览器可以长期缓存
+  thumbnailFile: (fileId, width = 128) => `/api/files/${fileId}/thumbnail?w=${width}`,
   deleteFile: (fileId) => api.delete(`/files/${fileId}`),
 }
 
 // 消息API
 export const messageAPI = {
-  getMessages: (channel = 'default') => api.get(`/messages?channel=${channel}`),
+  getMessages: (channel = 'default', params = {}) => api.get('/messages', { params: { channel, ...params } }),
   sendMessage: (data) => api.post('/messages', data),
   deleteMessage: (messageId) => api.delete(`/messages/${messageId}`),
+  thumbnailFile: (messageId, width = 512) => `/api/messages/${messageId}/file/thumbnail?w=${width}`,
   sendFileMessage: (formData) => {
     return api.post('/messages/file', formData, {
       headers: {
@@ -101,6 +113,7 @@ export const messageAPI = {
 // 频道管理API
 export const channelAPI = {
   getChannels: () => api.get('/channels'),
+  getStats: () => api.get('/channels/stats'),
   createChannel: (name) => api.post('/channels', { name }),
   deleteChannel: (name) => api.delete(`/channels/${encodeURIComponent(name)}`),
   renameChannel: (oldName, newName) => api.put(`/channels/${encodeURIComponent(oldName)}`, { name: newName }),